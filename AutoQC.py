@@ -1,7 +1,13 @@
 from wodpy import wod
-import pickle, sys, os, calendar, time, ast, getopt
+import pickle, sys, os, calendar, time, ast, getopt, traceback
 import numpy as np
 import util.main as main
+from util.resultsink import ResultSink
+from util.parameters import LazyParameters
+from util.workqueue import WorkQueue
+from util.runlog import RunLog
+from util import scheduler, incremental
+import qctests.EN_track_check as EN_track_check
 from multiprocessing import Pool
 
 def run(test, profiles, parameters):
@@ -10,38 +16,153 @@ def run(test, profiles, parameters):
   '''
 
   verbose = []
-  exec('from qctests import ' + test)
+  qctest = qcRegistry[test]['test']
   for profile in profiles:
-    exec('verbose.append(' + test + '.test(profile, parameters))')
+    verbose.append(qctest(profile, parameters))
 
   return verbose
 
-def process_row(uid, logdir, table='iquod', targetdb='iquod.db'):
-  '''run all tests on the indicated database row'''
+def run_test(test, profile, timings=None, errors=None):
+  '''
+  run <test> on a single profile, return its per-level qc results; if it raised, return all passes
+  and append <test> to the list <errors> if given, so the result is marked as an error.
+  return None if its parameters (or those of a test it requires) failed to load, so that its result
+  is written as NULL and computed again by a later incremental run, once the data it needs is there.
+  if a list of <timings> is given, append (uid, test, wall, cpu, levels, dbcalls, exception) to it.
+  '''
+
+  parameterStore.require(test)
+  wall = time.perf_counter()
+  cpu = time.thread_time()
+  dbcalls = main.db_calls()
+  exception = False
+  try:
+    if parameterStore.unusable(test):
+      raise RuntimeError('parameters for ' + test + ' or a test it requires failed to load')
+    result = run(test, [profile], parameterStore)[0]
+  except:
+    run_log(logdir).record(profile.uid(), test, 'error', exception=traceback.format_exc(), seconds=time.perf_counter()-wall)
+    exception = True
+    if parameterStore.unusable(test):
+      result = None
+    else:
+      result = np.zeros(profile.n_levels(), dtype=bool)
+      if errors is not None:
+        errors.append(test)
+
+  if timings is not None:
+    timings.append((profile.uid(), test, time.perf_counter()-wall, time.thread_time()-cpu, profile.n_levels(), main.db_calls()-dbcalls, int(exception)))
+  return result
 
-  # reroute stdout, stderr to separate files for each profile to preserve logs
-  sys.stdout = open(logdir + "/" + str(uid) + ".stdout", "w")
-  sys.stderr = open(logdir + "/" + str(uid) + ".stderr", "w")
+def test_schedule(tests):
+  '''return the schedule for running just <tests>, some of the tests in testNames'''
 
-  # extract profile
-  profile = main.get_profile_from_db(uid, table, targetdb)
+  tests = tuple(tests)
+  if tests == tuple(testNames):
+    return schedule
+  if tests not in schedules:
+    schedules[tests] = scheduler.Scheduler(tests, schedule.dependencies, schedule.threads)
+  return schedules[tests]
+
+def qc_profile(profile, tests=None, timings=None, errors=None):
+  '''
+  run <tests> (default all tests in testNames) on a single profile, return a list of per-level qc results, one per test,
+  None for any test whose parameters failed to load;
+  per-test timings are appended to the list <timings>, and the tests that raised to the list <errors>, if given.
+  '''
+
+  if tests is None:
+    tests = testNames
 
   # mask out error codes in temperature data
   main.catchFlags(profile)
 
-  # run tests
-  for itest, test in enumerate(testNames):
-    try:
-      result = run(test, [profile], parameterStore)[0]
-    except:
-      print(test, 'exception', sys.exc_info())
-      result = np.zeros(profile.n_levels(), dtype=bool)
+  # run tests once each, after the tests they depend on
+  results = test_schedule(tests).run(lambda test: run_test(test, profile, timings, errors))
 
+  return [results[test] for test in tests]
+
+def result_sink(table, targetdb):
+  '''return this worker's persistent result sink for <table> in <targetdb>'''
+
+  key = (table, targetdb)
+  if key not in resultSinks:
+    resultSinks[key] = ResultSink(table, targetdb, timingtable=table + '_timing' if timing else None, errortable=incremental.error_table(table))
+  return resultSinks[key]
+
+def run_log(logdir):
+  '''return this worker's log in <logdir>'''
+
+  if logdir not in runLogs:
+    runLogs[logdir] = RunLog(logdir)
+  return runLogs[logdir]
+
+def process_row(uid, logdir, table='iquod', targetdb='iquod.db', tests=None):
+  '''run all tests, or just <tests>, on the indicated database row'''
+
+  # log anything printed while processing the profile against its uid
+  with run_log(logdir).capture(uid):
+    # extract profile
+    profile = main.get_profile_from_db(uid, table, targetdb)
+
+    # run tests
+    timings = [] if timing else None
+    errors = []
+    results = qc_profile(profile, tests, timings, errors)
+
+    # write all test columns for this profile at once
+    sink = result_sink(table, targetdb)
+    sink.add(profile.uid(), dict(zip(tests or testNames, results)), timings, errors)
+    if sink.flush() != 0:
+      print('db exception writing uid', uid)
+
+def process_rows(uids, logdir, table='iquod', targetdb='iquod.db', todo=None):
+  '''
+  run all tests on a chunk of database rows, or just the tests listed for each uid in the dict <todo>;
+  raw text for the whole chunk is fetched in one query,
+  and all results are written back in one transaction.
+  '''
+
+  # extract profiles
+  profiles = main.get_profiles_from_db(uids, table, targetdb)
+
+  sink = result_sink(table, targetdb)
+  for profile in profiles:
+    # log anything printed while processing the profile against its uid
+    with run_log(logdir).capture(profile.uid()):
+      tests = todo[profile.uid()] if todo is not None else testNames
+      timings = [] if timing else None
+      errors = []
+      results = qc_profile(profile, tests, timings, errors)
+      sink.add(profile.uid(), dict(zip(tests, results)), timings, errors)
+
+  status = sink.flush()
+  if status != 0:
+    run_log(logdir).record(uids[0], level='error', message='db exception writing chunk starting at uid {}'.format(uids[0]))
+  return status
+
+def queue_worker(logdir, table='iquod', targetdb='iquod.db'):
+  '''
+  lease chunks of rows from workQueue and process them until there are none left,
+  renewing each lease while the chunk is worked on.
+  '''
+
+  while True:
+    work = workQueue.lease()
+    if work is None:
+      return
+    chunk, token, uids, todo = work
+    stop = workQueue.keepalive(chunk, token)
     try:
-      query = "UPDATE " + table + " SET " + test.lower() + "=? WHERE uid=" + str(profile.uid()) + ";"
-      main.dbinteract(query, [main.pack_array(result)], targetdb=targetdb)
+      if process_rows(uids, logdir, table, targetdb, todo) == 0:
+        workQueue.complete(chunk, token)
+      else:
+        workQueue.release(chunk, token)
     except:
-      print('db exception', sys.exc_info())
+      run_log(logdir).record(uids[0], level='error', message='chunk {} failed'.format(chunk), exception=traceback.format_exc())
+      workQueue.release(chunk, token)
+    finally:
+      stop.set()
 
 
 ########################################
@@ -49,36 +170,76 @@ def process_row(uid, logdir, table='iquod', targetdb='iquod.db'):
 ########################################
 
 # parse options
-options, remainder = getopt.getopt(sys.argv[1:], 't:d:b:n:p:l:h')
+options, remainder = getopt.getopt(sys.argv[1:], 't:d:b:n:p:l:c:j:s:q:gimrTh')
 cores=1
 targetdb = 'iquod.db'
 dbtable = 'iquod'
 logdir = '/AutoQClogs'
 batchnumber = None
 nperbatch = None
+chunksize = None
+groupcruises = False
+persist = True
+threads = 1
+selection = None
+resume = False
+retry = False
+queuefile = None
+timing = False
 for opt, arg in options:
     if opt == '-b':
         batchnumber = ast.literal_eval(arg)
+    if opt == '-c':
+        chunksize = ast.literal_eval(arg)
     if opt == '-d':
         dbtable = arg
+    if opt == '-g':
+        groupcruises = True
+    if opt == '-i':
+        resume = True
+    if opt == '-j':
+        threads = ast.literal_eval(arg)
     if opt == '-l':
         logdir = arg
+    if opt == '-m':
+        persist = False
     if opt == '-n':
         cores = ast.literal_eval(arg)
     if opt == '-p':
         nperbatch = ast.literal_eval(arg)
+    if opt == '-q':
+        queuefile = arg
+    if opt == '-r':
+        retry = True
+    if opt == '-s':
+        selection = arg.split(',')
     if opt == '-t':
         targetdb = arg
+    if opt == '-T':
+        timing = True
     if opt == '-h':
         print('usage:')
         print('-b <batch number to process>')
+        print('-c <number of profiles per worker task; processes profiles in chunks rather than one at a time>')
         print('-d <db table name to create and write to>')
-        print('-l <directory to write logfiles to>')
+        print('-g group profiles by cruise, so each cruise is processed by a single worker task')
+        print('-i incremental: only compute results that are missing, or whose test has changed since they were computed')
+        print('-j <number of threads per worker; runs the independent tests of each profile concurrently>')
+        print('-l <directory to write logfiles to; each worker appends json records to its own file, see query-logs.py>')
+        print('-m keep intermediate products of the EN and ICDC checks in memory only, rather than also writing them to their side tables')
         print('-n <number of cores to use>')
         print('-p <how many profiles to process per batch>')
+        print('-q <sqlite file on a filesystem shared by all nodes to queue chunks of profiles in; every AutoQC process given the same file pulls chunks from it until none are left. delete it before starting a new job. the -t database is used with a rollback journal rather than WAL, so every process using it while the queue runs must be given -q too>')
+        print('-r with -i, also recompute results of tests that raised, rather than keeping them as errors')
+        print('-s <comma separated names or wildcards of the tests to run, eg EN_*,ICDC_aqc_09_local_climatology_check; default all>')
         print('-t <name of db file>')
+        print('-T record wall and cpu time, levels, db calls and exceptions of every test on every profile in the <table>_timing table; see report-timing.py')
         print('-h print this help message and quit')
 
+# nodes sharing a queue write to the same results database over a network filesystem, where WAL isn't safe
+if queuefile is not None:
+  main.share_between_hosts()
+
 # Identify and import tests
 testNames = main.importQC('qctests')
 testNames.sort()
@@ -87,43 +248,125 @@ testNames = main.checkQCTestRequirements(testNames)
 print('{} quality control checks are able to be run:'.format(len(testNames)))
 for testName in testNames:
   print('  {}'.format(testName))
+if selection is not None:
+  testNames = main.selectQCTests(testNames, selection)
+  print('{} quality control checks selected'.format(len(testNames)))
+
+# tests the selected ones depend on are imported too, as they're called directly
+qcRegistry = main.buildQCRegistry(main.requiredQCTests(testNames))
+
+# order tests by their dependencies on each other
+schedule = scheduler.Scheduler(testNames, scheduler.read_dependencies(testNames), int(threads))
+schedules = {}
+print('tests will run in {} rounds; longest chain of dependent tests:'.format(len(schedule.waves)))
+print('  ' + ' -> '.join(schedule.critical_path()[0]))
+
+# tests written since the database was built need somewhere to put their results
+for test in incremental.add_test_columns(dbtable, testNames, targetdb):
+  print('added result column for', test)
 
 # set up a directory for logging
 logdir = logdir + "/autoqc-logs-" + str(calendar.timegm(time.gmtime()))
-os.makedirs(logdir)
+os.makedirs(logdir, exist_ok=True)
 
-# Parallel processing.
-print('\nPlease wait while QC is performed\n')
+# result sinks and logs are created lazily, one per worker process
+resultSinks = {}
+runLogs = {}
 
-# set up global parmaeter store
-parameterStore = {
+# connect to database & fetch list of all uids, ordered by cruise if grouping by cruise
+if groupcruises:
+  columns = ['country', 'cruise', 'ocruise', 'year', 'month', 'day', 'time', 'probe']
+  columns += [column for column in ['platform'] if column in main.table_columns(dbtable, targetdb)]
+  query = 'SELECT uid, ' + ', '.join(columns) + ' FROM ' + dbtable + ' ORDER BY country, cruise, ocruise, uid;'
+  # only profiles the track check assesses need their whole cruise in one task; the rest are grouped by uid, ie alone
+  uids = [(row[0],) + tuple(row[1:4]) if EN_track_check.assess_usability_header(*row[1:]) else (row[0], row[0])
+          for row in main.dbinteract(query, targetdb=targetdb)]
+else:
+  query = 'SELECT uid FROM ' + dbtable + ' ORDER BY uid;'
+  uids = main.dbinteract(query, targetdb=targetdb)
+
+wholetable = batchnumber is None or nperbatch is None
+if not wholetable:
+  batchnumber = int(batchnumber)
+  nperbatch   = int(nperbatch)
+  uids = uids[batchnumber*nperbatch:min((batchnumber+1)*nperbatch,len(uids))]
+
+# in incremental mode, only profiles with missing results are processed, and only for the missing tests
+todo = None
+runtests = testNames
+if resume:
+  for test in incremental.invalidate_changed(dbtable, testNames, targetdb):
+    print(test, 'has changed since its results were computed; recomputing')
+  if retry:
+    print('recomputing {} results of tests that raised'.format(incremental.retry_errors(dbtable, testNames, targetdb)))
+  else:
+    print('keeping {} results of tests that raised; use -r to recompute them'.format(incremental.count_errors(dbtable, testNames, targetdb)))
+  todo = incremental.missing_work(dbtable, testNames, targetdb)
+  uids = [uid for uid in uids if uid[0] in todo]
+  runtests = sorted(set([test for uid in uids for test in todo[uid[0]]]))
+  print('{} profiles have results missing for {} tests'.format(len(uids), len(runtests)))
+
+# set up global parmaeter store; each test's parameters are loaded the first time it's needed
+parameterStore = LazyParameters(qcRegistry, {
   "table": dbtable,
-  "db": targetdb
-}
-for test in testNames:
-  exec('from qctests import ' + test)
-  try:
-    exec(test + '.loadParameters(parameterStore)')
-  except:
+  "db": targetdb,
+  "persist_intermediates": persist
+})
+# load them for the tests in this run before forking: grids, climatologies and indexes built here
+# are inherited by every worker, sharing the same pages, rather than each worker loading its own
+for test in schedule.order:
+  if test in runtests:
+    parameterStore.require(test)
+for test in sorted(parameterStore.loadtimes):
+  if qcRegistry[test]['loadParameters'] is None:
     print('No parameters to load for', test)
+  else:
+    print('Loaded parameters for {} in {:.2f}s'.format(test, parameterStore.loadtimes[test]))
 
-# connect to database & fetch list of all uids
-query = 'SELECT uid FROM ' + dbtable + ' ORDER BY uid;'
-uids = main.dbinteract(query, targetdb=targetdb)
+# workers open their own connections; don't carry the parent's across the fork
+main.disconnect()
+
+# Parallel processing.
+print('\nPlease wait while QC is performed\n')
 
 # launch async processes
-if batchnumber is not None and nperbatch is not None:
-  batchnumber = int(batchnumber)
-  nperbatch   = int(nperbatch)
-  startindex  = batchnumber*nperbatch
-  endindex    = min((batchnumber+1)*nperbatch,len(uids))
+if groupcruises:
+  # every usable profile on a cruise goes to the same task, so a track is only ever computed once
+  if chunksize is None:
+    chunksize = 1
+  chunks = main.group_chunks(uids, int(chunksize))
+elif chunksize is not None or queuefile is not None:
+  chunksize = int(chunksize or 100)
+  chunks = [[uid[0] for uid in uids[i:i+chunksize]] for i in range(0, len(uids), chunksize)]
 else:
-  startindex  = 0
-  endindex    = len(uids)
+  chunks = None
+
+if queuefile is not None:
+  # the first process to reach an empty queue fills it; every process then works through it
+  workQueue = WorkQueue(queuefile)
+  if workQueue.fill(chunks, todo):
+    print('queued {} chunks of profiles in {}'.format(len(chunks), queuefile))
+  else:
+    print('joining the queue in', queuefile)
+
 pool = Pool(processes=int(cores))
-for i in range(startindex, endindex):
-  pool.apply_async(process_row, (uids[i][0], logdir, dbtable, targetdb))
+if queuefile is not None:
+  for i in range(int(cores)):
+    pool.apply_async(queue_worker, (logdir, dbtable, targetdb))
+elif chunks is not None:
+  for chunk in chunks:
+    pool.apply_async(process_rows, (chunk, logdir, dbtable, targetdb, None if todo is None else {uid: todo[uid] for uid in chunk}))
+else:
+  for uid in uids:
+    pool.apply_async(process_row, (uid[0], logdir, dbtable, targetdb, None if todo is None else todo[uid[0]]))
 pool.close()
 pool.join()
 
+if queuefile is not None:
+  status = workQueue.status()
+  print('queue status:', ', '.join(['{} {}'.format(n, state) for state, n in sorted(status.items())]))
+  wholetable = wholetable and list(status) == ['done']
 
+# a full pass over the table leaves every result produced by the current version of its test
+if not resume and wholetable:
+  incremental.record_versions(dbtable, testNames, targetdb)
@@ -0,0 +1,182 @@
+import sys, os, getopt, json, copy, time, datetime, subprocess, tempfile, shutil, io, contextlib
+import numpy as np
+import util.main as main
+from util import synthetic
+from util.parameters import LazyParameters
+
+'''
+Times each qc test over reproducible synthetic workloads of XBT, CTD, Argo float and
+bottle profiles, and reports profiles and levels checked per second. Runs offline:
+tests whose auxiliary data files are missing use synthetic stand-ins where there are
+some, and are skipped otherwise. Tests that raise on every profile of a workload, eg
+because they fetch data over the network or their dependencies are the wrong version,
+are reported as skipped for it rather than timed, since only their failure would be.
+Results can be saved as json, and compared with those saved from another commit.
+
+Usage: python benchmark-qctests.py [-n <profiles per workload>] [-s <tests>] [-o <json out>] [-c <json to compare with>]
+'''
+
+# parse options
+options, remainder = getopt.getopt(sys.argv[1:], 'n:w:s:r:e:o:c:h')
+nprofiles = 50
+names = synthetic.kindNames
+patterns = None
+repeats = 3
+seed = 0
+outfile = None
+baselinefile = None
+for opt, arg in options:
+    if opt == '-c':
+        baselinefile = arg
+    if opt == '-e':
+        seed = int(arg)
+    if opt == '-n':
+        nprofiles = int(arg)
+    if opt == '-o':
+        outfile = arg
+    if opt == '-r':
+        repeats = int(arg)
+    if opt == '-s':
+        patterns = arg.split(',')
+    if opt == '-w':
+        names = arg.split(',')
+    if opt == '-h':
+        print('usage:')
+        print('-n <number of profiles in each workload, default 50>')
+        print('-w <comma separated workloads to run, from ' + ', '.join(synthetic.kindNames) + '; default all>')
+        print('-s <comma separated qc test names or wildcards to time; default all>')
+        print('   tests raising on every profile of a workload, eg for want of a network connection, are listed as skipped for it')
+        print('-r <times to run each test over each workload, keeping the fastest; default 3, fewer for tests taking over 10s>')
+        print('-e <random seed for the workloads, default 0>')
+        print('-o <file to save the results in, as json>')
+        print('-c <json file saved by an earlier run, to compare against>')
+        print('-h print this help message and quit')
+        sys.exit()
+
+# work out which tests can run here, and which need stand-ins for their data
+tests = sorted(main.importQC('qctests'))
+if patterns is not None:
+    tests = main.selectQCTests(tests, patterns)
+required = main.requiredQCTests(tests)
+with contextlib.redirect_stdout(io.StringIO()):
+    withdata = main.checkQCTestRequirements(required)
+reasons = io.StringIO()
+with contextlib.redirect_stdout(reasons):
+    runnable = main.checkQCTestRequirements(required, datastubs=list(synthetic.stubs))
+skipped = {}
+for line in reasons.getvalue().splitlines():
+    test, reason = line.strip().split(' ', 1)
+    skipped.setdefault(test, reason)
+
+registry = main.buildQCRegistry(runnable)
+stubbed = sorted([test for test in runnable if test in synthetic.stubs and test not in withdata])
+for test in stubbed:
+    registry[test]['loadParameters'] = synthetic.stubs[test]
+
+# the workloads, and a scratch database holding them for the tests that look profiles up
+workloads = synthetic.workloads(nprofiles, seed, names)
+scratch = tempfile.mkdtemp()
+targetdb = os.path.join(scratch, 'synthetic.db')
+synthetic.writeTable([p for kind in names for p in workloads[kind]], 'synthetic', targetdb)
+parameterStore = LazyParameters(registry, {
+    "table": 'synthetic',
+    "db": targetdb,
+    "persist_intermediates": False
+})
+
+baseline = None
+if baselinefile is not None:
+    with open(baselinefile) as f:
+        baseline = json.load(f)
+    if (baseline['profiles'], baseline['seed']) != (nprofiles, seed):
+        print('warning: {} timed {} profiles per workload with seed {}, so comparisons are not like for like'.format(baselinefile, baseline['profiles'], baseline['seed']))
+
+print('{0:>35s} {1:>7s} {2:>9s} {3:>11s} {4:>5s} {5:>8s}'.format('NAME OF TEST', 'DATA', 'PRO/s', 'LEVELS/s', 'EXC', 'SPEEDUP'))
+results = {}
+for test in tests:
+    if test not in runnable:
+        continue
+    parameterStore.require(test)
+    if test in parameterStore.failed:
+        skipped[test] = 'could not load parameters'
+        continue
+
+    results[test] = {}
+    failed = {}
+    for kind in names:
+        nlevels = sum([p.n_levels() for p in workloads[kind]])
+        fastest = None
+        spent = 0
+        # slow tests get fewer goes, so a full run stays manageable
+        for i in range(repeats):
+            if spent > 10:
+                break
+            # fresh profiles each time, so nothing memoized on them is reused, and no stored track results
+            profiles = copy.deepcopy(workloads[kind])
+            main.dbinteract('UPDATE synthetic SET ' + test.lower() + ' = NULL;', targetdb=targetdb)
+            exceptions = 0
+            start = time.perf_counter()
+            for p in profiles:
+                try:
+                    registry[test]['test'](p, parameterStore)
+                except Exception as error:
+                    exceptions += 1
+                    lasterror = error
+            seconds = time.perf_counter() - start
+            spent += seconds
+            if fastest is None or seconds < fastest:
+                fastest = seconds
+
+        # a rate for a test that never ran to completion would only time its failure
+        if exceptions == len(profiles):
+            failed[kind] = 'raised on every profile, eg ' + type(lasterror).__name__ + ': ' + (str(lasterror).splitlines() or [''])[0]
+            continue
+
+        results[test][kind] = {
+            'seconds': fastest,
+            'profiles_per_second': len(profiles) / fastest,
+            'levels_per_second': nlevels / fastest,
+            'exceptions': exceptions
+        }
+        speedup = '-'
+        if baseline is not None and kind in baseline['results'].get(test, {}):
+            speedup = 'x{:.2f}'.format(baseline['results'][test][kind]['seconds'] / fastest)
+        print('{0:>35s} {1:>7s} {2:9.1f} {3:11.0f} {4:5d} {5:>8s}'.format(
+            test, kind, len(profiles) / fastest, nlevels / fastest, exceptions, speedup))
+
+    if not results[test]:
+        del results[test]
+        skipped[test] = failed[names[0]]
+    else:
+        for kind in failed:
+            skipped[test + ' on ' + kind] = failed[kind]
+
+for test in sorted(skipped):
+    print('skipped', test + ':', skipped[test])
+if stubbed:
+    print('with synthetic stand-ins for the data of', ', '.join(stubbed))
+
+main.disconnect(targetdb)
+shutil.rmtree(scratch)
+
+if outfile is not None:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip() or None
+    except:
+        commit = None
+    summary = {
+        'commit': commit,
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'profiles': nprofiles,
+        'seed': seed,
+        'repeats': repeats,
+        'workloads': {kind: {'profiles': len(workloads[kind]), 'levels': sum([p.n_levels() for p in workloads[kind]])} for kind in names},
+        'results': results,
+        'stubbed': stubbed,
+        'skipped': skipped
+    }
+    with open(outfile, 'w') as f:
+        json.dump(summary, f, indent=2)
+    print('results written to', outfile)
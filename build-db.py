@@ -1,11 +1,13 @@
 # usage help: python build-db.py -h
 
 from wodpy import wod
-import sys, sqlite3, getopt
+import sys, sqlite3, getopt, time
 import util.main as main
 import util.dbutils as dbutils
 import numpy as np
 import qctests.CSIRO_wire_break
+import util.splitData as splitData
+from multiprocessing import Pool
 import ast
 
 def assessProfile(p, check_originator_flag_type, months_to_use):
@@ -68,10 +70,116 @@ def encodeTruth(p):
             truth[i] = 99
     return truth
 
+def readProfiles(infile):
+    'stream (wodpy profile, raw text) pairs from the WOD ascii file <infile>'
+
+    fid = open(infile)
+    while True:
+        start = fid.tell()
+        profile = wod.WodProfile(fid)
+        end = fid.tell()
+        fid.seek(start)
+        raw = fid.read(end-start)
+        fid.seek(end)
+        yield profile, raw
+        if profile.is_last_profile_in_file(fid) == True:
+            break
+    fid.close()
+
+def profileRow(profile, raw, check_originator_flag_type, months_to_use):
+    'return the tuple of values to insert into the db for <profile>, and whether it is flagged; None if the profile should be skipped'
+
+    # skip pathological profiles
+    if not assessProfile(profile, check_originator_flag_type, months_to_use):
+        return None
+
+    # set up dictionary for populating query string
+    p = profile.npdict()
+    p['raw'] = "'" + raw + "'"
+
+    # encode temperature error codes into truth array
+    truth = encodeTruth(profile)
+    p['truth'] = main.pack_array(truth)
+
+    # extract country code
+    country = profile.primary_header['Country code']
+
+    # originator cruise
+    orig_cruise = profile.originator_cruise()
+
+    # nowire == index of first wire break level
+    wireqc = qctests.CSIRO_wire_break.test(profile, {})
+    try:
+        nowire = list(wireqc).index(True)
+    except:
+        nowire = len(truth)
+    # flag only counts if its before the wire break:
+    flagged = dbutils.summarize_truth(truth[0:nowire])
+
+    # pre-extracted level arrays, so AutoQC needn't parse the raw text again
+    levels = [main.pack_array(p[var]) for var in ['z', 't', 's', 'p']]
+
+    # platform code, as used to spot aircraft in EN_track_check
+    platform = profile.extract_secondary_header(3)
+    if platform is not None:
+        platform = int(platform)
+
+    values = (p['raw'], p['truth'], p['uid'], p['year'], p['month'], p['day'], p['time'], p['latitude'], p['longitude'], country, p['cruise'], orig_cruise, p['probe_type'], int(flagged)) + tuple(levels) + (platform, p['n_levels'])
+    return values, flagged
+
+def assessProfiles(infile, check_originator_flag_type, months_to_use):
+    'yield the profileRow of every distinct profile in <infile>, in file order'
+
+    uids = set()
+    for profile, raw in readProfiles(infile):
+        # skip duplicate profiles in raw data
+        if profile.uid() in uids:
+            continue
+        uids.add(profile.uid())
+        yield profileRow(profile, raw, check_originator_flag_type, months_to_use)
+
+def assessShard(shard):
+    'profileRow for each (start, end) byte range of a shard of the input file; run in a worker process'
+
+    infile, ranges, check_originator_flag_type, months_to_use = shard
+    rows = []
+    fid = open(infile)
+    for start, end in ranges:
+        fid.seek(start)
+        raw = fid.read(end-start)
+        row = profileRow(main.text2wod(raw), raw, check_originator_flag_type, months_to_use)
+        if row is not None:
+            # blobs come back as memoryviews, which can't be sent between processes
+            row = (tuple([bytes(value) if type(value) is memoryview else value for value in row[0]]), row[1])
+        rows.append(row)
+    fid.close()
+    return rows
+
+def assessProfilesParallel(infile, check_originator_flag_type, months_to_use, processes, shardsize=100):
+    'as assessProfiles, but index the profile boundaries first, then parse and assess shards of them across <processes> workers'
+
+    uids = set()
+    ranges = []
+    for cruise, start, end, uid in splitData.indexProfiles(infile):
+        # skip duplicate profiles in raw data
+        if uid in uids:
+            continue
+        uids.add(uid)
+        ranges.append((start, end))
+    shards = [(infile, ranges[i:i+shardsize], check_originator_flag_type, months_to_use) for i in range(0, len(ranges), shardsize)]
+
+    pool = Pool(processes=processes)
+    for rows in pool.imap(assessShard, shards):
+        for row in rows:
+            yield row
+    pool.close()
+    pool.join()
+
 def builddb(infile, check_originator_flag_type = True,
-            months_to_use = range(1, 13), outfile='iquod.db', dbtable='iquod'):
+            months_to_use = range(1, 13), outfile='iquod.db', dbtable='iquod',
+            batchsize=1000, processes=1):
 
-    conn = sqlite3.connect(outfile, isolation_level=None)
+    conn = main.connect(outfile)
     cur = conn.cursor()
 
     # Identify tests
@@ -95,6 +203,12 @@ def builddb(infile, check_originator_flag_type = True,
                 probe integer,
                 training integer,
                 flagged integer,
+                depth BLOB,
+                temperature BLOB,
+                salinity BLOB,
+                pressure BLOB,
+                platform integer,
+                nlevels integer,
                 """
     for i in range(len(testNames)):
         query += testNames[i].lower() + ' BLOB'
@@ -105,102 +219,87 @@ def builddb(infile, check_originator_flag_type = True,
 
     cur.execute(query)
 
-    # populate table from wod-ascii data
-    fid = open(infile)
-    uids = []
+    # populate table from wod-ascii data, <batchsize> rows per transaction
+    insert = "INSERT INTO " + dbtable + " (raw, truth, uid, year, month, day, time, lat, long, country, cruise, ocruise, probe, flagged, depth, temperature, salinity, pressure, platform, nlevels) values (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?);"
+    rows = []
+    nread = 0
     good = 0
     bad = 0
-
-    while True:
-        # extract profile as wodpy object and raw text
-        start = fid.tell()
-        profile = wod.WodProfile(fid)
-        end = fid.tell()
-        fid.seek(start)
-        raw = fid.read(end-start)
-        fid.seek(end)
-        # set up dictionary for populating query string
-        p = profile.npdict()
-        p['raw'] = "'" + raw + "'"
-
-        # check for duplicate profiles in raw data
-        if p['uid'] in uids:
-            if profile.is_last_profile_in_file(fid) == True:
-                break
-            else:
-                continue
-        uids.append(p['uid'])
-
-        # skip pathological profiles
-        isgood = assessProfile(profile, check_originator_flag_type, months_to_use)
-        if not isgood and profile.is_last_profile_in_file(fid) == True:
-            break
-        elif not isgood:
+    starttime = time.time()
+
+    def write(rows):
+        with main.transaction(outfile) as cur:
+            cur.executemany(insert, rows)
+        elapsed = time.time() - starttime
+        print('assessed', nread, 'profiles, wrote', good+bad, 'in', round(elapsed, 1), 's,', round(nread/max(elapsed, 1e-9), 1), 'profiles/s')
+
+    # writes all happen here, in this process; with more than one process, workers only parse and assess
+    if processes > 1:
+        assessed = assessProfilesParallel(infile, check_originator_flag_type, months_to_use, processes)
+    else:
+        assessed = assessProfiles(infile, check_originator_flag_type, months_to_use)
+
+    for row in assessed:
+        nread += 1
+        if row is None:
             continue
 
-        # encode temperature error codes into truth array
-        truth = encodeTruth(profile)
-        p['truth'] = main.pack_array(truth)
-
-        # extract country code
-        country = profile.primary_header['Country code']
-
-        # originator cruise
-        orig_cruise = profile.originator_cruise()
-
         # keep tabs on how many good and how many bad profiles have been added to db
-        # nowire == index of first wire break level
-        wireqc = qctests.CSIRO_wire_break.test(profile, {})
-        try:
-            nowire = list(wireqc).index(True)
-        except:
-            nowire = len(truth)
-        # flag only counts if its before the wire break:
-        flagged = dbutils.summarize_truth(truth[0:nowire])
+        values, flagged = row
         if flagged:
             bad += 1
         else:
             good += 1
 
-        query = "INSERT INTO " + dbtable + " (raw, truth, uid, year, month, day, time, lat, long, country, cruise, ocruise, probe, flagged) values (?,?,?,?,?,?,?,?,?,?,?,?,?,?);"
-        values = (p['raw'], p['truth'], p['uid'], p['year'], p['month'], p['day'], p['time'], p['latitude'], p['longitude'], country, p['cruise'], orig_cruise, p['probe_type'], int(flagged))
-        main.dbinteract(query, values, targetdb=outfile)
-        if profile.is_last_profile_in_file(fid) == True:
-            break
+        rows.append(values)
+        if len(rows) >= batchsize:
+            write(rows)
+            rows = []
+
+    if len(rows) > 0:
+        write(rows)
 
-    conn.commit()
     print('number of clean profiles written:', good)
     print('number of flagged profiles written:', bad)
     print('total number of profiles written:', good+bad)
 
-# parse options
-options, remainder = getopt.getopt(sys.argv[1:], 'o:i:d:fm:h')
-inputdata = None
-dbtable = 'iquod'
-outfile = 'iquod.db'
-origflags = True
-months = range(1, 13)
-for opt, arg in options:
-    if opt == '-o':
-        outfile = arg
-    if opt == '-i':
-        inputdata = arg
-    if opt == '-d':
-        dbtable = arg
-    if opt == '-f':
-        origflags = False
-    if opt == '-m':
-        months = ast.literal_eval(arg)
-    if opt == '-h':
-        print('usage:')
-        print('-d <db table name to create and write to>')
-        print('-f dont check originator flags')
-        print('-h print this help message and quit')
-        print('-i <filename of raw WOD ascii data> (mandatory)')
-        print('-o <output file name>')
-        print('-m <list of months to include>')
-if inputdata is None:
-    print('Must provide raw ascii input data file with the flag `-i`')
-
-builddb(inputdata, check_originator_flag_type = origflags, months_to_use = months, outfile = outfile, dbtable = dbtable)
+if __name__ == '__main__':
+    # parse options
+    options, remainder = getopt.getopt(sys.argv[1:], 'o:i:d:fm:b:n:h')
+    inputdata = None
+    dbtable = 'iquod'
+    outfile = 'iquod.db'
+    origflags = True
+    months = range(1, 13)
+    batchsize = 1000
+    processes = 1
+    for opt, arg in options:
+        if opt == '-o':
+            outfile = arg
+        if opt == '-i':
+            inputdata = arg
+        if opt == '-d':
+            dbtable = arg
+        if opt == '-f':
+            origflags = False
+        if opt == '-m':
+            months = ast.literal_eval(arg)
+        if opt == '-b':
+            batchsize = int(arg)
+        if opt == '-n':
+            processes = int(arg)
+        if opt == '-h':
+            print('usage:')
+            print('-b <number of profiles to insert per transaction>')
+            print('-d <db table name to create and write to>')
+            print('-f dont check originator flags')
+            print('-h print this help message and quit')
+            print('-i <filename of raw WOD ascii data> (mandatory)')
+            print('-o <output file name>')
+            print('-m <list of months to include>')
+            print('-n <number of processes to parse and assess profiles with>')
+    if inputdata is None:
+        print('Must provide raw ascii input data file with the flag `-i`')
+
+    builddb(inputdata, check_originator_flag_type = origflags, months_to_use = months, outfile = outfile, dbtable = dbtable, batchsize = batchsize, processes = processes)
 
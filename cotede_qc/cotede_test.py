@@ -5,6 +5,7 @@ import json
 import logging
 import numpy as np
 from wodpy.extra import Wod4CoTeDe
+import util.main as main
 
 '''Runs QC tests from the CoTeDe package.
    CoTeDe (https://github.com/castelao/CoTeDe) is copyright (c) 2011-2015, Guilherme Pimenta Castelao.
@@ -18,17 +19,14 @@ def get_qc(p, config, test):
          test is the specific test to get the results from.
     '''
 
-    global cotede_results
-
     # Disable logging messages from CoTeDe unless they are more
     # severe than a warning.
     logging.disable(logging.WARNING)
 
-    # Create a dummy results variable if this is the first call.
-    try:
-        cotede_results
-    except NameError:
-        cotede_results = [-1, '', {}, None]
+    # The results of the last CoTeDe run on this profile are kept in its memo,
+    # rather than a global, so tests running concurrently don't clash.
+    memo = main.profile_memo(p)
+    cotede_results = memo.get('cotede', [-1, '', {}, None])
 
     var = 'TEMP'
 
@@ -66,6 +64,7 @@ def get_qc(p, config, test):
         pqc = ProfileQC(inputs, cfg=cfg)
 
         cotede_results = [p.uid(), config, pqc.flags[var].keys(), pqc]
+        memo['cotede'] = cotede_results
 
     # Get the QC results, which use the IOC conventions.
     # cfg was previously reduced to a single test. By using the overall flag
@@ -13,20 +13,21 @@ def test(p, parameters):
     isDepth = (p.z().mask==False)
     isData = isTemperature & isDepth
 
-    # extract climatology data
-    lonlatWithTempsList1, depthColumns1, latLonsList1 = subset_climatology_data(p.longitude(), p.latitude(), "analyzed mean")
-    lonlatWithTempsList2, depthColumns2, latLonsList2 = subset_climatology_data(p.longitude(), p.latitude(), "standard deviations")
-
-    for i in range(p.n_levels()):
-
-        # find best interpolated temperature and standard deviation at this depth
-        if not isData[i]: continue
-
-        interpTemp = interp_helper.temperature_interpolation_process(p.longitude(), p.latitude(), p.z()[i], depthColumns1, latLonsList1, lonlatWithTempsList1, False, "climaInterpTemperature")
-        if interpTemp == 99999.99:
-            continue
-
-        interpTempSD = interp_helper.temperature_interpolation_process(p.longitude(), p.latitude(), p.z()[i], depthColumns2, latLonsList2, lonlatWithTempsList2, False, "climaInterpStandardDev")
+    # extract climatology data around the profile
+    fields = None
+    if parameters is not None:
+        fields = parameters.get('aomlclimatology')
+    latLons1, temps1, depthColumns1, depthIndex1 = climatology_neighbourhood(p.longitude(), p.latitude(), "analyzed mean", fields=fields)
+    latLons2, temps2, depthColumns2, depthIndex2 = climatology_neighbourhood(p.longitude(), p.latitude(), "standard deviations", fields=fields)
+
+    # find best interpolated temperature and standard deviation at each depth
+    depths = numpy.ma.getdata(p.z())
+    levels = [i for i in range(p.n_levels()) if isData[i]]
+    interpTemps = interp_helper.profile_interpolation_process(p.longitude(), p.latitude(), [depths[i] for i in levels], depthColumns1, latLons1, temps1, False, "climaInterpTemperature", depthIndex=depthIndex1)
+    levels = [(i, interpTemp) for i, interpTemp in zip(levels, interpTemps) if interpTemp != 99999.99]
+    interpTempSDs = interp_helper.profile_interpolation_process(p.longitude(), p.latitude(), [depths[i] for i, interpTemp in levels], depthColumns2, latLons2, temps2, False, "climaInterpStandardDev", depthIndex=depthIndex2)
+
+    for (i, interpTemp), interpTempSD in zip(levels, interpTempSDs):
         if interpTempSD == 99999.99:
             continue
 
@@ -80,3 +81,34 @@ def subset_climatology_data(longitude, latitude, statType, coordRange=1, filePat
 
   return latLonDepthTempList, depthColumns, latLonList
 
+
+def loadParameters(parameterStore):
+  # the analyzed mean and standard deviation fields, read whole rather than subset per profile
+  parameterStore['aomlclimatology'] = {
+    fieldType: read_netcdf.ClimatologyField('data/woa13_00_025.nc', fieldType, preload=True) for fieldType in ['t_an', 't_sd']
+  }
+
+def climatology_neighbourhood(longitude, latitude, statType, coordRange=1, filePathName='data/woa13_00_025.nc', fields=None):
+  """
+    As subset_climatology_data, but reading from the preloaded <fields> if
+    given (see loadParameters), or else from a climatology file kept open
+    by this process, and returning arrays:
+    (n, 2) array of latitude and longitude points, (n, depths) array of
+    temperatures with nan where missing, the depth measurements, and a
+    CoordinateIndex over them
+  """
+
+  if statType == "analyzed mean":
+    fieldType = "t_an"
+  elif statType == "standard deviations":
+    fieldType = "t_sd"
+  else:
+    raise ValueError("Cannot process climatology file with a statistical field as " + statType)
+
+  if fields is not None:
+    field = fields[fieldType]
+  else:
+    field = read_netcdf.climatology_field(filePathName, fieldType)
+  latLons, temps = field.neighbourhood(longitude, latitude, coordRange)
+
+  return latLons, temps, field.deps, field.depthIndex
@@ -9,7 +9,9 @@ import numpy as np
 import util.obs_utils as outils
 from netCDF4 import Dataset
 import util.main as main
-from util.dbutils import retrieve_existing_qc_result
+import util.auxdata as auxdata
+import copy
+from util.dbutils import memoized_qc_result
 
 def test(p, parameters):
     """
@@ -18,16 +20,9 @@ def test(p, parameters):
     passed the check and True where it failed.
     """
 
-    # Check if the QC of this profile was already done and if not
-    # run the QC.
-    qc_log = retrieve_existing_qc_result('en_background_check', 
-                                         p.uid(),
-                                         parameters['table'], 
-                                         parameters['db'])
-    if qc_log is not None:
-        return qc_log
-
-    return run_qc(p, parameters)
+    # Reuse the QC of this profile if it was already done, in this process
+    # or by a previous run, and if not run the QC.
+    return memoized_qc_result('en_background_check', p, parameters, run_qc)
 
 def run_qc(p, parameters):
     """
@@ -131,8 +126,12 @@ def run_qc(p, parameters):
     return qc
 
 def record_parameters(profile, bgStdLevels, bgevStdLevels, origLevels, ptLevels, bgLevels, parameters):
-    # pack the parameter arrays into the enbackground table
-    # for consumption by the buddy check
+    # keep the parameter arrays in the profile's memo for consumption by the buddy check,
+    # and pack them into the enbackground table for reuse by other processes
+
+    main.profile_memo(profile)['enbackground'] = copy.deepcopy((bgStdLevels, bgevStdLevels, origLevels, ptLevels, bgLevels))
+    if not main.persist_intermediates(parameters):
+        return
 
     bgstdlevels = main.pack_array(bgStdLevels)
     bgevstdlevels = main.pack_array(bgevStdLevels)
@@ -142,6 +141,22 @@ def record_parameters(profile, bgStdLevels, bgevStdLevels, origLevels, ptLevels,
     query = "REPLACE INTO enbackground VALUES(?,?,?,?,?,?);"
     main.dbinteract(query, [profile.uid(), bgstdlevels, bgevstdlevels, origlevels, ptlevels, bglevels], targetdb=parameters["db"])
 
+def background_parameters(p, parameters):
+    '''
+    return (bgstdlevels, bgevstdlevels, origlevels, ptlevels, bglevels) as recorded for profile p
+    by the background check, from the profile's memo, else the enbackground table,
+    else by running the check again.
+    '''
+
+    def compute():
+        query = 'SELECT bgstdlevels, bgevstdlevels, origlevels, ptlevels, bglevels FROM enbackground WHERE uid = ' + str(p.uid())
+        enbackground_pars = main.dbinteract(query, targetdb=parameters["db"])
+        if enbackground_pars:
+            return tuple(main.unpack_row(enbackground_pars[0]))
+        run_qc(p, parameters)
+        return main.profile_memo(p)['enbackground']
+
+    return main.memoize(p, 'enbackground', compute)
 
 def findGridCell(p, gridLong, gridLat):
     '''
@@ -184,12 +199,11 @@ def estimatePGE(probe_type, isSuspect):
 
     return pge
 
-def readENBackgroundCheckAux():
+def readENBackgroundCheckAux(filename='data/EN_bgcheck_info.nc'):
     '''
     Reads auxiliary information needed by the EN background check.
     '''
 
-    filename = 'data/EN_bgcheck_info.nc'
     nc = Dataset(filename)
     data = {}
     data['lon']   = nc.variables['longitude'][:]
@@ -205,7 +219,8 @@ def readENBackgroundCheckAux():
 def loadParameters(parameterStore):
 
     main.dbinteract("CREATE TABLE IF NOT EXISTS enbackground (uid INTEGER PRIMARY KEY, bgstdlevels BLOB, bgevstdlevels BLOB, origlevels BLOB, ptlevels BLOB, bglevels BLOB)", targetdb=parameterStore["db"])
-    parameterStore['enbackground'] = readENBackgroundCheckAux()
+    # memory-mapped, so all the workers share one copy of the climatology
+    parameterStore['enbackground'] = auxdata.shared_arrays('enbackground', readENBackgroundCheckAux, ['data/EN_bgcheck_info.nc'])
 
 
 
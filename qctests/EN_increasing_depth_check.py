@@ -6,7 +6,7 @@ from . import EN_spike_and_step_check
 import numpy as np
 from collections import Counter
 import util.main as main
-from util.dbutils import retrieve_existing_qc_result
+from util.dbutils import memoized_qc_result
 
 def test(p, parameters):
     """
@@ -15,16 +15,9 @@ def test(p, parameters):
     passed the check and True where it failed.
     """
 
-    # Check if the QC of this profile was already done and if not
-    # run the QC.
-    qc_log = retrieve_existing_qc_result('en_increasing_depth_check', 
-                                         p.uid(),
-                                         parameters['table'], 
-                                         parameters['db'])
-    if qc_log is not None:
-        return qc_log
-        
-    return run_qc(p, parameters)
+    # Reuse the QC of this profile if it was already done, in this process
+    # or by a previous run, and if not run the QC.
+    return memoized_qc_result('en_increasing_depth_check', p, parameters, run_qc)
 
 def mask_index(mat, index):
     """
@@ -21,7 +21,9 @@ def test(p, parameters, suspect=False):
     set to True the test instead returns suspect levels.
     """
     
-    return run_qc(p, suspect, parameters)
+    if suspect:
+        return main.memoize(p, 'enspikeandstep', lambda: run_qc(p, suspect, parameters))
+    return main.memoize(p, 'en_spike_and_step_check', lambda: run_qc(p, suspect, parameters))
 
 def run_qc(p, suspect, parameters):
 
@@ -101,7 +103,7 @@ def run_qc(p, suspect, parameters):
             qc[:] = True
 
     # register suspects, if computed, to db
-    if suspect:
+    if suspect and main.persist_intermediates(parameters):
         query = "REPLACE INTO enspikeandstep VALUES(?,?);"
         main.dbinteract(query, [p.uid(), main.pack_array(qc)], targetdb=parameters["db"] )
 
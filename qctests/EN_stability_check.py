@@ -5,7 +5,7 @@ http://www.metoffice.gov.uk/hadobs/en3/OQCpaper.pdf
 
 import math, numpy
 import util.main as main
-from util.dbutils import retrieve_existing_qc_result
+from util.dbutils import memoized_qc_result
 from util import obs_utils
 
 def test(p, parameters):
@@ -15,16 +15,9 @@ def test(p, parameters):
     passed the check and True where it failed. 
     """
 
-    # Check if the QC of this profile was already done and if not
-    # run the QC.
-    qc_log = retrieve_existing_qc_result('en_stability_check', 
-                                         p.uid(),
-                                         parameters['table'], 
-                                         parameters['db'])
-    if qc_log is not None:
-        return qc_log
-        
-    return run_qc(p, parameters)
+    # Reuse the QC of this profile if it was already done, in this process
+    # or by a previous run, and if not run the QC.
+    return memoized_qc_result('en_stability_check', p, parameters, run_qc)
 
 def run_qc(p, parameters):
 
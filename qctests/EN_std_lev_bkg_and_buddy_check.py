@@ -33,9 +33,7 @@ def test(p, parameters, allow_level_reinstating=True):
     levels, origLevels, assocLevels = result
     # Retrieve the background and observation error variances and
     # the background values.
-    query = 'SELECT bgstdlevels, bgevstdlevels FROM enbackground WHERE uid = ' + str(p.uid())
-    enbackground_pars = main.dbinteract(query, targetdb=parameters["db"])
-    enbackground_pars = main.unpack_row(enbackground_pars[0])
+    enbackground_pars = EN_background_check.background_parameters(p, parameters)
 
     bgsl = enbackground_pars[0]
     slev = parameters['enbackground']['depth']
@@ -46,18 +44,11 @@ def test(p, parameters, allow_level_reinstating=True):
     pgeData = determine_pge(levels, bgev, obev, p)
 
     # Find buddy.
-    profiles = get_profile_info(parameters)
-    minDist  = 1000000000.0
-    iMinDist = None
-    for iProfile, profile in enumerate(profiles):
-        pDist = assessBuddyDistance(p, profile)
-        if pDist is not None and pDist < minDist:
-            minDist  = pDist
-            iMinDist = iProfile
+    minDist, buddyUid = buddyIndex(parameters).closest(p)
 
     # Check if we have found a buddy and process if so.
-    if minDist <= 400000:
-        pBuddy = main.get_profile_from_db(profiles[iMinDist][0], parameters['table'], parameters['db'])
+    if minDist is not None and minDist <= 400000:
+        pBuddy = main.get_profile_from_db(buddyUid, parameters['table'], parameters['db'])
 
         # buddy vetos
         Fail = False
@@ -72,14 +63,11 @@ def test(p, parameters, allow_level_reinstating=True):
 
           result = stdLevelData(pBuddy, parameters)
 
-          query = 'SELECT bgevstdlevels FROM enbackground WHERE uid = ' + str(pBuddy.uid())
-          buddy_pars = main.dbinteract(query, targetdb=parameters["db"])
-
-          buddy_pars = main.unpack_row(buddy_pars[0])
+          buddy_pars = EN_background_check.background_parameters(pBuddy, parameters)
 
           if result is not None: 
             levelsBuddy, origLevelsBuddy, assocLevelsBuddy = result
-            bgevBuddy = buddy_pars[0]
+            bgevBuddy = buddy_pars[1]
             pgeBuddy  = determine_pge(levels, bgevBuddy, obev, pBuddy)
             pgeData   = update_pgeData(pgeData, pgeBuddy, levels, levelsBuddy, minDist, p, pBuddy, obev, bgev, bgevBuddy)
 
@@ -136,6 +124,75 @@ def test(p, parameters, allow_level_reinstating=True):
 
     return qc
 
+def loadParameters(parameterStore):
+    # every usable profile in the table, indexed by year, month and latitude for the buddy search
+    parameterStore['buddyindex'] = BuddyIndex(get_profile_info(parameterStore))
+
+def buddyIndex(parameters):
+    '''
+    the buddy index loaded by loadParameters, or a fresh one for the current table contents
+    '''
+
+    if 'buddyindex' in parameters:
+        return parameters['buddyindex']
+    return BuddyIndex(get_profile_info(parameters))
+
+class BuddyIndex:
+    '''
+    the (uid, year, month, cruise, lat, long) rows returned by get_profile_info, partitioned
+    by year and month and sorted by latitude within each partition, so that the candidate
+    buddies of a profile can be found without scanning the whole table.
+    '''
+
+    def __init__(self, rows):
+        partitions = {}
+        for position, row in enumerate(rows):
+            if row[4] is None or row[5] is None: continue
+            partitions.setdefault((row[1], row[2]), []).append((row[4], position, row))
+
+        self.partitions = {}
+        for key, entries in partitions.items():
+            entries.sort(key=lambda entry: (entry[0], entry[1]))
+            self.partitions[key] = {
+                'uid': np.array([entry[2][0] for entry in entries]),
+                'cruise': np.array([entry[2][3] for entry in entries], dtype=object),
+                'lat': np.array([entry[2][4] for entry in entries], dtype=float),
+                'long': np.array([entry[2][5] for entry in entries], dtype=float),
+                'position': np.array([entry[1] for entry in entries])
+            }
+
+    def closest(self, p):
+        '''
+        return (distance, uid) of the closest valid buddy of profile <p>, as assessBuddyDistance
+        would find scanning the rows in order (earliest row wins ties), or (None, None) if there is none.
+        '''
+
+        partition = self.partitions.get((p.year(), p.month()))
+        if partition is None: return None, None
+        lat = p.latitude()
+        lon = p.longitude()
+
+        # rough cut on latitude with some slack; the exact test is repeated below.
+        start = np.searchsorted(partition['lat'], lat - 6, side='left')
+        end = np.searchsorted(partition['lat'], lat + 6, side='right')
+        latComp = partition['lat'][start:end]
+        lonComp = partition['long'][start:end]
+        keep = (np.abs(latComp - lat) <= 5) & \
+               (partition['uid'][start:end] != p.uid()) & \
+               ~(partition['cruise'][start:end] == p.cruise()).astype(bool)
+        if not np.any(keep): return None, None
+        latComp = latComp[keep]
+        lonComp = lonComp[keep]
+        uids = partition['uid'][start:end][keep]
+        positions = partition['position'][start:end][keep]
+
+        # same wrapping at the edge of the map as assessBuddyDistance
+        lonComp = np.where(np.abs(lonComp - lon) > 180, np.where(lonComp < lon, lonComp + 360.0, lonComp - 360.0), lonComp)
+        dists = haversine(lat, lon, latComp, lonComp)
+
+        closest = np.lexsort((positions, dists))[0]
+        return dists[closest], uids[closest]
+
 def determine_pge(levels, bgev, obev, profile):
     '''
     determine the probability of gross error per level given:
@@ -237,13 +294,11 @@ def stdLevelData(p, parameters):
              EN_stability_check.test(p, parameters))
 
     # Get the data stored by the EN background check.
-    # As it was run above we know that the data is available in the db.
-    query = 'SELECT origlevels, ptlevels, bglevels FROM enbackground WHERE uid = ' + str(p.uid())
-    enbackground_pars = main.dbinteract(query, targetdb=parameters["db"])
-    enbackground_pars = main.unpack_row(enbackground_pars[0])
-    origlevels = enbackground_pars[0]
-    ptlevels = enbackground_pars[1]
-    bglevels = enbackground_pars[2]
+    # As it was run above we know that the data is available.
+    enbackground_pars = EN_background_check.background_parameters(p, parameters)
+    origlevels = enbackground_pars[2]
+    ptlevels = enbackground_pars[3]
+    bglevels = enbackground_pars[4]
     origLevels = np.array(origlevels)
     diffLevels = (np.array(ptlevels) - np.array(bglevels))
     nLevels    = len(origLevels)
@@ -19,9 +19,6 @@ def test(p, parameters):
     passed the check and True where it failed.
     """
 
-    country = p.primary_header['Country code'] 
-    cruise = p.cruise()
-    originator_cruise = p.originator_cruise()
     uid = p.uid()
 
     # don't bother if this has already been analyzed
@@ -37,26 +34,26 @@ def test(p, parameters):
     if not assess_usability(p):
         return np.zeros(p.n_levels(), dtype=bool)
 
-    # fetch all profiles on track, sorted chronologically, earliest first (None sorted as highest), then by uid
-    command = 'SELECT uid, year, month, day, time, lat, long, probe, raw FROM ' + parameters["table"] + ' WHERE cruise = ' + str(cruise) + ' and country = "' + str(country) + '" and ocruise = "' + str(originator_cruise) + '" and year is not null and month is not null and day is not null and time is not null ORDER BY year, month, day, time, uid ASC;'
-    track_rows = main.dbinteract(command, targetdb=parameters["db"])
+    country = p.primary_header['Country code']
+    cruise = p.cruise()
+    originator_cruise = p.originator_cruise()
 
-    # avoid inappropriate profiles
-    track_rows = [tr for tr in track_rows if assess_usability_raw(tr[8][1:-1])]
+    # fetch all usable profiles on track, sorted chronologically, earliest first (None sorted as highest), then by uid
+    track_rows, n_levels = fetchTrack(country, cruise, originator_cruise, parameters)
 
     # start all as passing by default
     EN_track_results = {}
     for i in range(len(track_rows)):
-        EN_track_results[track_rows[i][0]] = np.zeros(n_levels_raw(track_rows[i][8][1:-1]), dtype=bool)
+        EN_track_results[track_rows[i][0]] = np.zeros(n_levels[i], dtype=bool)
 
-    # copy the list of headers;
+    # copy the list of headers, as a Track wherever positions and times are all present;
     # remove entries as they are flagged.
-    passed_rows = copy.deepcopy(track_rows)
+    passed_rows = buildTrack(track_rows)
     rejects = findOutlier(passed_rows, EN_track_results)
 
     while rejects != []:
-        passed_index = [x for x in range(len(passed_rows)) if x not in rejects ]
-        passed_rows = [passed_rows[index] for index in passed_index ]
+        for reject in sorted(set([x for x in rejects if x in range(len(passed_rows))]), reverse=True):
+            del passed_rows[reject]
         rejects = findOutlier(passed_rows, EN_track_results)
 
     # if more than half got rejected, reject everyone
@@ -73,6 +70,32 @@ def test(p, parameters):
     main.interact_many(query, result, targetdb=parameters['db'])
     return EN_track_results[uid]
 
+# columns build-db.py writes that let tracks be assessed without parsing raw text
+headerColumns = ['probe', 'platform', 'nlevels']
+
+def fetchTrack(country, cruise, originator_cruise, parameters):
+    '''
+    fetch the usable rows of the given track, sorted chronologically, earliest first, then by uid,
+    as (uid, year, month, day, time, lat, long, probe) tuples, and the number of levels in each.
+    uses header columns only where the table has them, and parses the raw text otherwise.
+    '''
+
+    where = ' WHERE cruise = ' + str(cruise) + ' and country = "' + str(country) + '" and ocruise = "' + str(originator_cruise) + '" and year is not null and month is not null and day is not null and time is not null ORDER BY year, month, day, time, uid ASC;'
+
+    if set(headerColumns).issubset(main.table_columns(parameters["table"], parameters["db"])):
+        command = 'SELECT uid, year, month, day, time, lat, long, probe, platform, nlevels FROM ' + parameters["table"] + where
+        track_rows = main.dbinteract(command, targetdb=parameters["db"])
+        # every row already shares a cruise, country, originator cruise and full timestamp with a usable profile
+        track_rows = [tr for tr in track_rows if tr[7] is not None and not isAircraftPlatform(tr[8])]
+        return [tr[0:8] for tr in track_rows], [tr[9] for tr in track_rows]
+
+    command = 'SELECT uid, year, month, day, time, lat, long, probe, raw FROM ' + parameters["table"] + where
+    track_rows = main.dbinteract(command, targetdb=parameters["db"])
+
+    # avoid inappropriate profiles
+    track_rows = [tr for tr in track_rows if assess_usability_raw(tr[8][1:-1], tr[0])]
+    return [tr[0:8] for tr in track_rows], [n_levels_raw(tr[8][1:-1], tr[0]) for tr in track_rows]
+
 #def sliceTrack(p, rows, margin=7):
 #    '''
 #    remove all table rows from rows whose dates are more than margin days before or after the month that p falls in
@@ -96,34 +119,47 @@ def assess_usability(p):
     given a profile p, return true if the track check is suitable for this profile
     '''
 
+    platform = p.extract_secondary_header(3)
+    if platform is not None:
+        platform = int(platform)
+
+    return assess_usability_header(p.primary_header['Country code'], p.cruise(), p.originator_cruise(),
+                                   p.year(), p.month(), p.day(), p.time(), p.probe_type(), platform)
+
+def assess_usability_header(country, cruise, originator_cruise, year, month, day, time, probe, platform=None):
+    '''
+    given the header values of a profile, as stored in the country, cruise, ocruise, year, month, day,
+    time, probe and platform columns, return true if the track check is suitable for that profile
+    '''
+
     # don't bother if cruise == 0 or None, or if timestamp is corrupt
-    if (p.cruise() in [0, None]) or (None in [p.year(), p.month(), p.day(), p.time()]):
+    if (cruise in [0, None]) or (None in [year, month, day, time]):
         return False
 
     # don't bother if country code is 99
-    if str(p.primary_header['Country code']) == '99':
+    if str(country) == '99':
         return False
 
     # don't bother if originator cruise is None or 0
-    if (p.originator_cruise() in [0, None]):
+    if (originator_cruise in [0, None]):
         return False
 
     # some detector types cannot be assessed by this test; do not raise flag.
-    if p.probe_type() in [None]:
+    if probe in [None]:
         return False
 
     # avoid aircraft
-    if isAircraft(p):
+    if isAircraftPlatform(platform):
         return False
 
     return True
 
-def assess_usability_raw(raw):
-    p = main.text2wod(raw)
+def assess_usability_raw(raw, uid=None):
+    p = main.text2wod(raw, uid)
     return assess_usability(p)
 
-def n_levels_raw(raw):
-    p = main.text2wod(raw)
+def n_levels_raw(raw, uid=None):
+    p = main.text2wod(raw, uid)
     return p.n_levels()
 
 def isAircraft(profile):
@@ -135,12 +171,119 @@ def isAircraft(profile):
     if platform is not None:
         platform = int(platform)
 
+    return isAircraftPlatform(platform)
+
+def isAircraftPlatform(platform):
+    '''
+    decide if platform code is an aircraft
+    '''
+
     return platform in [2635, 1053, 5178, 6876, 305, 879, 7841, 6743, 2911, 183]
 
 def aircraft_raw(raw):
     trk = main.text2wod(raw)
     return isAircraft(trk)
 
+class Track:
+    '''
+    a time-ordered list of track rows, held as numpy arrays of latitude, longitude and epoch seconds
+    alongside the speed and angle at each point, which are updated locally as points are deleted.
+    indexing returns the original row tuples, so a Track can stand in for the list of rows
+    in findOutlier, chooseReject and the condition_* functions.
+    '''
+
+    def __init__(self, rows, epochs):
+        self.rows = list(rows)
+        self.lat = np.array([row[5] for row in rows], dtype=float)
+        self.lon = np.array([row[6] for row in rows], dtype=float)
+        self.epoch = np.array(epochs, dtype=float)
+        self.ids = np.arange(len(rows))
+        # great circle distances between pairs of points, keyed by their original positions;
+        # shared with copies, as they never change.
+        self.distances = {}
+
+        self.speeds = np.full(len(rows), -99999.)
+        self.angles = np.full(len(rows), -99999.)
+        for i in range(1, len(rows)):
+            self.speeds[i] = self.speed(i-1, i)
+        for i in range(1, len(rows)-1):
+            self.angles[i] = self.angle(i)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        return self.rows[index]
+
+    def __copy__(self):
+        track = Track.__new__(Track)
+        track.__dict__.update(self.__dict__)
+        track.rows = list(self.rows)
+        return track
+
+    def __delitem__(self, index):
+        '''
+        drop the point at <index>, and recompute only the speed and angles that involved it.
+        '''
+
+        if index < 0:
+            index += len(self)
+        del self.rows[index]
+        self.lat = np.delete(self.lat, index)
+        self.lon = np.delete(self.lon, index)
+        self.epoch = np.delete(self.epoch, index)
+        self.ids = np.delete(self.ids, index)
+        self.speeds = np.delete(self.speeds, index)
+        self.angles = np.delete(self.angles, index)
+
+        n = len(self)
+        if n == 0:
+            return
+        self.speeds[0] = -99999.
+        if 0 < index < n:
+            self.speeds[index] = self.speed(index-1, index)
+        self.angles[[0, n-1]] = -99999.
+        for i in [index-1, index]:
+            if 0 < i < n-1:
+                self.angles[i] = self.angle(i)
+
+    def distance(self, i, j):
+        '''
+        great circle distance in meters between points i and j
+        '''
+
+        key = (min(self.ids[i], self.ids[j]), max(self.ids[i], self.ids[j]))
+        if key not in self.distances:
+            self.distances[key] = geo.haversineDistance(self.lat[i], self.lon[i], self.lat[j], self.lon[j])
+        return self.distances[key]
+
+    def speed(self, i, j):
+        '''
+        as trackSpeed, from point i to point j
+        '''
+
+        return (self.distance(i, j) - DistRes) / max(self.epoch[j] - self.epoch[i], TimeRes)
+
+    def angle(self, i):
+        '''
+        the trajectory angle at point i, as in calculateTraj
+        '''
+
+        return abs(math.pi - geo.sidesAngle(self.distance(i-1, i), self.distance(i, i+1), self.distance(i+1, i-1)))
+
+def buildTrack(rows):
+    '''
+    return a Track for the list of rows, or a copy of the list if any position or time is missing
+    or out of order, in which case the list-based calculations are used.
+    '''
+
+    epochs = [geo.epochSeconds((row[1], row[2], row[3], row[4])) for row in rows]
+    if None in epochs or None in [row[5] for row in rows] or None in [row[6] for row in rows]:
+        return copy.deepcopy(rows)
+    if any([later < earlier for earlier, later in zip(epochs[:-1], epochs[1:])]):
+        return copy.deepcopy(rows)
+    return Track(rows, epochs)
+
 def findOutlier(rows, results):
     '''
     given a list of rows, find the fastest one;
@@ -161,7 +304,7 @@ def findOutlier(rows, results):
     maxSpeed = maxShipSpeed
     if isBuoy(rows[0][7]):
         maxSpeed = maxBuoySpeed
-    iMax = speeds.index(max(speeds))
+    iMax = int(np.argmax(speeds))
     flag = detectExcessiveSpeed(speeds, angles, iMax, maxSpeed)
 
     # decide which profile to reject, flag it, and return a list of indices rejected at this step.
@@ -189,7 +332,7 @@ def chooseReject(rows, speeds, angles, index, maxSpeed):
     # if excessive speed is created by removing the flag, reject both instead
     # can't create new excessive speed by removing last profile.
     elif reject < len(rows)-1:
-        new_rows = copy.deepcopy(rows)
+        new_rows = copy.copy(rows)
         del new_rows[reject]
         newSpeeds, newAngles = calculateTraj(new_rows)
         flag = detectExcessiveSpeed(newSpeeds, newAngles, reject, maxSpeed)
@@ -205,9 +348,12 @@ def chooseReject(rows, speeds, angles, index, maxSpeed):
 def calculateTraj(rows):
     '''
     return a list of speeds and a list of angles describing the trajectory of the track described
-    by the time-ordered list of rows.
+    by the time-ordered list of rows; a Track already holds these.
     '''
 
+    if isinstance(rows, Track):
+        return rows.speeds, rows.angles
+
     speeds = [-99999]
     angles = [-99999]
 
@@ -246,6 +392,15 @@ def meanSpeed(speeds, rows, maxSpeed):
     determine mean speed, neglecting missing data, intervals less than 1h, and speeds over maxspeed, for use in condition (f)
     '''
 
+    if isinstance(rows, Track):
+        # same selection as below: only intervals where deltaTime is falsy contribute
+        keep = np.diff(rows.epoch) == 0
+        keep &= ~(speeds[1:] > maxSpeed)
+        selected = speeds[1:][keep].tolist()
+        if len(selected) > 0:
+            return sum(selected) / len(selected)
+        return 0
+
     meanSpeed = 0
     speedCount = 0
     for iSpeed, speed in enumerate(speeds):
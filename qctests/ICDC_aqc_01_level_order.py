@@ -67,6 +67,12 @@ def level_order(p, parameters):
     '''Reorders data into depth order and rejects levels with 
        negative depth.
     '''
+
+    return main.memoize(p, 'icdclevelorder', lambda: compute_level_order(p, parameters))
+
+def compute_level_order(p, parameters):
+    '''Does the work of level_order; memoized on the profile by level_order.
+    '''
     
     # check if the relevant info is already in the db
     query = 'SELECT nlevels, origlevels, zr, tr, qc FROM icdclevelorder WHERE uid = ' + str(p.uid())
@@ -106,6 +112,8 @@ def level_order(p, parameters):
         tr         = t
 
     # register pre-computed arrays in db for reuse    
+    if not main.persist_intermediates(parameters):
+        return p.uid(), nlevels, origlevels, zr, tr, qc
     origlevels_p = pickle.dumps(origlevels, -1)
     zr_p = pickle.dumps(zr, -1)
     tr_p = pickle.dumps(tr, -1)
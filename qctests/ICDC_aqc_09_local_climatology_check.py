@@ -30,6 +30,7 @@ c     tmaxlocal(k)=tmedian(k) + rnumamd*tamd(k)
 from . import ICDC_aqc_01_level_order as ICDC
 from netCDF4 import Dataset
 import numpy as np
+import util.auxdata as auxdata
 import os
 import time
 
@@ -126,9 +127,9 @@ def get_climatology_range(nlevels, z, lat, lon, month, paramsicdc09):
 
     return tmin, tmax
 
-def loadParameters(parameterStore):
+def readICDC09Aux(filename='data/climatological_t_median_and_amd_for_aqc.nc'):
     datadict = {}
-    nc = Dataset('data/climatological_t_median_and_amd_for_aqc.nc', 'r')
+    nc = Dataset(filename, 'r')
     datadict['zedqc'] = nc.variables['zedqc'][:]    
     datadict['tamdM'] = nc.variables['tamdM'][:]
     datadict['tmedM'] = nc.variables['tmedM'][:]
@@ -136,5 +137,8 @@ def loadParameters(parameterStore):
     datadict['tmedA'] = nc.variables['tmedA'][:]
     datadict['fillValue'] = nc.fillValue
     nc.close()
-    parameterStore['icdc09'] = datadict
+    return datadict
+
+def loadParameters(parameterStore):
+    parameterStore['icdc09'] = auxdata.shared_arrays('icdc09', readICDC09Aux, ['data/climatological_t_median_and_amd_for_aqc.nc'])
 
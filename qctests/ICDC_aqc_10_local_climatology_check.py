@@ -5,6 +5,7 @@ Python version of climatology check.
 from netCDF4 import Dataset
 import numpy as np
 import os
+import util.auxdata as auxdata
 
 # Define global default temperature range.
 parmaxover = 33.0
@@ -202,11 +203,14 @@ def calcParameters(datfile, ncfile, parameterStore):
 
     nc.close()
 
-def loadParameters(parameterStore):
-    datfile = 'data/global_mean_median_quartiles_medcouple_smoothed.dat'
-    ncfile  = 'data/global_mean_median_quartiles_medcouple_smoothed.nc'
+datfile = 'data/global_mean_median_quartiles_medcouple_smoothed.dat'
+ncfile  = 'data/global_mean_median_quartiles_medcouple_smoothed.nc'
+
+def readICDC10Aux():
     if os.path.isfile(ncfile) is False:
-        calcParameters(datfile, ncfile, parameterStore)
+        params = {}
+        calcParameters(datfile, ncfile, params)
+        return params['icdc10']
     else:
         nc = Dataset(ncfile)
         datadict = {}
@@ -219,8 +223,11 @@ def loadParameters(parameterStore):
         datadict['depths_monthly'] = nc.variables['depthm'][:]
         datadict['depths_annual'] = nc.variables['deptha'][:]
         datadict['fill_value'] = nc.variables['tmin_monthly']._FillValue
-        parameterStore['icdc10'] = datadict
         nc.close()
+        return datadict
+
+def loadParameters(parameterStore):
+    parameterStore['icdc10'] = auxdata.shared_arrays('icdc10', readICDC10Aux, [datfile, ncfile])
 
 if __name__ == "__main__":
     # Generate the netCDF version of the data file.
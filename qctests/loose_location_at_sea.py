@@ -7,21 +7,46 @@
 
 from netCDF4 import Dataset
 import numpy as np
+import util.auxdata as auxdata
 
 # Define the area either side of the closest global relief point that is 
 # checked for ocean points. 
 width = 2
 
-# Load data into memory. Include a halo so that we can handle points next the data line.
-nc = Dataset('data/etopo5.nc')
-etopx = nc.variables['ETOPO05_X'][:]
-etopy = nc.variables['ETOPO05_Y'][:]
-etoph = np.ndarray([len(etopy) + width * 2, len(etopx) + width * 2])
-etoph[:, :] = -1 # Default is ocean points.
-etoph[width:-width, width:-width] = nc.variables['ROSE'][:, :]
-etoph[width:-width, 0:width] = etoph[width:-width, -2*width:-width]
-etoph[width:-width, -width:] = etoph[width:-width, width:2*width]
-nc.close()
+# relief data used when no parameter store is provided; see getEtopo5
+etopo5Cache = {}
+
+def readEtopo5(filename='data/etopo5.nc'):
+    '''
+    Reads the global relief data, with a halo so that we can handle points next the data line.
+    '''
+
+    nc = Dataset(filename)
+    data = {}
+    data['etopx'] = nc.variables['ETOPO05_X'][:]
+    data['etopy'] = nc.variables['ETOPO05_Y'][:]
+    etoph = np.ndarray([len(data['etopy']) + width * 2, len(data['etopx']) + width * 2])
+    etoph[:, :] = -1 # Default is ocean points.
+    etoph[width:-width, width:-width] = nc.variables['ROSE'][:, :]
+    etoph[width:-width, 0:width] = etoph[width:-width, -2*width:-width]
+    etoph[width:-width, -width:] = etoph[width:-width, width:2*width]
+    data['etoph'] = etoph
+    nc.close()
+
+    return data
+
+def getEtopo5():
+    '''
+    relief data to use when none has been loaded into a parameter store; mapped on first use only.
+    '''
+
+    if 'etopo5' not in etopo5Cache:
+        etopo5Cache['etopo5'] = auxdata.shared_arrays('etopo5', readEtopo5, ['data/etopo5.nc'])
+    return etopo5Cache['etopo5']
+
+def loadParameters(parameterStore):
+    # the relief data with its halo, memory mapped so every process shares the one copy
+    parameterStore['etopo5'] = auxdata.shared_arrays('etopo5', readEtopo5, ['data/etopo5.nc'])
 
 def test(p, parameters):
     '''Return an array of QC decisions. There is a QC result per level but these
@@ -40,6 +65,15 @@ def test(p, parameters):
         return qc
     if lon < 0: lon += 360 # Needs to be in range 0 to 360.
 
+    etopo5 = None
+    if parameters is not None:
+        etopo5 = parameters.get('etopo5')
+    if etopo5 is None:
+        etopo5 = getEtopo5()
+    etopx = etopo5['etopx']
+    etopy = etopo5['etopy']
+    etoph = etopo5['etoph']
+
     # Find closest global relief point and extract section of the array.
     ilat = np.argmin(np.abs(etopy - lat)) + width # Add on the halo width.
     ilon = np.argmin(np.abs(etopx - lon)) + width
@@ -1,11 +1,17 @@
 import numpy, xarray, scipy.io, time, matplotlib.path
 from util import obs_utils
 
+# climatology and grid used when no parameter store is provided; see getMinMax
+minmaxCache = {}
+
 def test(p, parameters):
 
     ## unpack profile data
     temp = p.t()
-    temp_min, temp_max = extract_minmax(-obs_utils.depth_to_pressure(p.z(), p.latitude()), p.longitude(), p.latitude())
+    minmax = None
+    if parameters is not None:
+        minmax = parameters.get('minmax')
+    temp_min, temp_max = extract_minmax(-obs_utils.depth_to_pressure(p.z(), p.latitude()), p.longitude(), p.latitude(), minmax)
 
     # true flag if temp is out of range
     qc = numpy.zeros(p.n_levels(), dtype=bool)
@@ -17,27 +23,69 @@ def test(p, parameters):
 
     return qc
 
-def extract_minmax(pres, longitude, latitude):
-    ## unpack minmax parameters, downloadable from https://www.seanoe.org/data/00660/77199/
+def readMinMax():
+    '''
+    read the minmax climatology and its grid description into memory.
+    downloadable from https://www.seanoe.org/data/00660/77199/
+    '''
+
+    minmax = {}
     minmax_temp = xarray.open_dataset('data/TEMP_MIN_MAX.nc')
-    minmax_grid = xarray.open_dataset('data/GRID_MIN_MAX.nc')
-    info_DGG = scipy.io.loadmat('data/info_DGG4H6.mat')
-    lon = numpy.asarray([longitude])
-    lat = numpy.asarray([latitude])
-    hgrid_id = lon_lat_to_min_max_index(lon, lat, info_DGG, '4H6')
-
-    layer_id = numpy.empty((pres.shape))
-    layer_id[:] = numpy.NaN
+    minmax['depth'] = numpy.asarray(minmax_temp.depth.data)
+    minmax['temp_min'] = numpy.asarray(minmax_temp.temp_min.data)
+    minmax['temp_max'] = numpy.asarray(minmax_temp.temp_max.data)
+    minmax_temp.close()
+    minmax['info_DGG'] = scipy.io.loadmat('data/info_DGG4H6.mat')
+
+    return minmax
+
+def getMinMax():
+    '''
+    climatology to use when none has been loaded into a parameter store; read on first use only.
+    '''
+
+    if 'minmax' not in minmaxCache:
+        minmaxCache['minmax'] = readMinMax()
+    return minmaxCache['minmax']
+
+def loadParameters(parameterStore):
+    # the climatology's min and max temperature grids, as read by readMinMax
+    parameterStore['minmax'] = readMinMax()
+
+def grid_cells(longitudes, latitudes, minmax=None):
+    '''
+    map arrays of longitude and latitude, eg the positions of many profiles, to their
+    cells on the minmax hexagonal grid in a single call.
+    '''
+
+    if minmax is None:
+        minmax = getMinMax()
+    lon = numpy.array(longitudes, dtype=float, ndmin=1)
+    lat = numpy.array(latitudes, dtype=float, ndmin=1)
+
+    return lon_lat_to_min_max_index(lon, lat, minmax['info_DGG'], '4H6')
+
+def extract_minmax(pres, longitude, latitude, minmax=None, hgrid_id=None):
+    '''
+    minimum and maximum temperatures allowed at pressures <pres> at the given position.
+    <hgrid_id> may be passed if the position's grid cell is already known, eg from grid_cells.
+    '''
+
+    if minmax is None:
+        minmax = getMinMax()
+    if hgrid_id is None:
+        hgrid_id = grid_cells(longitude, latitude, minmax)
+
     temp_min = numpy.empty((pres.shape))
     temp_min[:] = numpy.NaN
     temp_max = numpy.empty((pres.shape))
     temp_max[:] = numpy.NaN
 
     ## determine minmax range
-    layer_id = val2index(pres, minmax_temp.depth.data)
+    layer_id = val2index(pres, minmax['depth'])
     nonan = ~numpy.isnan(layer_id)
-    temp_min[numpy.where(nonan)[0]] = minmax_temp.temp_min.data[hgrid_id,layer_id[nonan].astype(int)]
-    temp_max[numpy.where(nonan)[0]] = minmax_temp.temp_max.data[hgrid_id,layer_id[nonan].astype(int)]
+    temp_min[numpy.where(nonan)[0]] = minmax['temp_min'][hgrid_id,layer_id[nonan].astype(int)]
+    temp_max[numpy.where(nonan)[0]] = minmax['temp_max'][hgrid_id,layer_id[nonan].astype(int)]
     return temp_min, temp_max
 
 def lon_lat_to_min_max_index(longitude, latitude, info_file, isea_type):
@@ -0,0 +1,50 @@
+import sys, getopt, json, datetime
+import util.runlog as runlog
+
+'''
+Prints the log records AutoQC wrote for a profile, a qc test, or a log level.
+
+Usage: python query-logs.py -l <log directory> [-u <uid>] [-q <qc test>] [-v <level>] [-j]
+'''
+
+# parse options
+options, remainder = getopt.getopt(sys.argv[1:], 'l:u:q:v:jh')
+logdir = '/AutoQClogs'
+uid = None
+test = None
+level = None
+asjson = False
+for opt, arg in options:
+    if opt == '-j':
+        asjson = True
+    if opt == '-l':
+        logdir = arg
+    if opt == '-q':
+        test = arg
+    if opt == '-u':
+        uid = int(arg)
+    if opt == '-v':
+        level = arg
+    if opt == '-h':
+        print('usage:')
+        print('-l <directory AutoQC wrote its logs to; searched recursively>')
+        print('-u <only records for this profile uid>')
+        print('-q <only records for this qc test>')
+        print('-v <only records of this level: info, error, stdout or stderr>')
+        print('-j print the records as json, one per line')
+        print('-h print this help message and quit')
+        sys.exit()
+
+for entry in runlog.read_logs(logdir, uid, test, level):
+    if asjson:
+        print(json.dumps(entry))
+        continue
+    header = [datetime.datetime.fromtimestamp(entry['time'], datetime.timezone.utc).isoformat(), entry['level'], 'uid ' + str(entry['uid'])]
+    if entry['test'] is not None:
+        header.append(entry['test'])
+    if 'seconds' in entry:
+        header.append('{:.3f}s'.format(entry['seconds']))
+    print(' '.join(header))
+    for field in ['message', 'exception']:
+        if field in entry:
+            print('  ' + entry[field].rstrip().replace('\n', '\n  '))
@@ -0,0 +1,52 @@
+import sys, getopt
+import numpy as np
+import util.main as main
+from util import scheduler
+
+'''
+Prints how long each qc test took in a run made with AutoQC.py -T: total and share of
+the run's wall time, percentiles of the time per profile, cpu time, time per level,
+database calls and exceptions, most expensive test first.
+
+Usage: python report-timing.py -t <db filename> -d <table name>
+'''
+
+# parse options
+options, remainder = getopt.getopt(sys.argv[1:], 't:d:h')
+targetdb = 'iquod.db'
+dbtable = 'iquod'
+for opt, arg in options:
+    if opt == '-d':
+        dbtable = arg
+    if opt == '-t':
+        targetdb = arg
+    if opt == '-h':
+        print('usage:')
+        print('-d <db table name the run wrote to; timings are read from <table>_timing>')
+        print('-t <name of db file>')
+        print('-h print this help message and quit')
+        sys.exit()
+
+timingtable = dbtable + '_timing'
+totals = main.dbinteract('SELECT test, COUNT(*), SUM(wall), SUM(cpu), SUM(levels), SUM(dbcalls), SUM(exception) FROM ' + timingtable + ' GROUP BY test ORDER BY SUM(wall) DESC;', targetdb=targetdb)
+if not totals:
+    print('no timings found in', timingtable, '- run AutoQC.py with -T first')
+    sys.exit()
+runtime = sum([row[2] for row in totals])
+
+print('{0:>35s} {1:>7s} {2:>9s} {3:>6s} {4:>8s} {5:>8s} {6:>8s} {7:>8s} {8:>9s} {9:>9s} {10:>7s} {11:>5s}'.format(
+    'NAME OF TEST', 'N', 'TOTAL s', 'SHARE', 'P50 ms', 'P90 ms', 'P99 ms', 'MAX ms', 'CPU s', 'us/LEVEL', 'DB/PRO', 'EXC'))
+means = {}
+for test, n, wall, cpu, levels, dbcalls, exceptions in totals:
+    # one test at a time, to keep memory bounded on big runs
+    walls = np.array([row[0] for row in main.dbinteract('SELECT wall FROM ' + timingtable + ' WHERE test=?;', [test], targetdb=targetdb)])
+    p50, p90, p99 = np.percentile(walls, [50, 90, 99]) * 1000
+    means[test] = wall / n
+    print('{0:>35s} {1:7d} {2:9.2f} {3:5.1f}% {4:8.2f} {5:8.2f} {6:8.2f} {7:8.2f} {8:9.2f} {9:9.2f} {10:7.2f} {11:5d}'.format(
+        test, n, wall, 100.0 * wall / runtime, p50, p90, p99, walls.max() * 1000, cpu, 1e6 * wall / max(levels, 1), dbcalls / n, exceptions))
+
+# with tests run concurrently (AutoQC.py -j), a profile takes at least as long as its longest chain of dependent tests
+tests = sorted(means)
+path, length = scheduler.Scheduler(tests, scheduler.read_dependencies(tests)).critical_path(means)
+print('\nmean time per profile running tests one at a time: {:.2f} ms'.format(1000 * sum(means.values())))
+print('longest chain of dependent tests, {:.2f} ms per profile: {}'.format(1000 * length, ' -> '.join(path)))
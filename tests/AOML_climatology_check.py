@@ -39,3 +39,37 @@ def indices_without_nan_test():
 
 
 
+def profile_interpolation_process_test():
+
+	depthColumns = numpy.array([0, 10, 20, 30], dtype='float32')
+	llList = [[0.0, 0.0], [0.0, 0.25], [0.25, 0.0], [0.25, 0.25]]
+	llTempList = [[20, 18, 16, float('nan')], [19, float('nan'), 15, 14], [21, 17, 15, 13], [22, 18, 14, 12]]
+	depths = [0, 3, 10, 14.5, 25, 30, 31]
+
+	expected = [AOMLinterpolation.temperature_interpolation_process(0.1, 0.05, depth, depthColumns, llList, llTempList, False, "climaInterpTemperature") for depth in depths]
+	result = AOMLinterpolation.profile_interpolation_process(0.1, 0.05, depths, depthColumns, numpy.array(llList), numpy.array(llTempList), False, "climaInterpTemperature")
+	assert numpy.array_equal(result, expected), 'whole profile interpolation should match level by level interpolation'
+	assert result[-1] == 99999.99, 'levels below the deepest climatology depth should not be interpolated'
+
+def CoordinateIndex_test():
+
+	for coordinates in [[10,11,12,13,14], [10,11,12,12,14], [14,12,10,11,13], numpy.arange(-89.875, 90, 0.25, dtype='float32')]:
+		index = AOMLinterpolation.CoordinateIndex(coordinates)
+		for point in [-100, 9, 11.5, 12, 12.1, 12.5, 13.9, 45.125, 45.25, 100]:
+			assert index.closest(point) == AOMLinterpolation.closest_index(coordinates, point), 'CoordinateIndex should match closest_index'
+			assert index.index_and_next(point) == AOMLinterpolation.get_index_and_next(coordinates, point), 'CoordinateIndex should match get_index_and_next'
+
+def NeighbourIndex_test():
+
+	lats, lons = numpy.meshgrid(numpy.arange(-0.875, 1, 0.25), numpy.arange(10.125, 12, 0.25), indexing='ij')
+	latLons = numpy.column_stack((lats.ravel(), lons.ravel()))
+	index = AOMLinterpolation.NeighbourIndex(latLons)
+	valid = numpy.arange(len(latLons)) % 3 != 0
+
+	for y, x in [(0.1, 11.1), (0, 11), (0.125, 11.125), (0.25, 11.5), (-0.5, 10.5), (5, 5)]:
+		distance, i = AOMLinterpolation.nearest_indices(y, x, latLons[valid], 1)
+		nearest, j = index.nearest(y, x, valid)
+		if distance > 0.25:
+			assert j is None, 'no neighbour should be found beyond the radius'
+		else:
+			assert j == numpy.flatnonzero(valid)[i], 'NeighbourIndex should find the same neighbour as nearest_indices'
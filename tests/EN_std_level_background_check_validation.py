@@ -76,7 +76,7 @@ class TestClass:
         qctests.EN_background_check.test(p, self.parameters) #need to populate the enbackground db with profile specific info
         query = 'SELECT bgevstdlevels FROM enbackground WHERE uid = 8888'
         enbackground_pars = main.dbinteract(query) 
-        bgev = numpy.load(io.BytesIO(enbackground_pars[0][0]),allow_pickle=True)
+        bgev = main.unpack_array(enbackground_pars[0][0])
 
         obev = self.parameters['enbackground']['obev']
         expected = [1.0, 1.0, 1.0, 1.0]
@@ -192,6 +192,28 @@ class TestClass:
         p2 = util.testingProfile.fakeProfile([0,0,0],[0,0,0], 1, 1, date=[1900, 1, 1, 13], uid=1, cruise=2)
         assert qctests.EN_std_lev_bkg_and_buddy_check.assessBuddyDistance(p1, profile_to_info_list(p2)) == haversine(0,0,1,1), 'haversine calculation inconsistent with cotede.qctests.possible_speed.haversine'
 
+    def test_BuddyIndex_closest(self):
+        '''
+        the buddy index should find the same buddy as assessBuddyDistance over every row
+        '''
+
+        p = util.testingProfile.fakeProfile([0,0,0],[0,0,0], 0, 179.5, date=[1900, 1, 1, 12], uid=0, cruise=1)
+        rows = [
+            (0, 1900, 1, 2, 0, 179.5),      # same profile
+            (1, 1900, 1, 1, 0.1, 179.5),    # same cruise
+            (2, 1900, 2, 2, 0.1, 179.5),    # different month
+            (3, 1900, 1, 2, 6, 179.5),      # too far in latitude
+            (4, 1900, 1, 2, 1, -179.5),     # across the edge of the map
+            (5, 1900, 1, 3, -1, -179.5),    # same distance, later row
+            (6, 1900, 1, 3, 3, 179.5)
+        ]
+
+        index = qctests.EN_std_lev_bkg_and_buddy_check.BuddyIndex(rows)
+        assert index.closest(p) == (haversine(0, 179.5, 1, 180.5), 4), 'buddy index found the wrong buddy'
+
+        p = util.testingProfile.fakeProfile([0,0,0],[0,0,0], 0, 0, date=[1901, 1, 1, 12], uid=0, cruise=1)
+        assert index.closest(p) == (None, None), 'buddy index found a buddy in an empty year'
+
 
     def test_timeDiff(self):
         '''
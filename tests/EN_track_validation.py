@@ -106,6 +106,34 @@ class TestClass:
 
         assert ms - individualSpeed < 1E-10, 'all steps between profiles were equal except for one that should have been dropped => mean speed should equal speed between two adjacent profiles'
 
+    def Track_test(self):
+        '''
+        a Track should agree exactly with the list-based trajectory, before and after points are deleted
+        '''
+
+        rows = []
+        rows.append((0, 1999, 12, 31, 0, 0, 90, 0))
+        rows.append((1, 1999, 12, 31, 1, 1, 90.5, 0))
+        rows.append((2, 1999, 12, 31, 2, 2, 90, 0))
+        rows.append((3, 1999, 12, 31, 2, 8, 92, 0))
+        rows.append((4, 1999, 12, 31, 4, 4, 90, 0))
+        rows.append((5, 1999, 12, 31, 5, 3, 91, 0))
+
+        track = qctests.EN_track_check.buildTrack(rows)
+        assert isinstance(track, qctests.EN_track_check.Track)
+
+        for reject in [3, 0, 3, 1]:
+            del rows[reject]
+            del track[reject]
+            speeds, angles = qctests.EN_track_check.calculateTraj(rows)
+            assert len(track) == len(rows)
+            assert numpy.array_equal(track.speeds, speeds), 'track speeds differ after deleting point {}'.format(reject)
+            assert numpy.array_equal(track.angles, angles), 'track angles differ after deleting point {}'.format(reject)
+            assert qctests.EN_track_check.meanSpeed(track.speeds, track, 15) == qctests.EN_track_check.meanSpeed(speeds, rows, 15)
+
+        # missing positions can't be held in a Track
+        assert not isinstance(qctests.EN_track_check.buildTrack([(0, 1999, 12, 31, 0, None, 90, 0)]), qctests.EN_track_check.Track)
+
     def condition_a_fast_test(self):
         '''
         condition a checks that the speed from 2->3 isn't too fast
@@ -461,6 +489,19 @@ class TestClass:
         
         assert flag == 4, 'nonsmooth behavior at 4 -> should reject 4'
 
+    def assess_usability_header_test(self):
+        '''
+        header values the track check won't assess are rejected, as they are for whole profiles
+        '''
+
+        usable = ['US', 1234, 'ABC', 1999, 12, 31, 5, 2, 1]
+        assert qctests.EN_track_check.assess_usability_header(*usable)
+
+        for position, value in [(0, '99'), (1, 0), (1, None), (2, None), (3, None), (6, None), (7, None), (8, 2635)]:
+            unusable = list(usable)
+            unusable[position] = value
+            assert not qctests.EN_track_check.assess_usability_header(*unusable), 'header {} should not be usable'.format(unusable)
+
     ############################
     # Integration Tests 
     ############################
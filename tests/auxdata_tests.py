@@ -0,0 +1,89 @@
+import util.auxdata as auxdata
+import numpy as np
+import copy, os, shutil, tempfile
+
+class TestClass():
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, 'source.txt')
+        with open(self.source, 'w') as f:
+            f.write('v1')
+        self.builds = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def build(self):
+        self.builds += 1
+        return {
+            'grid': np.ma.array(np.arange(12.).reshape(3, 4), mask=np.arange(12).reshape(3, 4) % 5 == 0),
+            'axis': np.ma.array([1., 2., 3.]),
+            'plain': np.arange(4, dtype=np.int16),
+            'fill': np.float32(99999.)
+        }
+
+    def shared_arrays_test(self):
+        '''
+        check arrays come back memory-mapped and equal to what build() made, built only once
+        '''
+
+        expected = self.build()
+        self.builds = 0
+
+        for i in range(2):
+            data = auxdata.shared_arrays('test', self.build, [self.source], self.directory)
+
+        assert self.builds == 1, 'second load should reuse the files on disk'
+        assert np.array_equal(data['grid'].data, expected['grid'].data)
+        assert np.array_equal(data['grid'].mask, expected['grid'].mask)
+        assert data['axis'].mask is np.ma.nomask, 'an absent mask should stay absent'
+        assert data['plain'].dtype == np.int16
+        assert data['fill'] == expected['fill'] and data['fill'].dtype == np.float32
+        assert isinstance(data['grid'].data.base, np.memmap) or isinstance(data['grid'].data.base.base, np.memmap), 'grid should be memory-mapped'
+        assert not data['grid'].data.flags.writeable, 'shared grids should be read-only'
+
+        # slices are what the qc tests keep and copy around
+        column = copy.deepcopy(data['grid'][:, 1])
+        assert np.array_equal(column.mask, [False, True, False])
+
+    def stale_test(self):
+        '''
+        check the files are rebuilt when a source changes
+        '''
+
+        auxdata.shared_arrays('test', self.build, [self.source], self.directory)
+        with open(self.source, 'w') as f:
+            f.write('version 2')
+        auxdata.shared_arrays('test', self.build, [self.source], self.directory)
+
+        assert self.builds == 2
+
+    def failed_build_test(self):
+        '''
+        check a build that raises leaves nothing behind
+        '''
+
+        def build():
+            raise IOError('no data')
+
+        try:
+            auxdata.shared_arrays('test', build, [self.source], self.directory)
+        except IOError:
+            pass
+
+        assert os.listdir(self.directory) == ['source.txt']
+
+    def rebuild_test(self):
+        '''
+        check a rebuild leaves arrays already mapped from the old copy readable, and nothing else behind
+        '''
+
+        old = auxdata.shared_arrays('test', self.build, [self.source], self.directory)
+        with open(self.source, 'w') as f:
+            f.write('version 2')
+        new = auxdata.shared_arrays('test', self.build, [self.source], self.directory)
+
+        assert self.builds == 2
+        assert np.array_equal(old['grid'].data, new['grid'].data), 'old maps should stay readable'
+        assert sorted(os.listdir(self.directory)) == ['source.txt', 'test']
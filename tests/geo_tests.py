@@ -88,3 +88,16 @@ def test_archaversine_domain():
     '''
 
     assert geo.arcHaversine(1.00000000000000004) == geo.arcHaversine(1.0), 'archaversine fooled by floating point problems'
+
+def test_epochSeconds():
+    '''
+    differences of epochSeconds should match deltaTime, and bad dates give None
+    '''
+
+    early = (2004, 2, 28, 23.99)
+    late  = (2004, 3, 1, 1.5)
+
+    assert geo.epochSeconds(late) - geo.epochSeconds(early) == geo.deltaTime(early, late), 'epoch seconds disagree with deltaTime'
+    assert geo.epochSeconds((1970, 1, 1, 0)) == 0, 'epoch should be zero seconds'
+    assert geo.epochSeconds((2005, 2, 29, 0)) is None, 'invalid date should give None'
+    assert geo.epochSeconds((2005, 2, None, 0)) is None, 'missing day should give None'
@@ -0,0 +1,104 @@
+import os
+import util.main as main
+import util.incremental as incremental
+
+class TestClass:
+
+    def setUp(self):
+        main.dbinteract('CREATE TABLE IF NOT EXISTS unit (uid integer PRIMARY KEY, en_range_check BLOB);')
+        main.dbinteract('INSERT INTO unit (uid, en_range_check) VALUES (1, NULL), (2, X\'00\'), (3, X\'00\');')
+        self.tests = ['EN_range_check', 'ICDC_aqc_02_crude_range']
+
+    def tearDown(self):
+        main.dbinteract('DROP TABLE unit;')
+        main.dbinteract('DROP TABLE IF EXISTS unit_manifest;')
+        main.dbinteract('DROP TABLE IF EXISTS unit_errors;')
+
+    def missing_work_test(self):
+        '''
+        new tests get a column, and every NULL cell is reported against its uid
+        '''
+
+        assert incremental.add_test_columns('unit', self.tests) == ['ICDC_aqc_02_crude_range']
+        assert incremental.add_test_columns('unit', self.tests) == [], 'columns should only be added once'
+
+        main.dbinteract('UPDATE unit SET icdc_aqc_02_crude_range = X\'00\' WHERE uid = 3;')
+        todo = incremental.missing_work('unit', self.tests)
+
+        assert todo == {1: ('EN_range_check', 'ICDC_aqc_02_crude_range'), 2: ('ICDC_aqc_02_crude_range',)}
+
+    def invalidate_changed_test(self):
+        '''
+        results are only cleared for tests whose recorded version differs from the current code
+        '''
+
+        incremental.add_test_columns('unit', self.tests)
+        main.dbinteract('UPDATE unit SET icdc_aqc_02_crude_range = X\'00\';')
+
+        assert incremental.invalidate_changed('unit', self.tests) == [], 'unrecorded results should be kept'
+        assert incremental.missing_work('unit', self.tests) == {1: ('EN_range_check',)}
+
+        main.dbinteract('UPDATE unit_manifest SET version = \'old\' WHERE test = \'ICDC_aqc_02_crude_range\';')
+        assert incremental.invalidate_changed('unit', self.tests) == ['ICDC_aqc_02_crude_range']
+        assert len(incremental.missing_work('unit', ['ICDC_aqc_02_crude_range'])) == 3
+        assert incremental.recorded_versions('unit')['ICDC_aqc_02_crude_range'] == incremental.test_version('ICDC_aqc_02_crude_range')
+
+    def errors_test(self):
+        '''
+        results of tests that raised are kept until they're retried, or their test changes
+        '''
+
+        incremental.add_test_columns('unit', self.tests)
+        main.dbinteract('UPDATE unit SET en_range_check = X\'00\', icdc_aqc_02_crude_range = X\'00\';')
+        incremental.record_versions('unit', self.tests)
+        main.dbinteract(incremental.create_errors('unit_errors'))
+        main.dbinteract('INSERT INTO unit_errors VALUES (1, \'en_range_check\'), (2, \'en_range_check\'), (1, \'icdc_aqc_02_crude_range\');')
+
+        assert incremental.count_errors('unit', self.tests) == 3
+        assert incremental.missing_work('unit', self.tests) == {}, 'results of tests that raised should be kept'
+
+        assert incremental.retry_errors('unit', ['EN_range_check']) == 2
+        assert incremental.missing_work('unit', self.tests) == {1: ('EN_range_check',), 2: ('EN_range_check',)}
+        assert incremental.count_errors('unit', self.tests) == 1
+
+        main.dbinteract('UPDATE unit_manifest SET version = \'old\' WHERE test = \'ICDC_aqc_02_crude_range\';')
+        incremental.invalidate_changed('unit', self.tests)
+        assert incremental.count_errors('unit', self.tests) == 0, 'marks of a changed test should be cleared'
+
+    def test_version_test(self):
+        '''
+        a test's version covers the tests it requires
+        '''
+
+        assert incremental.test_version('ICDC_aqc_02_crude_range') != incremental.test_version('ICDC_aqc_01_level_order')
+        assert incremental.test_version('ICDC_aqc_02_crude_range') == incremental.test_version('ICDC_aqc_02_crude_range')
+
+    def source_files_test(self):
+        '''
+        a test's version covers the helper modules it uses, and nothing from outside the repository
+        '''
+
+        files = [os.path.relpath(path) for path in incremental.source_files('AOML_climatology_test')]
+        assert os.path.join('qctests', 'AOML_climatology_test.py') in files
+        assert os.path.join('util', 'AOMLinterpolation.py') in files
+        assert os.path.join('util', 'AOMLnetcdf.py') in files
+        assert all([not path.startswith('..') and 'site-packages' not in path for path in files])
+
+    def invalidate_intermediates_test(self):
+        '''
+        intermediate products of a changed test, and of tests requiring it, are cleared along with its results
+        '''
+
+        tests = ['ICDC_aqc_01_level_order', 'ICDC_aqc_02_crude_range']
+        incremental.add_test_columns('unit', tests)
+        incremental.record_versions('unit', tests)
+        main.dbinteract('CREATE TABLE IF NOT EXISTS icdclevelorder (uid INTEGER PRIMARY KEY, nlevels INTEGER, origlevels BLOB, zr BLOB, tr BLOB, qc BLOB);')
+        main.dbinteract('INSERT INTO icdclevelorder (uid, nlevels) VALUES (1, 4), (99, 4);')
+
+        main.dbinteract('UPDATE unit_manifest SET version = \'old\' WHERE test = \'ICDC_aqc_01_level_order\';')
+        assert incremental.invalidate_changed('unit', tests) == ['ICDC_aqc_01_level_order']
+        assert main.dbinteract('SELECT uid FROM icdclevelorder;') == [(99,)], 'only rows for profiles in the table should go'
+        main.dbinteract('DROP TABLE icdclevelorder;')
+
+        assert incremental.stale_intermediates(['EN_spike_and_step_check']) == ['enbackground', 'enspikeandstep']
+        assert incremental.stale_intermediates(['EN_range_check']) == []
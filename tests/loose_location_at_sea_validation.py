@@ -9,8 +9,9 @@ def test_data_halo():
        next to the dateline is correct.
     '''
 
-    assert np.array_equal(las.etoph[1000, 0:las.width*2], 
-                          las.etoph[1000, -las.width*2:]), 'Data halo incorrect' 
+    etoph = las.getEtopo5()['etoph']
+    assert np.array_equal(etoph[1000, 0:las.width*2], 
+                          etoph[1000, -las.width*2:]), 'Data halo incorrect' 
 
 def test_invalid_locations():
     '''Test that the check is able to handle invalid locations.'''
@@ -1,5 +1,8 @@
 import util.main as main
-import os
+import util.testingProfile
+import util.dbutils
+import os, io, numpy, pandas, sqlite3
+from wodpy import wod
 
 class TestClass:
 
@@ -26,3 +29,292 @@ class TestClass:
         assert -30 - main.normalize_latitude(-30) < 0.000001
 
 
+    def get_profiles_from_db_test(self):
+        '''
+        make sure a chunk of profiles can be fetched and parsed in one go, skipping uids that aren't in the table
+        '''
+
+        raw = open('data/example.dat').read()
+        main.dbinteract('DROP TABLE IF EXISTS unit;')
+        main.dbinteract('CREATE TABLE unit (raw text, uid integer PRIMARY KEY);')
+        main.dbinteract('INSERT INTO unit (raw, uid) VALUES (?,?);', ["'" + raw + "'", 67064])
+
+        profiles = main.get_profiles_from_db([67064, 1234], 'unit', 'iquod.db')
+        assert len(profiles) == 1, 'should have found exactly one profile'
+        assert profiles[0].uid() == 67064, 'wrong profile returned'
+        assert profiles[0].n_levels() == 4, 'profile not parsed correctly'
+
+        main.dbinteract('DROP TABLE unit;')
+
+    def buildQCRegistry_test(self):
+        '''
+        make sure the registry resolves test functions and dependencies up front
+        '''
+
+        import qctests.EN_range_check
+        import qctests.EN_increasing_depth_check
+
+        registry = main.buildQCRegistry(['EN_range_check', 'EN_increasing_depth_check'])
+
+        assert registry['EN_range_check']['test'] is qctests.EN_range_check.test, 'test function not resolved'
+        assert registry['EN_range_check']['loadParameters'] is None, 'EN_range_check has no parameters to load'
+        assert registry['EN_range_check']['dependencies'] == [], 'EN_range_check has no dependencies'
+        assert registry['EN_increasing_depth_check']['module'] is qctests.EN_increasing_depth_check, 'module not resolved'
+        assert registry['EN_increasing_depth_check']['dependencies'] == ['EN_spike_and_step_check'], 'dependencies not read from qctest_requirements.json'
+
+    def qcDependencies_test(self):
+        '''
+        make sure wildcard requirements are applied to the matching tests
+        '''
+
+        deps = main.qcDependencies(['ICDC_aqc_02_crude_range', 'ICDC_aqc_01_level_order'])
+
+        assert deps['ICDC_aqc_02_crude_range'] == ['ICDC_aqc_01_level_order']
+        assert deps['ICDC_aqc_01_level_order'] == []
+
+    def selectQCTests_test(self):
+        '''
+        check tests are selected by name or wildcard, and their dependencies found
+        '''
+
+        checks = ['EN_background_check', 'EN_range_check', 'EN_spike_and_step_check', 'ICDC_aqc_01_level_order', 'ICDC_aqc_02_crude_range']
+
+        assert main.selectQCTests(checks, ['ICDC_*', 'EN_range_check', 'no_such_test']) == ['EN_range_check', 'ICDC_aqc_01_level_order', 'ICDC_aqc_02_crude_range']
+        assert main.requiredQCTests(['ICDC_aqc_02_crude_range']) == ['ICDC_aqc_01_level_order', 'ICDC_aqc_02_crude_range']
+        assert main.requiredQCTests(['EN_background_available_check']) == ['EN_background_available_check', 'EN_background_check', 'EN_spike_and_step_check'], 'dependencies of dependencies should be included'
+
+    def connect_test(self):
+        '''
+        make sure connections are reused within a process, and dbinteract returns None on a bad query
+        '''
+
+        assert main.connect('iquod.db') is main.connect('iquod.db'), 'connection was not reused'
+        assert main.dbinteract('SELECT * FROM no_such_table;') is None, 'failed query should return None'
+
+    def db_calls_test(self):
+        '''
+        make sure dbinteract calls and transactions are counted
+        '''
+
+        calls = main.db_calls()
+        main.dbinteract('SELECT 1;')
+        with main.transaction('iquod.db') as cur:
+            cur.execute('SELECT 1;')
+
+        assert main.db_calls() - calls == 2
+
+    def table_columns_test(self):
+        '''
+        make sure column lists are looked up once, and again after the table changes
+        '''
+
+        main.dbinteract('DROP TABLE IF EXISTS unit;')
+        assert main.table_columns('unit', 'iquod.db') == []
+        main.dbinteract('CREATE TABLE unit (uid integer PRIMARY KEY, x integer);')
+        assert main.table_columns('unit', 'iquod.db') == ['uid', 'x']
+
+        calls = main.db_calls()
+        assert main.table_columns('unit', 'iquod.db') == ['uid', 'x']
+        assert main.db_calls() == calls, 'column list not cached'
+
+        main.dbinteract('ALTER TABLE unit ADD COLUMN y BLOB;')
+        assert main.table_columns('unit', 'iquod.db') == ['uid', 'x', 'y']
+        main.dbinteract('DROP TABLE unit;')
+
+    def transaction_test(self):
+        '''
+        make sure a transaction commits on success, and rolls back everything on failure
+        '''
+
+        main.dbinteract('DROP TABLE IF EXISTS unit;')
+        main.dbinteract('CREATE TABLE unit (uid integer PRIMARY KEY, x integer);')
+
+        with main.transaction('iquod.db') as cur:
+            cur.execute('INSERT INTO unit VALUES (?,?);', (1, 10))
+            main.dbinteract('INSERT INTO unit VALUES (?,?);', (2, 20))
+
+        try:
+            with main.transaction('iquod.db') as cur:
+                cur.execute('INSERT INTO unit VALUES (?,?);', (3, 30))
+                cur.execute('INSERT INTO unit VALUES (?,?);', (1, 40))
+        except:
+            pass
+
+        assert main.dbinteract('SELECT uid, x FROM unit ORDER BY uid;') == [(1, 10), (2, 20)], 'transaction did not commit / roll back correctly'
+        assert main.interact_many('INSERT INTO unit VALUES (?,?);', [(3, 30), (4, 40)]) == 0
+        assert main.interact_many('INSERT INTO unit VALUES (?,?);', [(5, 50), (1, 10)]) == -1
+        assert len(main.dbinteract('SELECT * FROM unit;')) == 4, 'failed interact_many should leave no rows behind'
+        main.dbinteract('DROP TABLE unit;')
+
+    def immediate_transaction_test(self):
+        '''
+        make sure an immediate transaction holds the write lock before it has written anything
+        '''
+
+        other = sqlite3.connect('iquod.db', isolation_level=None, timeout=0)
+        with main.transaction('iquod.db', immediate=True) as cur:
+            cur.execute('SELECT 1;')
+            try:
+                other.execute('BEGIN IMMEDIATE;')
+                locked = False
+            except sqlite3.OperationalError:
+                locked = True
+        other.close()
+        assert locked, 'another connection could take the write lock'
+
+    def configure_test(self):
+        '''
+        make sure database connections are set up in WAL mode
+        '''
+
+        assert main.dbinteract('PRAGMA journal_mode;') == [('wal',)], 'database not in WAL mode'
+        assert main.dbinteract('PRAGMA synchronous;') == [(1,)], 'synchronous should be NORMAL'
+
+    def share_between_hosts_test(self):
+        '''
+        make sure databases shared between hosts, as with -q, use a rollback journal rather than WAL
+        '''
+
+        pragmas = main.db_pragmas
+        try:
+            main.share_between_hosts()
+            main.dbinteract('SELECT 1;', targetdb='unitshared.db')
+            assert main.dbinteract('PRAGMA journal_mode;', targetdb='unitshared.db') == [('delete',)], 'shared database in WAL mode'
+            assert main.dbinteract('PRAGMA synchronous;', targetdb='unitshared.db') == [(2,)], 'synchronous should be FULL'
+        finally:
+            main.db_pragmas = pragmas
+            main.disconnect('unitshared.db')
+            os.remove('unitshared.db')
+
+    def pack_array_test(self):
+        '''
+        make sure arrays survive a round trip through the compact blob format, including masks and stripped trailing zeros
+        '''
+
+        qc = numpy.array([False, True, False, False, True] * 10)
+        blob = main.pack_array(qc)
+        assert len(blob) < 30, 'boolean qc array was not bit packed'
+        unpacked = main.unpack_array(blob)
+        assert unpacked.dtype == bool and numpy.array_equal(unpacked, qc)
+
+        temps = numpy.array([12.5, 11.0, 0.0])
+        assert numpy.array_equal(main.unpack_array(bytes(main.pack_array(temps)).rstrip(b'\x00')), temps), 'trailing zeros not restored'
+
+        truth = numpy.ma.array([1, 3, 0], mask=[False, True, False])
+        unpacked = main.unpack_array(main.pack_array(truth))
+        assert numpy.array_equal(unpacked.mask, truth.mask) and numpy.array_equal(unpacked.data, truth.data)
+
+    def unpack_array_stripped_test(self):
+        '''
+        make sure all-zero arrays survive the trailing NUL stripping pandas does converting blobs to bytes
+        '''
+
+        for arr in [numpy.zeros(50, dtype=bool), numpy.zeros(7)]:
+            blob = pandas.DataFrame([[bytes(main.pack_array(arr))]]).astype('bytes').iloc[0, 0]
+            unpacked = util.dbutils.unpack_qc(blob)
+            assert unpacked.dtype == arr.dtype and numpy.array_equal(unpacked, arr), 'array not restored from ' + repr(blob)
+
+    def unpack_array_legacy_test(self):
+        '''
+        make sure pickled blobs written by older versions can still be read
+        '''
+
+        out = io.BytesIO()
+        numpy.array([True, False]).dump(out)
+        assert numpy.array_equal(main.unpack_array(out.getvalue()), [True, False])
+        assert main.unpack_row((out.getvalue(), 'text', 4))[1:] == ('text', 4)
+
+    def text2wod_test(self):
+        '''
+        make sure profiles parsed from memory match those parsed by wodpy from disk, and that cached profiles are reused
+        '''
+
+        fid = open('data/example.dat')
+        expected = wod.WodProfile(fid)
+        fid.close()
+        raw = open('data/example.dat').read()
+
+        p = main.text2wod(raw)
+        assert p.uid() == expected.uid() and p.n_levels() == expected.n_levels()
+        assert numpy.array_equal(p.t(), expected.t()) and numpy.array_equal(p.z(), expected.z())
+
+        assert main.text2wod(raw, 67064) is main.text2wod(raw, 67064), 'cached profile not reused'
+        assert main.text2wod(raw, 67064) is not p
+
+    def get_profile_from_db_levels_test(self):
+        '''
+        make sure profiles from tables with pre-extracted level arrays match the wodpy profile, without parsing the raw text
+        '''
+
+        raw = open('data/example.dat').read()
+        expected = main.text2wod(raw)
+        main.dbinteract('DROP TABLE IF EXISTS unitlevels;')
+        main.dbinteract('CREATE TABLE unitlevels (raw text, uid integer PRIMARY KEY, lat real, long real, year integer, month integer, day integer, time real, cruise integer, probe integer, depth BLOB, temperature BLOB, salinity BLOB, pressure BLOB);')
+        values = ["'" + raw + "'", 67064, expected.latitude(), expected.longitude(), expected.year(), expected.month(), expected.day(), expected.time(), expected.cruise(), expected.probe_type()]
+        values += [main.pack_array(arr) for arr in [expected.z(), expected.t(), expected.s(), expected.p()]]
+        main.dbinteract('INSERT INTO unitlevels VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?);', values)
+
+        p = main.get_profile_from_db(67064, 'unitlevels', 'iquod.db')
+        assert isinstance(p, main.dbProfile.dbProfile), 'level columns not used'
+        assert p.uid() == 67064 and p.n_levels() == expected.n_levels() and p.latitude() == expected.latitude()
+        assert numpy.array_equal(p.t(), expected.t()) and numpy.array_equal(p.z(), expected.z())
+        assert p._wod is None, 'raw text parsed unnecessarily'
+        assert p.originator_cruise() == expected.originator_cruise(), 'other accessors should fall back to wodpy'
+
+        p.catchFlags()
+        main.catchFlags(expected)
+        assert numpy.array_equal(numpy.ma.getmaskarray(p.t()), numpy.ma.getmaskarray(expected.t()))
+        main.dbinteract('DROP TABLE unitlevels;')
+
+    def get_profile_from_db_headers_test(self):
+        '''
+        make sure country, originator cruise and platform are served from their columns where the table has them
+        '''
+
+        raw = open('data/example.dat').read()
+        expected = main.text2wod(raw)
+        main.dbinteract('DROP TABLE IF EXISTS unitlevels;')
+        main.dbinteract('CREATE TABLE unitlevels (raw text, uid integer PRIMARY KEY, lat real, long real, year integer, month integer, day integer, time real, cruise integer, probe integer, depth BLOB, temperature BLOB, salinity BLOB, pressure BLOB, country text, ocruise text, platform integer);')
+        values = ["'" + raw + "'", 67064, expected.latitude(), expected.longitude(), expected.year(), expected.month(), expected.day(), expected.time(), expected.cruise(), expected.probe_type()]
+        values += [main.pack_array(arr) for arr in [expected.z(), expected.t(), expected.s(), expected.p()]]
+        values += [expected.primary_header['Country code'], expected.originator_cruise(), expected.extract_secondary_header(3)]
+        main.dbinteract('INSERT INTO unitlevels VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?);', values)
+
+        p = main.get_profile_from_db(67064, 'unitlevels', 'iquod.db')
+        assert p.primary_header['Country code'] == expected.primary_header['Country code']
+        assert p.originator_cruise() == expected.originator_cruise()
+        assert p.extract_secondary_header(3) == expected.extract_secondary_header(3)
+        assert p._wod is None, 'raw text parsed unnecessarily'
+        assert p.primary_header['Year'] == expected.primary_header['Year'], 'other header fields should fall back to wodpy'
+        main.dbinteract('DROP TABLE unitlevels;')
+
+    def group_chunks_test(self):
+        '''
+        make sure chunks are made of whole groups
+        '''
+
+        rows = [(1, 'a', 1), (2, 'a', 1), (3, 'a', 2), (4, 'b', 2), (5, 'b', 2), (6, 'b', 2), (7, 'c', 3)]
+        assert main.group_chunks(rows) == [[1, 2], [3], [4, 5, 6], [7]]
+        assert main.group_chunks(rows, 3) == [[1, 2, 3], [4, 5, 6], [7]]
+        assert main.group_chunks([]) == []
+
+    def memoize_test(self):
+        '''
+        memoized values are computed once per profile, and handed out as copies
+        '''
+
+        p = util.testingProfile.fakeProfile([0,0,0],[0,0,0], uid=8888)
+        calls = []
+        def compute():
+            calls.append(1)
+            return numpy.zeros(3, dtype=bool)
+
+        first = main.memoize(p, 'key', compute)
+        first[:] = True
+        second = main.memoize(p, 'key', compute)
+        assert len(calls) == 1, 'memoized value was recomputed'
+        assert not numpy.any(second), 'memoized value was modified through a copy'
+
+        other = util.testingProfile.fakeProfile([0,0,0],[0,0,0], uid=8888)
+        main.memoize(other, 'key', compute)
+        assert len(calls) == 2, 'memo leaked between profile objects'
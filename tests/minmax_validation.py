@@ -27,6 +27,17 @@ def test_minmax():
     qc = qctests.minmax.test(p, None)
     assert numpy.array_equal(qc, flag_result), "minmax flagged different levels than original author's pathological example"
 
+def test_grid_cells():
+    '''
+    Make sure looking up many positions at once gives the same grid cells as looking them up one at a time
+    '''
+
+    cells = qctests.minmax.grid_cells([longitude, flag_longitude], [latitude, flag_latitude])
+    assert numpy.array_equal(cells, numpy.concatenate([qctests.minmax.grid_cells(longitude, latitude), qctests.minmax.grid_cells(flag_longitude, flag_latitude)])), "batch grid cell lookup doesn't match single lookups"
+
+    min, max = qctests.minmax.extract_minmax(numpy.asarray(flag_pres), flag_longitude, flag_latitude, hgrid_id=cells[1:])
+    assert numpy.array_equal(min, flag_temp_min), "temperature minima don't match original author's flagged example"
+
 class TestFilterLatLon(unittest.TestCase):
     """ Test that latitudes and longitudes outsides a given threshold are
     correctly made missing."""
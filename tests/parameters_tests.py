@@ -0,0 +1,64 @@
+from util.parameters import LazyParameters
+
+class TestClass():
+
+    def setUp(self):
+        self.calls = []
+
+        def load(name):
+            def loadParameters(parameterStore):
+                self.calls.append(name)
+                parameterStore[name] = True
+            return loadParameters
+
+        def broken(parameterStore):
+            self.calls.append('broken')
+            raise IOError('no data')
+
+        self.registry = {
+            'a': {'loadParameters': load('a'), 'dependencies': []},
+            'b': {'loadParameters': load('b'), 'dependencies': ['a']},
+            'c': {'loadParameters': None, 'dependencies': ['b', 'not_in_run']},
+            'd': {'loadParameters': broken, 'dependencies': []}
+        }
+
+    def require_test(self):
+        '''
+        check parameters are loaded once, on demand, dependencies first
+        '''
+
+        parameters = LazyParameters(self.registry, {'db': 'iquod.db'})
+        assert self.calls == [], 'nothing should load up front'
+
+        parameters.require('c')
+        parameters.require('b')
+
+        assert self.calls == ['a', 'b']
+        assert parameters['a'] and parameters['b'] and parameters['db'] == 'iquod.db'
+        assert sorted(parameters.loadtimes) == ['a', 'b', 'c']
+
+    def require_failure_test(self):
+        '''
+        check a failing load is reported once and not retried
+        '''
+
+        parameters = LazyParameters(self.registry)
+        parameters.require('d')
+        parameters.require('d')
+
+        assert self.calls == ['broken']
+        assert parameters.failed == ['d']
+        assert 'd' not in parameters.loadtimes
+
+    def unusable_test(self):
+        '''
+        check a test is unusable if its own parameters, or those of a test it depends on, failed to load
+        '''
+
+        self.registry['e'] = {'loadParameters': None, 'dependencies': ['d']}
+        parameters = LazyParameters(self.registry)
+        parameters.require('e')
+        parameters.require('c')
+
+        assert parameters.unusable('d') and parameters.unusable('e')
+        assert not parameters.unusable('c')
@@ -0,0 +1,103 @@
+import util.main as main
+from util.resultsink import ResultSink
+import numpy
+
+class TestClass:
+
+    def setUp(self):
+        main.dbinteract('CREATE TABLE IF NOT EXISTS unit (uid integer PRIMARY KEY, test_a BLOB, test_b BLOB);')
+        main.dbinteract('INSERT INTO unit (uid) VALUES (1), (2);')
+
+    def tearDown(self):
+        main.dbinteract('DROP TABLE unit;')
+        main.dbinteract('DROP TABLE IF EXISTS unit_timing;')
+
+    def flush_test(self):
+        '''
+        results for several profiles are only written on flush, and land in the right columns
+        '''
+
+        sink = ResultSink('unit', 'iquod.db')
+        sink.add(1, {'Test_a': numpy.array([True, False]), 'Test_b': numpy.array([False, False])})
+        sink.add(2, {'Test_a': numpy.array([False]), 'Test_b': numpy.array([True])})
+
+        rows = main.dbinteract('SELECT test_a FROM unit WHERE uid=1;')
+        assert rows[0][0] is None, 'results written before flush'
+
+        assert sink.flush() == 0, 'flush failed'
+        assert len(sink.pending) == 0, 'pending results not cleared after flush'
+
+        rows = main.dbinteract('SELECT uid, test_a, test_b FROM unit ORDER BY uid;')
+        row = main.unpack_row(rows[0])
+        assert numpy.array_equal(row[1], [True, False])
+        assert numpy.array_equal(row[2], [False, False])
+        row = main.unpack_row(rows[1])
+        assert numpy.array_equal(row[1], [False])
+        assert numpy.array_equal(row[2], [True])
+
+        sink.close()
+
+    def missing_result_test(self):
+        '''
+        a result of None is written as NULL, so incremental runs find it again
+        '''
+
+        main.dbinteract('UPDATE unit SET test_b = X\'00\';')
+        sink = ResultSink('unit', 'iquod.db')
+        sink.add(1, {'test_a': numpy.array([True]), 'test_b': None})
+        assert sink.flush() == 0, 'flush failed'
+
+        rows = main.dbinteract('SELECT test_a, test_b FROM unit WHERE uid=1;')
+        assert numpy.array_equal(main.unpack_row(rows[0])[0], [True])
+        assert rows[0][1] is None, 'result of a test whose parameters failed to load should be NULL'
+
+    def errors_test(self):
+        '''
+        results of tests that raised are marked in the error table, and the marks of results written again are cleared
+        '''
+
+        sink = ResultSink('unit', 'iquod.db', errortable='unit_errors')
+        sink.add(1, {'Test_a': numpy.array([False]), 'Test_b': numpy.array([False])}, errors=['Test_a', 'Test_b'])
+        sink.add(2, {'Test_a': numpy.array([False])}, errors=['Test_a'])
+        assert sink.flush() == 0
+        assert main.dbinteract('SELECT uid, test FROM unit_errors ORDER BY uid, test;') == [(1, 'test_a'), (1, 'test_b'), (2, 'test_a')]
+        assert main.dbinteract('SELECT COUNT(*) FROM unit WHERE test_a IS NULL;') == [(0,)], 'results of tests that raised should not be NULL'
+
+        sink.add(1, {'Test_a': numpy.array([True])}, errors=[])
+        assert sink.flush() == 0
+        assert main.dbinteract('SELECT uid, test FROM unit_errors ORDER BY uid, test;') == [(1, 'test_b'), (2, 'test_a')]
+        main.dbinteract('DROP TABLE unit_errors;')
+
+    def flushsize_test(self):
+        '''
+        setting flushsize writes results automatically
+        '''
+
+        sink = ResultSink('unit', 'iquod.db', flushsize=1)
+        sink.add(1, {'test_a': numpy.array([True])})
+
+        rows = main.dbinteract('SELECT test_a, test_b FROM unit WHERE uid=1;')
+        row = main.unpack_row(rows[0])
+        assert numpy.array_equal(row[0], [True]), 'result not flushed automatically'
+        assert row[1] is None, 'columns not in the result should be left alone'
+
+        sink.close()
+
+    def timings_test(self):
+        '''
+        timings are written to the timing table alongside the results, and only if it is set
+        '''
+
+        sink = ResultSink('unit', 'iquod.db', timingtable='unit_timing')
+        sink.add(1, {'test_a': numpy.array([True])}, [(1, 'test_a', 0.5, 0.25, 1, 2, 0)])
+        sink.add(2, {'test_a': numpy.array([False])}, [(2, 'test_a', 0.1, 0.1, 1, 0, 1)])
+        assert sink.flush() == 0
+
+        rows = main.dbinteract('SELECT uid, test, wall, cpu, levels, dbcalls, exception FROM unit_timing ORDER BY uid;')
+        assert rows == [(1, 'test_a', 0.5, 0.25, 1, 2, 0), (2, 'test_a', 0.1, 0.1, 1, 0, 1)]
+        assert sink.timings == []
+
+        untimed = ResultSink('unit', 'iquod.db')
+        untimed.add(1, {'test_b': numpy.array([True])}, [(1, 'test_b', 0.5, 0.25, 1, 2, 0)])
+        assert untimed.flush() == 0
+        assert len(main.dbinteract('SELECT * FROM unit_timing;')) == 2, 'timings written without a timing table'
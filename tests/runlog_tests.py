@@ -0,0 +1,58 @@
+from util.runlog import RunLog, read_logs
+import os, tempfile, shutil
+
+class TestClass():
+
+    def setUp(self):
+        self.logdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.logdir)
+
+    def record_test(self):
+        '''
+        records from several workers can be pulled back out by uid, test and level
+        '''
+
+        first = RunLog(self.logdir, 'worker-a')
+        second = RunLog(self.logdir, 'worker-b')
+        first.record(1, 'EN_range_check', 'error', exception='Traceback...', seconds=0.5)
+        first.record(2, level='info', message='processed')
+        second.record(1, level='info', message='processed')
+        first.close()
+        second.close()
+
+        assert sorted(os.listdir(self.logdir)) == ['worker-a.jsonl', 'worker-b.jsonl']
+        assert len(list(read_logs(self.logdir))) == 3
+        assert len(list(read_logs(self.logdir, uid=1))) == 2
+        errors = list(read_logs(self.logdir, test='EN_range_check'))
+        assert len(errors) == 1 and errors[0]['exception'] == 'Traceback...' and errors[0]['seconds'] == 0.5
+        assert [entry['uid'] for entry in read_logs(self.logdir, level='info')] == [2, 1]
+
+    def capture_test(self):
+        '''
+        anything printed while a profile is processed is logged against its uid
+        '''
+
+        log = RunLog(self.logdir, 'worker')
+        with log.capture(7):
+            print('bad db request')
+        log.close()
+
+        entries = list(read_logs(self.logdir, uid=7))
+        assert [entry['level'] for entry in entries] == ['stdout', 'info']
+        assert entries[0]['message'] == 'bad db request\n'
+        assert entries[1]['seconds'] >= 0
+
+    def partial_line_test(self):
+        '''
+        a record cut short by a killed worker is skipped
+        '''
+
+        log = RunLog(self.logdir, 'worker')
+        log.record(1)
+        log.close()
+        with open(os.path.join(self.logdir, 'worker.jsonl'), 'a') as f:
+            f.write('{"time": 1, "ui')
+
+        assert len(list(read_logs(self.logdir))) == 1
@@ -0,0 +1,75 @@
+import util.scheduler as scheduler
+import threading, time
+
+class TestClass():
+
+    def setUp(self):
+        self.checks = ['EN_background_available_check', 'EN_background_check', 'EN_range_check', 'EN_spike_and_step_check', 'EN_std_lev_bkg_and_buddy_check', 'ICDC_aqc_01_level_order', 'ICDC_aqc_02_crude_range']
+
+    def read_dependencies_test(self):
+        '''
+        check dependencies are read from qctest_requirements.json, limited to the tests in the run
+        '''
+
+        dependencies = scheduler.read_dependencies(self.checks)
+
+        assert dependencies['EN_background_check'] == ['EN_spike_and_step_check']
+        assert dependencies['EN_std_lev_bkg_and_buddy_check'] == ['EN_background_check', 'EN_range_check', 'EN_spike_and_step_check'], 'dependencies outside the run should be dropped'
+        assert dependencies['ICDC_aqc_02_crude_range'] == ['ICDC_aqc_01_level_order'], 'wildcards in applies_to should be matched'
+        assert dependencies['EN_range_check'] == []
+
+    def order_test(self):
+        '''
+        check every test is scheduled once, after its dependencies
+        '''
+
+        schedule = scheduler.Scheduler(self.checks, scheduler.read_dependencies(self.checks))
+
+        assert sorted(schedule.order) == sorted(self.checks)
+        for check in schedule.order:
+            for dependency in schedule.dependencies[check]:
+                assert schedule.order.index(dependency) < schedule.order.index(check), check + ' scheduled before ' + dependency
+        assert schedule.waves[0] == ['EN_range_check', 'EN_spike_and_step_check', 'ICDC_aqc_01_level_order']
+
+    def cycle_test(self):
+        '''
+        cyclic dependencies can't be scheduled
+        '''
+
+        try:
+            scheduler.Scheduler(['a', 'b'], {'a': ['b'], 'b': ['a']})
+            assert False, 'cyclic dependencies were scheduled'
+        except ValueError:
+            pass
+
+    def critical_path_test(self):
+        '''
+        check the longest chain of dependencies is found, with and without durations
+        '''
+
+        schedule = scheduler.Scheduler(['a', 'b', 'c', 'd'], {'b': ['a'], 'c': ['b'], 'd': ['a']})
+
+        assert schedule.critical_path() == (['a', 'b', 'c'], 3)
+        assert schedule.critical_path({'a': 1, 'b': 1, 'c': 1, 'd': 5}) == (['a', 'd'], 6)
+
+    def run_test(self):
+        '''
+        each test runs once and only after its dependencies, with or without threads
+        '''
+
+        dependencies = {'b': ['a'], 'c': ['a'], 'd': ['b', 'c']}
+        for threads in [1, 3]:
+            schedule = scheduler.Scheduler(['a', 'b', 'c', 'd'], dependencies, threads)
+            lock = threading.Lock()
+            calls = []
+            def runtest(check):
+                with lock:
+                    for dependency in dependencies.get(check, []):
+                        assert dependency in calls
+                    calls.append(check)
+                time.sleep(0.01)
+                return check.upper()
+
+            results = schedule.run(runtest)
+            assert sorted(calls) == ['a', 'b', 'c', 'd'], 'tests should run exactly once'
+            assert results == {'a': 'A', 'b': 'B', 'c': 'C', 'd': 'D'}
@@ -0,0 +1,18 @@
+import util.splitData as splitData
+from wodpy import wod
+
+def indexProfiles_test():
+    '''
+    make sure the profile index finds the same profiles, and boundaries, as reading the file through in full
+    '''
+
+    markers = splitData.indexProfiles('data/quota_subset.dat')
+
+    fid = open('data/quota_subset.dat')
+    for cruise, start, end, uid in markers:
+        assert fid.tell() == start, 'profile start position incorrect'
+        profile = wod.WodProfile(fid)
+        assert fid.tell() == end, 'profile end position incorrect'
+        assert (cruise, uid) == (profile.cruise(), profile.uid())
+    assert profile.is_last_profile_in_file(fid), 'not all profiles indexed'
+    fid.close()
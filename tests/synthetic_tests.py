@@ -0,0 +1,87 @@
+import util.synthetic as synthetic
+import util.main as main
+import qctests.EN_background_check
+import qctests.EN_spike_and_step_check
+import qctests.EN_track_check
+import qctests.AOML_climatology_test
+import qctests.loose_location_at_sea
+import qctests.minmax
+import numpy
+import os, tempfile, shutil
+
+class TestClass():
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db = os.path.join(self.directory, 'synthetic.db')
+
+    def tearDown(self):
+        main.disconnect(self.db)
+        shutil.rmtree(self.directory)
+
+    def workload_test(self):
+        '''
+        check workloads are reproducible, and shaped like the casts they stand for
+        '''
+
+        first = synthetic.workloads(20, seed=3)
+        second = synthetic.workloads(20, seed=3)
+        for kind in synthetic.kindNames:
+            assert len(first[kind]) == 20
+            for a, b in zip(first[kind], second[kind]):
+                assert a.uid() == b.uid() and a.latitude() == b.latitude() and a.datetime() == b.datetime()
+                assert numpy.array_equal(a.t(), b.t()) and numpy.array_equal(a.t().mask, b.t().mask)
+            for p in first[kind]:
+                spec = synthetic.kinds[kind]
+                assert p.probe_type() == spec['probe']
+                assert spec['levels'][0] <= p.n_levels() <= spec['levels'][1]
+                assert numpy.all(numpy.diff(p.z()) > 0), 'depths should increase'
+                assert p.s().mask.all() != spec['salinity']
+
+        assert first['xbt'][0].cruise() == first['xbt'][9].cruise() != first['xbt'][10].cruise(), 'casts should come in cruises of 10'
+        assert len(set([p.uid() for kind in first for p in first[kind]])) == 80, 'uids should be unique across workloads'
+        assert synthetic.workload('ctd', 5, seed=4)[0].latitude() != first['ctd'][0].latitude()
+
+    def writeTable_test(self):
+        '''
+        check profiles written to the database come back with the same levels and header
+        '''
+
+        profiles = synthetic.workload('argo', 12)
+        synthetic.writeTable(profiles, 'synthetic', self.db)
+
+        p = main.get_profile_from_db(profiles[3].uid(), 'synthetic', self.db)
+        assert p.uid() == profiles[3].uid() and p.n_levels() == profiles[3].n_levels()
+        assert numpy.array_equal(p.t(), profiles[3].t()) and numpy.array_equal(p.t().mask, profiles[3].t().mask)
+        assert numpy.array_equal(p.p(), profiles[3].p())
+
+        parameters = {'table': 'synthetic', 'db': self.db}
+        qctests.EN_track_check.test(profiles[0], parameters)
+        assert len(main.dbinteract('SELECT uid FROM synthetic WHERE en_track_check IS NOT NULL;', targetdb=self.db)) == 10, 'track check should cover the whole cruise'
+
+    def stub_test(self):
+        '''
+        check the background check runs on its stand-in climatology, and passes most clean levels
+        '''
+
+        p = synthetic.workload('bottle', 1)[0]
+        synthetic.writeTable([p], 'synthetic', self.db)
+        parameters = {'table': 'synthetic', 'db': self.db, 'persist_intermediates': False}
+        qctests.EN_spike_and_step_check.loadParameters(parameters)
+        synthetic.stubs['EN_background_check'](parameters)
+
+        qc = qctests.EN_background_check.test(p, parameters)
+        assert len(qc) == p.n_levels() and numpy.sum(qc) <= 1
+
+    def climatology_stubs_test(self):
+        '''
+        check the tests with stand-in climatologies and relief run on them, and pass most clean levels
+        '''
+
+        profiles = synthetic.workload('ctd', 3) + synthetic.workload('bottle', 3)
+        for test in ['AOML_climatology_test', 'loose_location_at_sea', 'minmax']:
+            parameters = {}
+            synthetic.stubs[test](parameters)
+            for p in profiles:
+                qc = getattr(qctests, test).test(p, parameters)
+                assert len(qc) == p.n_levels() and numpy.sum(qc) <= 0.05 * p.n_levels(), test + ' flagged too many synthetic levels'
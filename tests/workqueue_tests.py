@@ -0,0 +1,66 @@
+from util.workqueue import WorkQueue
+import os, tempfile, shutil
+
+class TestClass():
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.queuedb = os.path.join(self.directory, 'queue.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def lease_test(self):
+        '''
+        chunks are handed out once each, in order, and the queue is only filled once
+        '''
+
+        queue = WorkQueue(self.queuedb)
+        assert queue.fill([[1, 2], [3]], {1: ('EN_range_check',), 2: (), 3: ('EN_range_check', 'CSIRO_depth')})
+        assert not WorkQueue(self.queuedb).fill([[4]]), 'a queue with work in it should not be refilled'
+
+        chunk, token, uids, todo = queue.lease()
+        assert uids == [1, 2]
+        assert todo == {1: ('EN_range_check',), 2: ()}
+        queue.complete(chunk, token)
+
+        chunk, token, uids, todo = queue.lease()
+        assert uids == [3]
+        assert queue.heartbeat(chunk, token)
+
+        assert queue.lease() is None, 'leased chunks should not be handed out again'
+        assert queue.status() == {'done': 1, 'leased': 1}
+
+    def expired_lease_test(self):
+        '''
+        a chunk whose lease runs out goes to the next worker, until it has used up its attempts
+        '''
+
+        queue = WorkQueue(self.queuedb, leasetime=-1)
+        queue.fill([[1]])
+
+        chunk, first, uids, todo = queue.lease()
+        chunk, second, uids, todo = queue.lease()
+        assert first != second
+        assert not queue.heartbeat(chunk, first), 'the first lease should have been lost'
+
+        # completing under a lost lease changes nothing
+        queue.complete(chunk, first)
+        assert queue.status() == {'leased': 1}
+
+        queue.lease()
+        assert queue.lease() is None
+        assert queue.status() == {'failed': 1}
+
+    def release_test(self):
+        '''
+        a released chunk goes back to the queue
+        '''
+
+        queue = WorkQueue(self.queuedb)
+        queue.fill([[1]])
+        chunk, token, uids, todo = queue.lease()
+        queue.release(chunk, token)
+
+        assert queue.status() == {'pending': 1}
+        assert queue.lease()[2] == [1]
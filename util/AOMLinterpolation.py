@@ -16,7 +16,46 @@ def closest_index(coordinateList, point):
 
   return int(np.abs(np.array(coordinateList)-point).argmin())
 
-def get_index_and_next(lList, plot):
+class CoordinateIndex:
+  """
+    Reusable index over a list of coordinates (eg the latitudes, longitudes
+    or depths of a climatology grid), giving the same answers as
+    closest_index and get_index_and_next. For increasing coordinates the
+    closest element is found by bisection and only its immediate
+    neighbours are compared; otherwise every element is scanned, as in
+    closest_index.
+
+    coordinateList: list of floats
+  """
+
+  def __init__(self, coordinateList):
+    self.coordinates = np.array(coordinateList)
+    self.increasing = len(self.coordinates) > 1 and bool(np.all(np.diff(self.coordinates) > 0))
+
+  def closest(self, point):
+    """
+      Same as closest_index(coordinateList, point)
+    """
+
+    if self.increasing:
+      i = int(np.searchsorted(self.coordinates, point))
+      lo = max(i - 2, 0)
+      distances = np.abs(self.coordinates[lo:i+2] - point)
+      best = int(distances.argmin())
+      # distances only grow away from the closest coordinate, so the answer is in the window,
+      # unless something to its left could tie with it
+      if lo == 0 or distances[0] > distances[best]:
+        return lo + best
+    return int(np.abs(self.coordinates - point).argmin())
+
+  def index_and_next(self, plot):
+    """
+      Same as get_index_and_next(coordinateList, plot)
+    """
+
+    return get_index_and_next(self.coordinates, plot, self.closest(plot))
+
+def get_index_and_next(lList, plot, index1=None):
   """
     return two list indices in order: the index i of the value closest to <plot>, 
     and the next index if <plot> > lList[i],
@@ -24,9 +63,11 @@ def get_index_and_next(lList, plot):
 
     lList: list of floats
     plot: float
+    index1: closest_index(lList, plot), if already known
   """
 
-  index1 = closest_index(lList, plot)
+  if index1 is None:
+    index1 = closest_index(lList, plot)
   if index1 == 0:
     index2 = 1
   elif index1 == len(lList)-1 or lList[index1] > plot:
@@ -99,6 +140,48 @@ def nearest_indices(y, x, latLonList, amountNearNeighbors):
   tree = spatial.cKDTree(latLonList)
   return tree.query([y,x], min(amountNearNeighbors, len(latLonList)) )
 
+class NeighbourIndex:
+  """
+    Reusable nearest neighbour lookup over a fixed set of latitude and
+    longitude points, eg a climatology neighbourhood, for repeated queries
+    restricted to different subsets of valid points. Gives the same
+    neighbour and distance as nearest_indices(y, x, latLonList[valid], 1)
+    whenever that neighbour is within <radius>.
+
+    latLonList: (n, 2) array of latitude and longitude points
+  """
+
+  def __init__(self, latLonList):
+    self.latLons = np.asarray(latLonList, dtype=float)
+
+  def nearest(self, y, x, valid, radius=0.25):
+    """
+      Return the distance to and index (into latLonList) of the nearest
+      point to latitude y and longitude x among those where <valid> is true,
+      or (inf, None) if there is none within <radius>.
+    """
+
+    # only points inside a box just bigger than the radius can be close enough
+    box = valid & (np.abs(self.latLons[:, 0] - y) <= radius * 1.001) & (np.abs(self.latLons[:, 1] - x) <= radius * 1.001)
+    candidates = np.flatnonzero(box)
+    if len(candidates) == 0:
+      return np.inf, None
+
+    distances = np.sqrt((self.latLons[candidates, 0] - y)**2 + (self.latLons[candidates, 1] - x)**2)
+    order = np.argsort(distances)
+    nearest = distances[order[0]]
+    tied = len(candidates) > 1 and distances[order[1]] - nearest <= 1e-9 * max(nearest, 1)
+    if tied or abs(nearest - radius) <= 1e-9:
+      # equidistant points, or right on the radius: let the kd-tree decide, exactly as nearest_indices does
+      validIndices = np.flatnonzero(valid)
+      nearest, i = nearest_indices(y, x, self.latLons[validIndices], 1)
+      if nearest > radius:
+        return np.inf, None
+      return nearest, validIndices[i]
+    if nearest > radius:
+      return np.inf, None
+    return nearest, candidates[order[0]]
+
 def temperature_interpolation_process(x, y, depth, depthColumns, llList,
                                       llTempList, zeroDepthMissing,
                                       tempType):
@@ -182,3 +265,64 @@ def temperature_interpolation_process(x, y, depth, depthColumns, llList,
   else:
     return 99999.99
 
+
+def profile_interpolation_process(x, y, depths, depthColumns, latLons, temps,
+                                  zeroDepthMissing, tempType,
+                                  depthIndex=None, neighbours=None):
+  """
+    Same as temperature_interpolation_process, for all of a profile's
+      depths in one pass:
+      Float for longitude
+      Float for latitude
+      List of floats for depths
+      List for depth measurements
+      (n, 2) array of latitude and longitude points
+      (n, depths) array of temperatures, nan where missing
+      Boolean for whether or not to repeat the first depth column
+      String for name of type of climatology
+      Optional CoordinateIndex over depthColumns
+      Optional NeighbourIndex over latLons
+
+    Levels are grouped by the pair of climatology depths bracketing them;
+      the nearest point with data is found once per bracket, and all the
+      bracket's levels are interpolated with a single 1-D interpolation.
+
+    Return list with an interpolated temperature or 99999.99 for each depth
+  """
+
+  if depthIndex is None:
+    depthIndex = CoordinateIndex(depthColumns)
+  if neighbours is None:
+    neighbours = NeighbourIndex(latLons)
+  results = [99999.99] * len(depths)
+
+  # group levels by their bracketing depths
+  brackets = {}
+  for i, depth in enumerate(depths):
+    depIndex1, depIndex2 = depthIndex.index_and_next(depth)
+    if depth > depthColumns[depIndex2]:
+      continue
+    brackets.setdefault((depIndex1, depIndex2), []).append(i)
+
+  for (depIndex1, depIndex2), levels in brackets.items():
+    # find the nearest point with data at both bracketing depths to the point of interest
+    valid = ~np.isnan(temps[:, depIndex1]) & ~np.isnan(temps[:, depIndex2])
+    nearestRadDistance, nearestIndex = neighbours.nearest(y, x, valid)
+    if nearestIndex is None:
+      continue
+
+    tempByDepth = list(temps[nearestIndex][depIndex1:depIndex2+1])
+    depthColumnsSection = [depthColumns[depIndex1], depthColumns[depIndex2]]
+    if depIndex1 == 0 and zeroDepthMissing:
+      depthColumnsSection.insert(0, 0.0)
+      tempByDepth.insert(0, tempByDepth[depIndex1])
+    if (tempType == "climaInterpStandardDev"):
+      depthColumnsSection = np.array(depthColumnsSection).clip(min=0)
+
+    f = interpolate.interp1d(depthColumnsSection, tempByDepth)
+    interpDepthTemps = f([depths[i] for i in levels])
+    for i, d in zip(levels, interpDepthTemps):
+      if not np.isnan(d):
+        results[i] = d
+
+  return results
@@ -2,7 +2,7 @@
 #
 # Author: Patrick Halsall
 
-import sys
+import sys, os
 from . import AOMLinterpolation as interp_helper
 import numpy as np
 from netCDF4 import Dataset
@@ -178,3 +178,112 @@ def organize_data(netFile, minLatIndexNumber, maxLatIndexNumber,
   
   return latLonList, list(latLonTempDict.values())
 
+
+# climatology fields opened by this process, keyed by (process id, file, field); see climatology_field
+_fields = {}
+
+class ClimatologyField:
+  """
+    One field (eg t_an) of a gridded climatology netCDF file, with its time,
+    depth, latitude and longitude coordinates read once.
+    If preload is set the whole field is read into memory, with nan where
+    masked, and the file closed; otherwise the file is kept open and
+    neighbourhoods are read with a single slice of the field per call.
+  """
+
+  def __init__(self, netcdFile, fieldType, clima=True, preload=False):
+    self.nf = Dataset(netcdFile, "r")
+    if clima:
+      self.time = self.nf.variables["time"][0]
+      self.deps = self.nf.variables["depth"][:]
+      self.lats = self.nf.variables["lat"][:]
+      self.lons = self.nf.variables["lon"][:]
+    else:
+      self.time = self.nf.variables["Time"][0]
+      self.deps = self.nf.variables["zt_k"][:]
+      self.lats = self.nf.variables["yt_j"][:]
+      self.lons = self.nf.variables["xt_i"][:]
+    self.index()
+    self.field = self.nf.variables[fieldType]
+    self.data = None
+    if preload:
+      self.data = np.ma.filled(self.field[0, 0:len(self.deps)], np.nan)
+      self.field = None
+      self.nf.close()
+
+  @classmethod
+  def from_arrays(cls, deps, lats, lons, data, time=0):
+    """
+      A preloaded field made from arrays rather than read from a file, eg a
+      synthetic stand-in: depth, latitude and longitude coordinates, and a
+      (depth, latitude, longitude) array of data with nan where missing
+    """
+
+    field = cls.__new__(cls)
+    field.nf = None
+    field.field = None
+    field.time = time
+    field.deps = np.asarray(deps)
+    field.lats = np.asarray(lats)
+    field.lons = np.asarray(lons)
+    field.data = data
+    field.index()
+    return field
+
+  def index(self):
+    """
+      Build the indexes over the latitude, longitude and depth coordinates
+    """
+
+    self.latIndex = interp_helper.CoordinateIndex(self.lats)
+    self.lonIndex = interp_helper.CoordinateIndex(self.lons)
+    self.depthIndex = interp_helper.CoordinateIndex(self.deps)
+
+  def neighbourhood(self, x, y, cScope):
+    """
+      Same points as subset_data, as arrays:
+      Float for longitude
+      Float for latitude
+      Float for range of coordinates to gather
+
+      Return (n, 2) array of latitude and longitude points, (n, depths) array
+        of temperatures with nan where masked, in the same order as subset_data
+    """
+
+    minIndexLat = self.latIndex.closest(y - cScope)
+    maxIndexLat = self.latIndex.closest(y + cScope)
+    minIndexLon = self.lonIndex.closest(x - cScope)
+    maxIndexLon = self.lonIndex.closest(x + cScope)
+
+    # longitude index ranges to read, and the shift to apply to each; see lon_lat_temp_lists
+    lonsLength = len(self.lons)
+    lonRanges = [(minIndexLon, maxIndexLon, 0)]
+    if (0 <= minIndexLon <= 4):
+      lonRanges.append((lonsLength - 5, lonsLength - 2, -360))
+    elif (lonsLength - 5 <= maxIndexLon <= lonsLength - 1):
+      lonRanges.append((0, 4, 360))
+
+    latLons = []
+    temps = []
+    for minIndexLon, maxIndexLon, degrees in lonRanges:
+      if self.data is not None:
+        data = self.data[:, minIndexLat:maxIndexLat+1, minIndexLon:maxIndexLon+1]
+      else:
+        data = np.ma.filled(self.field[0, 0:len(self.deps), minIndexLat:maxIndexLat+1, minIndexLon:maxIndexLon+1], np.nan)
+      # one row per (latitude, longitude) point, latitude major
+      temps.append(data.reshape(data.shape[0], -1).transpose())
+      lat, lon = np.meshgrid(np.ma.getdata(self.lats[minIndexLat:maxIndexLat+1]), np.ma.getdata(self.lons[minIndexLon:maxIndexLon+1])+degrees, indexing='ij')
+      latLons.append(np.column_stack((lat.ravel(), lon.ravel())))
+
+    return np.concatenate(latLons), np.concatenate(temps)
+
+def climatology_field(netcdFile, fieldType, clima=True):
+  """
+    Return this process' ClimatologyField for <fieldType> in <netcdFile>,
+    opening it on first use.
+  """
+
+  key = (os.getpid(), os.path.abspath(netcdFile), fieldType)
+  if key not in _fields:
+    _fields[key] = ClimatologyField(netcdFile, fieldType, clima)
+  return _fields[key]
@@ -0,0 +1,132 @@
+'''
+A store of the large auxiliary grids (climatologies, error variances, relief)
+used by the qc tests. Each grid is written once to a .npy file and read back
+memory-mapped, so every process that loads it - forked pool workers and
+freshly imported ones alike - shares the same read-only pages instead of
+holding its own copy.
+'''
+
+import json, os, shutil
+import numpy as np
+
+# where the .npy files live, one subdirectory per dataset
+cachedir = 'data/auxcache'
+
+def source_stamps(sources):
+    '''
+    return a dict of [mtime, size] for each existing file in <sources>,
+    used to notice when the files a dataset was built from have changed.
+    '''
+
+    stamps = {}
+    for source in sources:
+        if os.path.isfile(source):
+            stat = os.stat(source)
+            stamps[source] = [stat.st_mtime, stat.st_size]
+    return stamps
+
+def save(directory, arrays):
+    '''
+    write the dict <arrays> to <directory>, one .npy file per entry;
+    masked arrays also get a <key>.mask.npy unless they have no mask at all.
+    '''
+
+    contents = {}
+    for key, value in arrays.items():
+        if isinstance(value, np.ma.MaskedArray):
+            np.save(os.path.join(directory, key + '.npy'), value.data)
+            if value.mask is not np.ma.nomask:
+                np.save(os.path.join(directory, key + '.mask.npy'), value.mask)
+                contents[key] = 'masked'
+            else:
+                contents[key] = 'nomask'
+        else:
+            np.save(os.path.join(directory, key + '.npy'), np.asarray(value))
+            contents[key] = 'scalar' if np.ndim(value) == 0 else 'array'
+    return contents
+
+def load(directory, contents):
+    '''
+    read back the arrays written by save(), memory-mapped and read-only.
+    '''
+
+    arrays = {}
+    for key, kind in contents.items():
+        if kind == 'scalar':
+            arrays[key] = np.load(os.path.join(directory, key + '.npy'))[()]
+            continue
+        # plain ndarray views of the maps, so slices can still be deep-copied
+        data = np.load(os.path.join(directory, key + '.npy'), mmap_mode='r').view(np.ndarray)
+        if kind == 'masked':
+            mask = np.load(os.path.join(directory, key + '.mask.npy'), mmap_mode='r').view(np.ndarray)
+            arrays[key] = np.ma.MaskedArray(data, mask=mask, copy=False)
+        elif kind == 'nomask':
+            arrays[key] = np.ma.MaskedArray(data, copy=False)
+        else:
+            arrays[key] = data
+    return arrays
+
+def published(target, stamps):
+    '''
+    return the arrays published at <target> if they were built from sources matching <stamps>, else None.
+    '''
+
+    for attempt in range(2):
+        try:
+            with open(os.path.join(target, 'manifest.json')) as f:
+                info = json.load(f)
+            if info['sources'] != stamps:
+                return None
+            return load(target, info['contents'])
+        except FileNotFoundError:
+            # nothing published yet, or replaced by a newer copy while being read; look once more
+            continue
+    return None
+
+def shared_arrays(name, build, sources=(), directory=None):
+    '''
+    return the dict of numpy arrays and scalars produced by build(), memory-mapped from
+    <directory>/<name>. build() is only called if there is no copy on disk yet,
+    or if any of the files in <sources> has changed since it was written.
+    '''
+
+    if directory is None:
+        directory = cachedir
+    target = os.path.join(directory, name)
+    stamps = source_stamps(sources)
+
+    arrays = published(target, stamps)
+    if arrays is not None:
+        return arrays
+
+    # write to a private directory first, so no process ever maps a half written dataset
+    scratch = target + '.' + str(os.getpid())
+    shutil.rmtree(scratch, ignore_errors=True)
+    os.makedirs(scratch)
+    try:
+        contents = save(scratch, build())
+        # stamp the sources afresh, in case build() wrote one of them
+        with open(os.path.join(scratch, 'manifest.json'), 'w') as f:
+            json.dump({'sources': source_stamps(sources), 'contents': contents}, f)
+    except:
+        shutil.rmtree(scratch, ignore_errors=True)
+        raise
+
+    # move any stale copy aside rather than deleting it in place, so processes still
+    # reading it don't lose files mid-load; the maps they already hold stay valid
+    stale = target + '.stale.' + str(os.getpid())
+    try:
+        os.rename(target, stale)
+    except OSError:
+        stale = None
+    try:
+        os.rename(scratch, target)
+    except OSError:
+        # another process published a copy first; use that one
+        shutil.rmtree(scratch, ignore_errors=True)
+    if stale is not None:
+        shutil.rmtree(stale, ignore_errors=True)
+
+    with open(os.path.join(target, 'manifest.json')) as f:
+        info = json.load(f)
+    return load(target, info['contents'])
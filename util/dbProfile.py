@@ -0,0 +1,150 @@
+import numpy as np
+
+# stands in for header columns a table doesn't have, so they're looked up on the wodpy profile instead
+unknown = object()
+
+class PrimaryHeader(dict):
+    '''
+    the primary header of a dbProfile: the fields stored as table columns,
+    with any other field looked up on the wodpy profile.
+    '''
+
+    def __init__(self, fields, wod):
+        dict.__init__(self, fields)
+        self.wod = wod
+
+    def __missing__(self, key):
+        return self.wod().primary_header[key]
+
+class dbProfile:
+    '''
+    a profile built from the pre-extracted level arrays and header columns
+    that build-db.py stores alongside the raw WOD text, so that the common
+    accessors (t, z, s, p, position, date, probe type...) need no wodpy parsing.
+    anything else is looked up on a wodpy profile parsed from the raw text
+    the first time it's needed.
+    '''
+
+    def __init__(self, raw, uid, latitude, longitude, year, month, day, time, cruise, probe_type, depths, temperatures, salinities, pressures,
+                 country=unknown, originator_cruise=unknown, platform=unknown):
+
+        self.raw = raw
+        self.header = {
+            'uid': uid,
+            'latitude': latitude,
+            'longitude': longitude,
+            'year': year,
+            'month': month,
+            'day': day,
+            'time': time,
+            'cruise': cruise,
+            'probe_type': probe_type
+        }
+        # header columns only some tables have
+        for key, value in [('country', country), ('originator_cruise', originator_cruise), ('platform', platform)]:
+            if value is not unknown:
+                self.header[key] = value
+        self.depths = depths
+        self.temperatures = temperatures
+        self.salinities = salinities
+        self.pressures = pressures
+        self.flagsCaught = False
+        self._wod = None
+
+    def __getattr__(self, name):
+        # only called for attributes not defined here; defer to the full wodpy profile
+        if name.startswith('__') or name in ['raw', '_wod', 'flagsCaught']:
+            raise AttributeError(name)
+        return getattr(self.wod(), name)
+
+    def wod(self):
+        """ Returns the wodpy profile for the raw text, parsing it on first use. """
+        if self._wod is None:
+            import util.main as main
+            self._wod = main.text2wod(self.raw)
+            if self.flagsCaught:
+                main.catchFlags(self._wod)
+        return self._wod
+
+    def catchFlags(self):
+        """ Masks temperatures of 99.x, same as main.catchFlags does for wodpy profiles. """
+        flags = ~np.ma.getmaskarray(self.temperatures) & (self.temperatures.data >= 99) & (self.temperatures.data < 100)
+        self.temperatures = np.ma.array(np.where(flags, 0.0, self.temperatures.data), mask=np.ma.getmaskarray(self.temperatures) | flags)
+        self.flagsCaught = True
+        if self._wod is not None:
+            import util.main as main
+            main.catchFlags(self._wod)
+
+    def uid(self):
+        """ Returns the unique identifier of the profile. """
+        return self.header['uid']
+
+    def latitude(self):
+        """ Returns the latitude of the profile. """
+        return self.header['latitude']
+
+    def longitude(self):
+        """ Returns the longitude of the profile. """
+        return self.header['longitude']
+
+    def year(self):
+        """ Returns the year. """
+        return self.header['year']
+
+    def month(self):
+        """ Returns the month. """
+        return self.header['month']
+
+    def day(self):
+        """ Returns the day. """
+        return self.header['day']
+
+    def time(self):
+        """ Returns the time. """
+        return self.header['time']
+
+    def cruise(self):
+        """ Returns the cruise number. """
+        return self.header['cruise']
+
+    def originator_cruise(self):
+        """ Returns the originator cruise ID. """
+        if 'originator_cruise' in self.header:
+            return self.header['originator_cruise']
+        return self.wod().originator_cruise()
+
+    @property
+    def primary_header(self):
+        """ The primary header; Country code comes from the table if it was stored there. """
+        fields = {'Country code': self.header['country']} if 'country' in self.header else {}
+        return PrimaryHeader(fields, self.wod)
+
+    def extract_secondary_header(self, index):
+        """ Returns the contents of secondary header <index> if it exists, otherwise None; the platform (3) comes from the table if it was stored there. """
+        if index == 3 and 'platform' in self.header:
+            return self.header['platform']
+        return self.wod().extract_secondary_header(index)
+
+    def probe_type(self):
+        """ Returns the probe type. """
+        return self.header['probe_type']
+
+    def n_levels(self):
+        """ Returns the number of levels in the profile. """
+        return len(self.depths)
+
+    def z(self):
+        """ Returns a numpy masked array of depths. """
+        return self.depths.copy()
+
+    def t(self):
+        """ Returns a numpy masked array of temperatures. """
+        return self.temperatures.copy()
+
+    def s(self):
+        """ Returns a numpy masked array of salinities. """
+        return self.salinities.copy()
+
+    def p(self):
+        """ Returns a numpy masked array of pressures. """
+        return self.pressures.copy()
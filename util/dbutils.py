@@ -8,7 +8,7 @@ def unpack_qc(value):
     'unpack a qc result from the db'
 
     try:
-        qc = numpy.load(io.BytesIO(value), allow_pickle=True)
+        qc = main.unpack_array(value)
     except:
         print('failed to unpack qc data - check db for missing entries.')
         qc = numpy.zeros(1, dtype=bool)
@@ -158,7 +158,7 @@ def db_to_df(table,
     testNames.sort()
 
     # connect to database
-    conn = sqlite3.connect(targetdb, isolation_level=None)
+    conn = main.configure(sqlite3.connect(targetdb, isolation_level=None))
     cur = conn.cursor()
 
     # extract matrix of test results and true flags into a dataframe
@@ -291,5 +291,19 @@ def retrieve_existing_qc_result(test, uid, table='iquod', db='iquod.db'):
     print(query)
     print(qc_log)
     raise
-    
+
+def memoized_qc_result(test, p, parameters, run_qc):
+    '''
+    Returns the QC results of <test> for profile p, memoized on the profile if
+    already computed in this process, else as stored in the database by a
+    previous run, else by calling run_qc(p, parameters).
+    '''
+
+    def compute():
+        qc_log = retrieve_existing_qc_result(test, p.uid(), parameters['table'], parameters['db'])
+        if qc_log is not None:
+            return qc_log
+        return run_qc(p, parameters)
+
+    return main.memoize(p, test, compute)
 
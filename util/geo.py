@@ -49,9 +49,16 @@ def haversineAngle(lat1, lon1, lat2, lon2, lat3, lon3):
     if None in [lat1, lon1, lat2, lon2, lat3, lon3]:
         return None
 
-    a = haversineDistance(lat1, lon1, lat2, lon2) / 6367000.
-    b = haversineDistance(lat2, lon2, lat3, lon3) / 6367000.
-    c = haversineDistance(lat3, lon3, lat1, lon1) / 6367000.
+    return sidesAngle(haversineDistance(lat1, lon1, lat2, lon2), haversineDistance(lat2, lon2, lat3, lon3), haversineDistance(lat3, lon3, lat1, lon1))
+
+def sidesAngle(dist12, dist23, dist31):
+    '''
+    as haversineAngle, given the great circle distances in meters between the three points
+    '''
+
+    a = dist12 / 6367000.
+    b = dist23 / 6367000.
+    c = dist31 / 6367000.
 
     if a == 0 or b == 0:
         return 0
@@ -90,6 +97,25 @@ def deltaTime(earlier, later):
 
     return timeDiff
 
+def epochSeconds(date):
+    '''
+    Calculate the number of seconds between the unix epoch and the tuple (year, month, day, time),
+    such that differences agree exactly with deltaTime.
+    return None if information is missing or invalid.
+    '''
+
+    if None in [date[0], date[1], date[2], date[3]]:
+        return None
+
+    hour, minute, second = parseTime(date[3])
+
+    try:
+        moment = datetime(year=date[0], month=date[1], day=date[2], hour=hour, minute=minute, second=second)
+    except:
+        return None
+
+    return (moment - datetime(1970, 1, 1)).total_seconds()
+
 def parseTime(time):
     '''
     convert a WOD time on [0,24) to ints: hour [0,23], minute [0, 59], second [0, 59]
@@ -0,0 +1,202 @@
+'''
+Support for incremental QC runs: a manifest table records which version of
+each qc test produced the results in a table, so that only the result cells
+that are missing - because a run was interrupted, a test was added, or a
+test's code changed - need to be computed. An error table marks the results
+of tests that raised, so they are kept rather than retried on every run.
+'''
+
+import hashlib, importlib, os, sys, time, types
+import util.main as main
+
+# tables of intermediate products, keyed by uid, that tests keep for reuse by themselves
+# and the tests that depend on them; these go stale along with the tests' results
+intermediate_tables = {
+    'EN_background_check': ['enbackground'],
+    'EN_spike_and_step_check': ['enspikeandstep'],
+    'ICDC_aqc_01_level_order': ['icdclevelorder']
+}
+
+def manifest_table(table):
+    '''
+    name of the table recording the test versions behind the results in <table>
+    '''
+
+    return table + '_manifest'
+
+def create_manifest(table):
+    '''
+    statement creating the manifest of <table>, if it doesn't exist yet
+    '''
+
+    return 'CREATE TABLE IF NOT EXISTS ' + manifest_table(table) + ' (test TEXT PRIMARY KEY, version TEXT, recorded REAL);'
+
+def error_table(table):
+    '''
+    name of the table marking the results in <table> of tests that raised
+    '''
+
+    return table + '_errors'
+
+def create_errors(errortable):
+    '''
+    statement creating the error table <errortable>, if it doesn't exist yet;
+    a row (uid, test) marks the result of test (lower case, as its column) for that profile as an error.
+    '''
+
+    return 'CREATE TABLE IF NOT EXISTS ' + errortable + ' (uid INTEGER, test TEXT, PRIMARY KEY (uid, test));'
+
+def source_files(test, dir='qctests'):
+    '''
+    return the sorted paths of the source of <test> and of every module of this repository
+    it uses, directly or through the modules it uses in turn, found from the modules,
+    functions and classes each module holds.
+    '''
+
+    root = os.path.dirname(os.path.abspath(dir)) + os.sep
+    files = set()
+    new = [importlib.import_module(dir + '.' + test)]
+    while new:
+        module = new.pop()
+        path = os.path.abspath(getattr(module, '__file__', None) or '')
+        if not path.startswith(root) or 'site-packages' in path or path in files:
+            continue
+        files.add(path)
+        for value in list(vars(module).values()):
+            if isinstance(value, types.ModuleType):
+                new.append(value)
+            elif isinstance(getattr(value, '__module__', None), str) and value.__module__ in sys.modules:
+                new.append(sys.modules[value.__module__])
+
+    return sorted(files)
+
+def test_version(test, dir='qctests'):
+    '''
+    a hash of the source of <test>, of every qc test it requires, and of every module
+    of this repository they use, so that changing any of them changes its results' version.
+    '''
+
+    root = os.path.dirname(os.path.abspath(dir))
+    files = set()
+    for name in main.requiredQCTests([test]):
+        files.update(source_files(name, dir))
+
+    sha = hashlib.sha1()
+    for path in sorted(files):
+        with open(path, 'rb') as f:
+            sha.update(os.path.relpath(path, root).encode() + b'\0' + f.read())
+    return sha.hexdigest()
+
+def add_test_columns(table, tests, targetdb='iquod.db'):
+    '''
+    add a result column to <table> for each of <tests> it doesn't have yet,
+    eg for qc tests written after the database was built; returns the tests added.
+    '''
+
+    columns = [column.lower() for column in main.table_columns(table, targetdb)]
+    added = [test for test in tests if test.lower() not in columns]
+    with main.transaction(targetdb) as cur:
+        for test in added:
+            cur.execute('ALTER TABLE ' + table + ' ADD COLUMN ' + test.lower() + ' BLOB;')
+    main.forget_columns(targetdb)
+    return added
+
+def recorded_versions(table, targetdb='iquod.db'):
+    '''
+    return a dict of the test versions recorded in the manifest of <table>, keyed by test
+    '''
+
+    main.dbinteract(create_manifest(table), targetdb=targetdb)
+    rows = main.dbinteract('SELECT test, version FROM ' + manifest_table(table) + ';', targetdb=targetdb) or []
+    return dict(rows)
+
+def record_versions(table, tests, targetdb='iquod.db'):
+    '''
+    record the current version of each of <tests> as the one behind its results in <table>
+    '''
+
+    recorded_versions(table, targetdb)
+    now = time.time()
+    with main.transaction(targetdb) as cur:
+        cur.executemany('INSERT OR REPLACE INTO ' + manifest_table(table) + ' (test, version, recorded) VALUES (?, ?, ?);',
+                        [(test, test_version(test), now) for test in tests])
+
+def stale_intermediates(changed):
+    '''
+    return the intermediate tables kept by the tests in <changed>, and by any test requiring one of them
+    '''
+
+    tables = set()
+    for test in main.importQC('qctests'):
+        if set(changed).intersection(main.requiredQCTests([test])):
+            tables.update(intermediate_tables.get(test, []))
+    return sorted(tables)
+
+def invalidate_changed(table, tests, targetdb='iquod.db'):
+    '''
+    clear the results in <table> of any of <tests> whose code has changed since its version
+    was recorded, along with their error marks and their intermediate products for the profiles in <table>,
+    and record the new version, so its cells are found by missing_work.
+    results of tests with no recorded version are assumed current.
+    returns the tests whose results were cleared.
+    '''
+
+    current = {test: test_version(test) for test in tests}
+
+    # read, clear and record in one go under the write lock, so an interrupted run can't leave stale
+    # results looking current, and two processes starting at once can't both decide a test changed
+    now = time.time()
+    with main.transaction(targetdb, immediate=True) as cur:
+        cur.execute(create_manifest(table))
+        versions = dict(cur.execute('SELECT test, version FROM ' + manifest_table(table) + ';').fetchall())
+        changed = [test for test in tests if test in versions and versions[test] != current[test]]
+        cur.execute(create_errors(error_table(table)))
+        for test in changed:
+            cur.execute('UPDATE ' + table + ' SET ' + test.lower() + ' = NULL;')
+            cur.execute('DELETE FROM ' + error_table(table) + ' WHERE test = ?;', (test.lower(),))
+        for intermediate in stale_intermediates(changed):
+            if cur.execute('SELECT name FROM sqlite_master WHERE type = \'table\' AND name = ?;', (intermediate,)).fetchall():
+                cur.execute('DELETE FROM ' + intermediate + ' WHERE uid IN (SELECT uid FROM ' + table + ');')
+        cur.executemany('INSERT OR REPLACE INTO ' + manifest_table(table) + ' (test, version, recorded) VALUES (?, ?, ?);',
+                        [(test, current[test], now) for test in tests if versions.get(test) != current[test]])
+
+    return changed
+
+def count_errors(table, tests, targetdb='iquod.db'):
+    '''
+    return the number of results in <table> of <tests> marked as errors
+    '''
+
+    main.dbinteract(create_errors(error_table(table)), targetdb=targetdb)
+    query = 'SELECT COUNT(*) FROM ' + error_table(table) + ' WHERE test IN (' + ','.join(['?'] * len(tests)) + ');'
+    return main.dbinteract(query, [test.lower() for test in tests], targetdb=targetdb)[0][0]
+
+def retry_errors(table, tests, targetdb='iquod.db'):
+    '''
+    clear the results in <table> of any of <tests> marked as errors, and their marks,
+    so they are found by missing_work; returns the number of results cleared.
+    '''
+
+    cleared = 0
+    with main.transaction(targetdb, immediate=True) as cur:
+        cur.execute(create_errors(error_table(table)))
+        for test in tests:
+            cur.execute('UPDATE ' + table + ' SET ' + test.lower() + ' = NULL WHERE uid IN (SELECT uid FROM ' + error_table(table) + ' WHERE test = ?);', (test.lower(),))
+            cleared += cur.rowcount
+            cur.execute('DELETE FROM ' + error_table(table) + ' WHERE test = ?;', (test.lower(),))
+    return cleared
+
+def missing_work(table, tests, targetdb='iquod.db'):
+    '''
+    return a dict keyed by the uid of every profile in <table> with a NULL result
+    for any of <tests>, each value the tuple of those tests; found in a single table scan.
+    '''
+
+    if len(tests) == 0:
+        return {}
+
+    query = 'SELECT uid, ' + ', '.join([test.lower() + ' IS NULL' for test in tests]) + ' FROM ' + table
+    query += ' WHERE ' + ' OR '.join([test.lower() + ' IS NULL' for test in tests]) + ';'
+    rows = main.dbinteract(query, targetdb=targetdb) or []
+
+    return {row[0]: tuple([test for test, missing in zip(tests, row[1:]) if missing]) for row in rows}
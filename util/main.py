@@ -1,12 +1,13 @@
 ## helper functions used in the top level AutoQC.py
 
-import json, os, glob, time, pandas, csv, sys, fnmatch, sqlite3, io, pickle, math
+import json, os, glob, time, pandas, csv, sys, fnmatch, sqlite3, io, pickle, math, contextlib
 import numpy as np
 from wodpy import wod
 from netCDF4 import Dataset
 from . import testingProfile
+from . import dbProfile
 from numbers import Number
-import tempfile
+import collections, importlib, copy, threading, weakref
 import oceansdb
 
 def importQC(dir):
@@ -18,12 +19,93 @@ def importQC(dir):
 
   return testNames
 
+def buildQCRegistry(testNames, dir='qctests'):
+  '''
+  import each test named in <testNames> from package <dir> exactly once,
+  and return a dict keyed by test name, each value a dict with keys:
+  'module': the imported module object
+  'test': the module's test(p, parameters) function
+  'loadParameters': the module's loadParameters(parameterStore) function, or None if it has none
+  'dependencies': list of other qc tests this test requires, per qctest_requirements.json
+  '''
+
+  dependencies = qcDependencies(testNames)
+
+  registry = {}
+  for testName in testNames:
+    module = importlib.import_module(dir + '.' + testName)
+    registry[testName] = {
+      'module': module,
+      'test': module.test,
+      'loadParameters': getattr(module, 'loadParameters', None),
+      'dependencies': dependencies[testName]
+    }
+
+  return registry
+
+def qcDependencies(checks):
+  '''
+  Reads the 'qctests' requirements from qctest_requirements.json and
+  returns a dict keyed by the names in <checks>, each value a sorted
+  list of the other QC tests that check requires.
+  '''
+
+  with open('qctest_requirements.json') as f:
+    reqs = json.load(f)
+
+  dependencies = {}
+  for check in checks:
+    required = set()
+    for req in reqs:
+      if 'qctests' not in req:
+        continue
+      for applycheck in req['applies_to']:
+        if fnmatch.fnmatch(check, applycheck):
+          required.update(req['qctests'])
+    required.discard(check)
+    dependencies[check] = sorted(required)
+
+  return dependencies
+
+def selectQCTests(checks, patterns):
+  '''
+  return the sorted names in <checks> matching any of <patterns>,
+  a list of test names or wildcards like EN_*; prints any pattern that matches nothing.
+  '''
+
+  selected = set()
+  for pattern in patterns:
+    matches = fnmatch.filter(checks, pattern)
+    if matches == []:
+      print('  no runnable QC test matches ' + pattern)
+    selected.update(matches)
+
+  return sorted(selected)
+
+def requiredQCTests(checks):
+  '''
+  return the sorted names in <checks> together with every QC test
+  they require, directly or through other required tests.
+  '''
+
+  required = set(checks)
+  new = list(checks)
+  while new:
+    dependencies = qcDependencies(new)
+    new = sorted(set([dependency for check in new for dependency in dependencies[check]]) - required)
+    required.update(new)
+
+  return sorted(required)
+
 def catchFlags(profile):
   '''
   In some IQuOD datasets temperature values of 99.9 or 99.99 are special values to
   signify not to use the data value. These are flagged here so they are not
   sent to the quality control programs for testing.
   '''
+  if isinstance(profile, dbProfile.dbProfile):
+    profile.catchFlags()
+    return
   index = profile.var_index()
   assert index is not None, 'No temperatures in profile {}'.format(profile.uid())
   for i in range(profile.n_levels()):
@@ -32,12 +114,13 @@ def catchFlags(profile):
       if profile.profile_data[i]['variables'][index]['Value'] >= 99 and profile.profile_data[i]['variables'][index]['Value'] < 100:
           profile.profile_data[i]['variables'][index]['Missing'] = True
 
-def checkQCTestRequirements(checks):
+def checkQCTestRequirements(checks, datastubs=[]):
   '''Reads set of requirements from qctest_requirements.json and
      checks each QC test to see if their requirements are met.
      A list of QC tests that meet requirements are returned.
      Messages are printed to screen if a check does not meet
-     its requirements.
+     its requirements. Tests named in datastubs are assumed to
+     have their data files, for when stand-ins will be supplied.
   '''
 
   # Read list of requirements to run the quality control checks.
@@ -74,7 +157,7 @@ def checkQCTestRequirements(checks):
               except:
                 use = False
                 print('  ' + check + ' not available without module ' + module)
-          if 'data' in req:
+          if 'data' in req and check not in datastubs:
             for datafile in req['data']:
               if not isinstance(datafile, list):
                 datafile = [datafile]
@@ -127,26 +210,189 @@ def calcRates(testResults, trueResults):
 
   return tpr, fpr, fnr, tnr 
 
+# columns written by build-db.py that let profiles be built without parsing the raw text
+level_columns = ['uid', 'lat', 'long', 'year', 'month', 'day', 'time', 'cruise', 'probe', 'depth', 'temperature', 'salinity', 'pressure']
+
+# further header columns handed to dbProfile where a table has them, keyed by dbProfile's argument name
+header_columns = collections.OrderedDict([('country', 'country'), ('originator_cruise', 'ocruise'), ('platform', 'platform')])
+
+def table_columns(table, targetdb):
+  '''
+  return the list of column names of <table> in <targetdb>,
+  looked up once per connection while the schema is unchanged.
+  '''
+
+  key = (connection_key(targetdb), table)
+  if key not in _columns:
+    columns = dbinteract('PRAGMA table_info(' + table + ');', targetdb=targetdb) or []
+    if not columns:
+      # no such table yet; don't remember that
+      return []
+    _columns[key] = [column[1] for column in columns]
+  return list(_columns[key])
+
+def forget_columns(targetdb):
+  '''
+  drop the column lists table_columns has cached for this connection to <targetdb>, after a schema change.
+  '''
+
+  for key in list(_columns):
+    if key[0] == connection_key(targetdb):
+      del _columns[key]
+
+def stores_levels(table, targetdb):
+  '''
+  true if <table> in <targetdb> was built with pre-extracted level arrays.
+  '''
+
+  return set(level_columns).issubset(table_columns(table, targetdb))
+
+def stored_headers(table, targetdb):
+  '''
+  return the names of the header_columns <table> in <targetdb> has, as dbProfile arguments.
+  '''
+
+  columns = table_columns(table, targetdb)
+  return [name for name, column in header_columns.items() if column in columns]
+
+def profile_from_row(row, headers=[]):
+  '''
+  given a row of raw followed by level_columns and then the header columns named in <headers>, return a dbProfile.
+  '''
+
+  raw, uid, lat, lon, year, month, day, time, cruise, probe, depth, temperature, salinity, pressure = row[0:len(level_columns)+1]
+  return dbProfile.dbProfile(raw[1:-1], uid, lat, lon, year, month, day, time, cruise, probe,
+                             unpack_array(depth), unpack_array(temperature), unpack_array(salinity), unpack_array(pressure),
+                             **dict(zip(headers, row[len(level_columns)+1:])))
+
+def group_chunks(rows, chunksize=1):
+  '''
+  given rows of (uid, group key...) sorted by group key, return a list of lists of uids,
+  each made of whole groups and closed once it holds at least <chunksize> uids.
+  '''
+
+  chunks = []
+  chunk = []
+  for i, row in enumerate(rows):
+    if len(chunk) >= chunksize and row[1:] != rows[i-1][1:]:
+      chunks.append(chunk)
+      chunk = []
+    chunk.append(row[0])
+  if len(chunk) > 0:
+    chunks.append(chunk)
+
+  return chunks
+
 def get_profile_from_db(uid, table, targetdb):
   '''
-  Given a unique id found in the current database table, return the corresponding WodPy profile object.
+  Given a unique id found in the current database table, return the corresponding profile object:
+  a dbProfile if the table has pre-extracted level arrays, a WodPy profile otherwise.
   '''
 
-  command = 'SELECT * FROM ' + table + ' WHERE uid = ' + str(uid)
-  row = dbinteract(command, targetdb=targetdb)
-  profile = text2wod(row[0][0][1:-1])
-  return profile
+  return get_profiles_from_db([uid], table, targetdb)[0]
+
+def get_profiles_from_db(uids, table, targetdb):
+  '''
+  Given a list of unique ids found in the current database table, return the corresponding profile objects,
+  in the same order as <uids>, fetching all of them in a single query.
+  '''
+
+  if stores_levels(table, targetdb):
+    headers = stored_headers(table, targetdb)
+    columns = level_columns + [header_columns[name] for name in headers]
+    command = 'SELECT raw, ' + ', '.join(columns) + ' FROM ' + table + ' WHERE uid IN (' + ','.join([str(uid) for uid in uids]) + ')'
+    rows = dbinteract(command, targetdb=targetdb)
+    profiles = {row[1]: row for row in rows}
+    return [profile_from_row(profiles[uid], headers) for uid in uids if uid in profiles]
+
+  command = 'SELECT uid, raw FROM ' + table + ' WHERE uid IN (' + ','.join([str(uid) for uid in uids]) + ')'
+  rows = dbinteract(command, targetdb=targetdb)
+  raws = {}
+  for row in rows:
+    raws[row[0]] = row[1]
+
+  return [text2wod(raws[uid][1:-1]) for uid in uids if uid in raws]
+
+# memos of qc results and intermediate products, keyed weakly by profile object; see profile_memo
+_memos = weakref.WeakKeyDictionary()
 
-def text2wod(raw):
+def profile_memo(p):
+  '''
+  return the dict memoizing qc results and intermediate products computed for profile <p>.
+  it's dropped along with the profile object, so lasts exactly as long as that profile's processing,
+  and is kept apart from the profile itself, so isn't carried along when the profile is copied.
+  '''
+
+  return _memos.setdefault(p, {})
+
+def memoize(p, key, compute):
+  '''
+  return a copy of the value memoized under <key> for profile <p>,
+  calling compute() to produce it the first time it's asked for.
+  '''
+
+  memo = profile_memo(p)
+  if key not in memo:
+    memo[key] = compute()
+  return copy.deepcopy(memo[key])
+
+def persist_intermediates(parameters):
+  '''
+  decide whether intermediate products should also be written to their side tables
+  (enbackground, enspikeandstep, icdclevelorder), for reuse by later processes.
+  '''
+
+  return parameters.get('persist_intermediates', True)
+
+# most recently parsed profiles, keyed by uid; see text2wod
+profile_cache = collections.OrderedDict()
+profile_cache_size = 1000
+
+def text2wod(raw, uid=None):
   '''
   given the raw text of a wod ascii profile, return a wodpy object representing the same.
+  if <uid> is given, the parsed profile is kept in a small LRU cache and returned again on
+  later calls with the same uid and text; such profiles are shared, so must not be modified.
+  '''
+
+  if uid is not None and uid in profile_cache and profile_cache[uid][0] == raw:
+    profile_cache.move_to_end(uid)
+    return profile_cache[uid][1]
+
+  profile = parse_wod(io.StringIO(raw))
+
+  if uid is not None:
+    profile_cache[uid] = (raw, profile)
+    if len(profile_cache) > profile_cache_size:
+      profile_cache.popitem(last=False)
+
+  return profile
+
+def parse_wod(fid):
+  '''
+  parse a single profile from the in-memory text stream <fid>.
+  mirrors wod.WodProfile.__init__, which insists on a real file on disk.
   '''
 
-  fProfile = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
-  fProfile.write(raw) # a file-like object containing only the profile from the queried row
-  fProfile.seek(0)
-  profile = wod.WodProfile(fProfile)
-  fProfile.close()
+  profile = wod.WodProfile.__new__(wod.WodProfile)
+  profile.file_name = None
+  profile.file_position = fid.tell()
+
+  # CR+LF line endings make the first line 82 characters long
+  firstline = fid.readline()
+  profile.cr = fid.tell() == profile.file_position + 82
+  profile.IQuOD = firstline[0] == 'Q'
+  fid.seek(profile.file_position)
+
+  profile._read_primary_header(fid)
+  profile._read_character_data_and_principal_investigator(fid)
+  profile._read_secondary_or_biological_header(fid)
+  profile._read_secondary_or_biological_header(fid, bio=True)
+  if profile.biological_header['Total bytes'] > 0:
+    profile._read_taxonomic_data(fid)
+  else:
+    profile.taxa = {}
+  profile._read_profile_data(fid)
 
   return profile
 
@@ -167,66 +413,233 @@ def dictify(rows, keys):
 
   return dicts
 
-def dbinteract(command, values=[], tries=0, targetdb='iquod.db'):
+# per-process cache of open database connections, keyed by (process id, thread id, database path);
+# sqlite3 connections may only be used by the thread that opened them.
+_connections = {}
+
+# column lists of tables, keyed by (connection key, table); see table_columns
+_columns = {}
+
+# retries for busy / locked databases back off exponentially, up to this many seconds per wait
+max_backoff = 5
+
+# number of dbinteract calls and transactions each thread has made, for timing reports
+_dbcalls = threading.local()
+
+def db_calls():
+  '''
+  return the number of dbinteract calls and transactions made so far by this thread.
+  '''
+
+  return getattr(_dbcalls, 'n', 0)
+
+def count_db_call():
+  '''
+  add one to this thread's db_calls() count.
+  '''
+
+  _dbcalls.n = db_calls() + 1
+
+def connection_key(targetdb):
+  '''
+  key of this process' and thread's connection to <targetdb> in _connections.
+  '''
+
+  return (os.getpid(), threading.get_ident(), os.path.abspath(targetdb))
+
+def connect(targetdb='iquod.db'):
   '''
-  execute the given SQL command;
-  catch errors and retry a maximum number of times;
+  return an autocommit connection to <targetdb>, reusing the one this process (and thread)
+  has already opened if there is one. sqlite3 keeps a per-connection cache of
+  compiled statements, so reusing the connection also reuses prepared statements.
   '''
 
-  max_retry = 100
-  conn = sqlite3.connect(targetdb, isolation_level=None, timeout=60)
+  # connections inherited from a parent process over fork are keyed by the parent's pid,
+  # so are never used (or closed) here.
+  key = connection_key(targetdb)
+  if key not in _connections:
+    conn = sqlite3.connect(targetdb, isolation_level=None, timeout=60, cached_statements=256)
+    configure(conn)
+    _connections[key] = conn
+
+  return _connections[key]
+
+# connection settings applied to every database connection AutoQC opens:
+# WAL journaling so readers never block the writer (and vice versa), relaxed syncing
+# (safe under WAL), a 64 MB page cache, 256 MB of memory mapped io, and a generous busy timeout.
+db_pragmas = [
+  ('journal_mode', 'WAL'),
+  ('synchronous', 'NORMAL'),
+  ('cache_size', -65536),
+  ('mmap_size', 268435456),
+  ('busy_timeout', 60000),
+  ('temp_store', 'MEMORY')
+]
+
+# replacements for db_pragmas on a database that processes on several hosts write to over a network
+# filesystem: WAL and memory mapped io need memory shared between every process using the database,
+# which network filesystems don't provide, so a rollback journal is used instead, with full syncing.
+shared_db_pragmas = {
+  'journal_mode': 'DELETE',
+  'synchronous': 'FULL',
+  'mmap_size': 0
+}
+
+def share_between_hosts():
+  '''
+  configure every connection opened from now on, in this process and those forked from it,
+  for databases shared between hosts; see shared_db_pragmas.
+  '''
+
+  global db_pragmas
+  db_pragmas = [(pragma, shared_db_pragmas.get(pragma, value)) for pragma, value in db_pragmas]
+
+def configure(conn):
+  '''
+  apply db_pragmas to the sqlite3 connection <conn>; returns <conn>.
+  '''
+
+  for pragma, value in db_pragmas:
+    result = conn.execute('PRAGMA ' + pragma + '=' + str(value) + ';').fetchall()
+    if pragma == 'journal_mode' and result and str(result[0][0]).upper() != str(value).upper():
+      # switching out of WAL needs every other connection to the database closed
+      print('could not set journal mode', value, '- database is in', result[0][0], 'mode')
+  return conn
+
+def disconnect(targetdb=None):
+  '''
+  close this process' (and thread's) cached connection to <targetdb>, or all of them if <targetdb> is None.
+  '''
+
+  for key in list(_connections):
+    if key[0:2] == (os.getpid(), threading.get_ident()) and (targetdb is None or key[2] == os.path.abspath(targetdb)):
+      _connections[key].close()
+      del _connections[key]
+      forget_columns(key[2])
+
+@contextlib.contextmanager
+def transaction(targetdb='iquod.db', immediate=False):
+  '''
+  group several statements into one transaction on the cached connection to <targetdb>:
+
+    with main.transaction(targetdb) as cur:
+      cur.execute(...)
+      cur.executemany(...)
+
+  commits when the block exits, rolls back if it raises.
+  dbinteract and interact_many calls made inside the block join the same transaction,
+  as do nested transaction blocks.
+  if <immediate>, the write lock is taken as the transaction begins, so what the block
+  reads can't be changed by another process before it writes.
+  '''
+
+  conn = connect(targetdb)
   cur = conn.cursor()
 
-  try:
-    cur.execute(command, values)
+  if conn.in_transaction:
+    # join the enclosing transaction
     try:
-      result = cur.fetchall()
-    except:
-      result = None
-    cur.close()
-    conn.close()
-    return result
+      yield cur
+    finally:
+      cur.close()
+    return
+
+  count_db_call()
+  cur.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+  try:
+    yield cur
+    cur.execute('COMMIT')
   except:
-    print('bad db request')
-    print(command)
-    print(values)
-    print(sys.exc_info())
     conn.rollback()
+    raise
+  finally:
     cur.close()
-    conn.close()
-    if tries < max_retry:
-      dbinteract(command, values, tries+1, targetdb=targetdb)
-    else:
-      print('database interaction failed after', max_retry, 'retries')
-      return -1  
+
+def transient_db_error(error):
+  '''
+  true if <error> is worth retrying, ie the database was busy or locked by another process.
+  '''
+
+  return isinstance(error, sqlite3.OperationalError) and ('locked' in str(error) or 'busy' in str(error))
+
+def backoff(tries):
+  '''
+  sleep before retry number <tries>
+  '''
+
+  time.sleep(min(0.05 * 2**tries, max_backoff))
+
+def dbinteract(command, values=[], tries=0, targetdb='iquod.db'):
+  '''
+  execute the given SQL command on this process' cached connection to <targetdb>;
+  retry with bounded backoff a maximum number of times if the database is busy or locked;
+  return the rows fetched, or None on failure.
+  '''
+
+  max_retry = 10
+  count_db_call()
+  conn = connect(targetdb)
+  joined = conn.in_transaction
+
+  # schema changes invalidate the column lists kept by table_columns
+  if command.lstrip()[0:6].upper() in ['CREATE', 'ALTER ', 'DROP T']:
+    forget_columns(targetdb)
+
+  while True:
+    cur = conn.cursor()
+    try:
+      cur.execute(command, values)
+      try:
+        result = cur.fetchall()
+      except:
+        result = None
+      cur.close()
+      return result
+    except Exception as error:
+      cur.close()
+      print('bad db request')
+      print(command)
+      print(values)
+      print(sys.exc_info())
+      if joined:
+        # let the enclosing transaction decide what to do
+        raise
+      if conn.in_transaction:
+        conn.rollback()
+      if transient_db_error(error) and tries < max_retry:
+        backoff(tries)
+        tries += 1
+      else:
+        if tries >= max_retry:
+          print('database interaction failed after', max_retry, 'retries')
+        return None
 
 def interact_many(query, values, tries=0, targetdb='iquod.db'):
   # similar to dbinteract, but does executemany
-  # intended exclusively for writes
-
-  max_retry = 100
+  # intended exclusively for writes; all rows are written in a single transaction.
+  # returns 0 on success, -1 on failure.
 
-  conn = sqlite3.connect(targetdb, isolation_level=None, timeout=60)
-  cur = conn.cursor()
+  max_retry = 10
 
-  try:
-    cur.executemany(query, values)
-    cur.close()
-    conn.close()
-    return 0
-  except:
-    print('executemany failed')
-    print(query)
-    print(values)
-    print(sys.exc_info())
-    conn.rollback()
-    cur.close()
-    conn.close()
-    if tries < max_retry:
-      interact_many(query, values, tries+1, targetdb=targetdb)
-    else:
-      print('excecutemany failed after', max_retry, 'retries')
-      return -1
+  while True:
+    try:
+      with transaction(targetdb) as cur:
+        cur.executemany(query, values)
+      return 0
+    except Exception as error:
+      print('executemany failed')
+      print(query)
+      print(sys.exc_info())
+      if connect(targetdb).in_transaction:
+        # part of an enclosing transaction; let it decide what to do
+        raise
+      if transient_db_error(error) and tries < max_retry:
+        backoff(tries)
+        tries += 1
+      else:
+        if tries >= max_retry:
+          print('excecutemany failed after', max_retry, 'retries')
+        return -1
 
 def faketable(name):
   '''
@@ -295,17 +708,96 @@ def fakerow(tablename, raw='x', truth=0, uid=8888, year=1999, month=12, day=31,
 
   dbinteract(query)
 
+# header of the compact blob format written by pack_array: a magic string that can't
+# start a pickle, followed by a format version byte
+blob_magic = b'AQCB'
+blob_version = 1
+
+# flag bits in the compact blob header
+BLOB_BITPACKED = 1 # boolean array stored one bit per level
+BLOB_MASKED = 2    # numpy masked array
+BLOB_HASMASK = 4   # masked array with an explicit per-level mask, stored one bit per level
+
+def compact_packable(arr):
+    # can <arr> be stored in the compact format without losing anything?
+
+    if type(arr) is not np.ndarray and type(arr) is not np.ma.core.MaskedArray:
+        return False
+    if arr.ndim != 1 or arr.dtype.kind not in 'biuf':
+        return False
+    if type(arr) is np.ma.core.MaskedArray and arr.fill_value != np.ma.default_fill_value(arr.dtype):
+        return False
+    return True
+
 def pack_array(arr):
-    # chew up a numpy array, masked array, or list for insertion into a sqlite column of type blob
+    # chew up a numpy array, masked array, or list for insertion into a sqlite column of type blob.
+    # one dimensional boolean and numeric arrays are written in a compact binary format:
+    #   magic, version, flags, dtype length, dtype string, level count (uint32),
+    #   then the data (bit packed for booleans), then the bit packed mask if there is one.
+    # anything else is pickled as before.
     out = io.BytesIO()
 
-    if type(arr) is np.ndarray or type(arr) is np.ma.core.MaskedArray:
+    if compact_packable(arr):
+        flags = 0
+        if arr.dtype.kind == 'b':
+            flags |= BLOB_BITPACKED
+        if type(arr) is np.ma.core.MaskedArray:
+            flags |= BLOB_MASKED
+            if arr.mask is not np.ma.nomask:
+                flags |= BLOB_HASMASK
+        dtype = arr.dtype.str.encode('ascii')
+        out.write(blob_magic + bytes([blob_version, flags, len(dtype)]) + dtype)
+        out.write(np.uint32(len(arr)).astype('<u4').tobytes())
+        data = np.ma.getdata(arr)
+        if flags & BLOB_BITPACKED:
+            out.write(np.packbits(data).tobytes())
+        else:
+            out.write(np.ascontiguousarray(data).tobytes())
+        if flags & BLOB_HASMASK:
+            out.write(np.packbits(np.ma.getmaskarray(arr)).tobytes())
+    elif type(arr) is np.ndarray or type(arr) is np.ma.core.MaskedArray:
         arr.dump(out)
     elif type(arr) is list:
         pickle.dump(arr, out)
     out.seek(0)
     return sqlite3.Binary(out.read())
 
+def unpack_array(blob):
+    # inverse of pack_array; reads both the compact format and legacy pickles.
+
+    blob = bytes(blob)
+    if not blob.startswith(blob_magic):
+        return np.load(io.BytesIO(blob), allow_pickle=True)
+
+    version, flags, dtypelen = blob[len(blob_magic):len(blob_magic)+3]
+    if version > blob_version:
+        raise ValueError('qc blob format version ' + str(version) + ' is newer than this version of AutoQC supports')
+    start = len(blob_magic) + 3
+    dtype = np.dtype(blob[start:start+dtypelen].decode('ascii'))
+    start += dtypelen
+
+    # trailing zero bytes may have been stripped by tools that treat blobs as C strings,
+    # reaching into the level count if the data are all zero; restore them
+    blob = blob + b'\x00' * max(0, start + 4 - len(blob))
+    n = int(np.frombuffer(blob[start:start+4], dtype='<u4')[0])
+    start += 4
+    datalen = (n + 7) // 8 if flags & BLOB_BITPACKED else n * dtype.itemsize
+    masklen = (n + 7) // 8 if flags & BLOB_HASMASK else 0
+    blob = blob + b'\x00' * max(0, start + datalen + masklen - len(blob))
+
+    if flags & BLOB_BITPACKED:
+        data = np.unpackbits(np.frombuffer(blob[start:start+datalen], dtype=np.uint8), count=n).astype(dtype)
+    else:
+        data = np.frombuffer(blob[start:start+datalen], dtype=dtype).copy()
+    start += datalen
+
+    if not flags & BLOB_MASKED:
+        return data
+    if flags & BLOB_HASMASK:
+        mask = np.unpackbits(np.frombuffer(blob[start:start+masklen], dtype=np.uint8), count=n).astype(bool)
+        return np.ma.array(data, mask=mask)
+    return np.ma.array(data)
+
 def unpack_row(row):
     # given a tuple row from sqlite, return a tuple with
     # typical datatypes
@@ -315,11 +807,9 @@ def unpack_row(row):
         if type(elt) is str:
             # unicode -> str
             res.append(str(elt))
-        elif type(elt) is memoryview:
+        elif type(elt) is memoryview or type(elt) is bytes:
             # buffer -> numpy array
-            res.append(np.load(io.BytesIO(elt),allow_pickle=True))
-        elif type(elt) is bytes:
-            res.append(np.load(io.BytesIO(memoryview(elt)),allow_pickle=True))
+            res.append(unpack_array(elt))
         else:
             res.append(elt)
 
@@ -0,0 +1,52 @@
+'''
+The parameter store shared by the qc tests, filled in by each test's
+loadParameters only when that test is first about to run.
+'''
+
+import sys, time
+
+class LazyParameters(dict):
+    '''
+    a dict of parameters for the tests in <registry> (as built by main.buildQCRegistry).
+    require(test) runs the loadParameters of <test>, and of the tests it depends on, the
+    first time it is called for them; <loadtimes> records the seconds each load took.
+    '''
+
+    def __init__(self, registry, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.registry = registry
+        self.loadtimes = {}
+        self.failed = []
+
+    def require(self, test):
+        '''
+        make sure the parameters for <test> and its dependencies have been loaded;
+        a load that raises is reported and not tried again.
+        '''
+
+        if test in self.loadtimes or test in self.failed:
+            return
+
+        # tests call their dependencies directly, so those need their parameters too
+        for dependency in self.registry[test]['dependencies']:
+            if dependency in self.registry:
+                self.require(dependency)
+
+        loadParameters = self.registry[test]['loadParameters']
+        start = time.time()
+        try:
+            if loadParameters is not None:
+                loadParameters(self)
+            self.loadtimes[test] = time.time() - start
+        except:
+            print('Failed to load parameters for', test, sys.exc_info())
+            self.failed.append(test)
+
+    def unusable(self, test):
+        '''
+        true if the parameters of <test>, or of a test it depends on, failed to load.
+        '''
+
+        if test in self.failed:
+            return True
+        return any([self.unusable(dependency) for dependency in self.registry[test]['dependencies'] if dependency in self.registry])
@@ -0,0 +1,119 @@
+'''
+Collects the per-test QC results of one or more profiles and writes them
+back to the database in bulk, on the process' cached connection.
+'''
+
+import sys
+import util.main as main
+import util.incremental as incremental
+
+class ResultSink:
+    '''
+    accumulate qc results keyed by uid, and write them to <table> in <targetdb>
+    with one multi-column UPDATE per profile, all inside a single transaction.
+    results are written when flush() is called, or automatically once
+    <flushsize> profiles are pending if flushsize is set.
+    per-test timings passed to add() are written to <timingtable> in the same transaction,
+    and if <errortable> is set, the results of tests that raised are marked there, while
+    the marks of every other result written are cleared.
+    '''
+
+    max_retry = 10
+
+    def __init__(self, table='iquod', targetdb='iquod.db', flushsize=None, timingtable=None, errortable=None):
+        self.table = table
+        self.targetdb = targetdb
+        self.flushsize = flushsize
+        self.timingtable = timingtable
+        self.errortable = errortable
+        self.pending = []
+        self.timings = []
+        self.errors = []
+        self.queries = {}
+
+    def query(self, columns):
+        '''
+        return the UPDATE statement setting <columns> for a single uid
+        '''
+
+        if columns not in self.queries:
+            self.queries[columns] = "UPDATE " + self.table + " SET " + ", ".join([column + "=?" for column in columns]) + " WHERE uid=?;"
+        return self.queries[columns]
+
+    def clear_query(self, columns):
+        '''
+        return the DELETE statement clearing the error marks of <columns> for a single uid
+        '''
+
+        if ('clear',) + columns not in self.queries:
+            self.queries[('clear',) + columns] = "DELETE FROM " + self.errortable + " WHERE uid=? AND test IN (" + ",".join(["?"] * len(columns)) + ");"
+        return self.queries[('clear',) + columns]
+
+    def add(self, uid, results, timings=None, errors=None):
+        '''
+        register the qc results for profile <uid>;
+        <results> is a dict of per-level qc arrays keyed by test name;
+        a result of None is written as NULL, eg for a test whose parameters failed to load, so incremental runs compute it again.
+        <timings>, if given, is a list of (uid, test, wall, cpu, levels, dbcalls, exception) tuples.
+        <errors>, if given, is a list of the tests in <results> that raised.
+        '''
+
+        columns = tuple(sorted([test.lower() for test in results]))
+        packed = {test.lower(): None if result is None else main.pack_array(result) for test, result in results.items()}
+        self.pending.append((columns, tuple([packed[column] for column in columns]) + (uid,)))
+        if timings is not None and self.timingtable is not None:
+            self.timings.extend(timings)
+        if errors is not None and self.errortable is not None:
+            self.errors.extend([(uid, test.lower()) for test in errors])
+
+        if self.flushsize is not None and len(self.pending) >= self.flushsize:
+            self.flush()
+
+    def flush(self, tries=0):
+        '''
+        write all pending results in one transaction
+        '''
+
+        if len(self.pending) == 0:
+            return 0
+
+        # group rows by the set of columns they update, so each group is one executemany
+        groups = {}
+        for columns, values in self.pending:
+            groups.setdefault(columns, []).append(values)
+
+        try:
+            with main.transaction(self.targetdb) as cur:
+                for columns in groups:
+                    cur.executemany(self.query(columns), groups[columns])
+                if self.errortable is not None:
+                    cur.execute(incremental.create_errors(self.errortable))
+                    for columns in groups:
+                        cur.executemany(self.clear_query(columns), [(values[-1],) + columns for values in groups[columns]])
+                    cur.executemany("INSERT OR REPLACE INTO " + self.errortable + " VALUES (?, ?);", self.errors)
+                if len(self.timings) > 0:
+                    cur.execute("CREATE TABLE IF NOT EXISTS " + self.timingtable + " (uid INTEGER, test TEXT, wall REAL, cpu REAL, levels INTEGER, dbcalls INTEGER, exception INTEGER, PRIMARY KEY (uid, test));")
+                    cur.executemany("INSERT OR REPLACE INTO " + self.timingtable + " VALUES (?, ?, ?, ?, ?, ?, ?);", self.timings)
+            self.pending = []
+            self.timings = []
+            self.errors = []
+            return 0
+        except Exception as error:
+            print('result sink write failed')
+            print(sys.exc_info())
+            if main.transient_db_error(error) and tries < self.max_retry:
+                main.backoff(tries)
+                return self.flush(tries+1)
+            else:
+                print('result sink write failed; dropping', len(self.pending), 'profiles')
+                self.pending = []
+                self.timings = []
+                self.errors = []
+                return -1
+
+    def close(self):
+        '''
+        flush anything outstanding
+        '''
+
+        return self.flush()
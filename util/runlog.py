@@ -0,0 +1,89 @@
+'''
+Structured logs for QC runs: each worker process appends one JSON record per
+line to its own file in the log directory, rather than writing a pair of
+files for every profile, and read_logs pulls the records back out by uid,
+test or level.
+'''
+
+import contextlib, glob, io, json, os, socket, sys, threading, time
+
+class RunLog:
+    '''
+    append-only log of this process' records in <logdir>/worker-<host>-<pid>.jsonl;
+    each record has the time, uid, test and level, plus a message, exception and
+    duration in seconds where there is one.
+    '''
+
+    def __init__(self, logdir, name=None):
+        if name is None:
+            name = 'worker-' + socket.gethostname() + '-' + str(os.getpid())
+        self.filename = os.path.join(logdir, name + '.jsonl')
+        self.file = None
+        self.lock = threading.Lock()
+
+    def record(self, uid, test=None, level='info', message=None, exception=None, seconds=None):
+        '''
+        append a record; tests running on several threads may log at once.
+        '''
+
+        entry = {'time': time.time(), 'uid': uid, 'test': test, 'level': level}
+        if message is not None:
+            entry['message'] = message
+        if exception is not None:
+            entry['exception'] = exception
+        if seconds is not None:
+            entry['seconds'] = seconds
+
+        with self.lock:
+            if self.file is None:
+                # line buffered, since pool workers exit without flushing their files
+                self.file = open(self.filename, 'a', buffering=1)
+            self.file.write(json.dumps(entry) + '\n')
+
+    @contextlib.contextmanager
+    def capture(self, uid):
+        '''
+        collect anything printed to stdout or stderr while profile <uid> is processed,
+        and log it along with the time taken once the block exits.
+        '''
+
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = io.StringIO(), io.StringIO()
+        start = time.time()
+        try:
+            yield
+        finally:
+            out, err = sys.stdout.getvalue(), sys.stderr.getvalue()
+            sys.stdout, sys.stderr = stdout, stderr
+            if out:
+                self.record(uid, level='stdout', message=out)
+            if err:
+                self.record(uid, level='stderr', message=err)
+            self.record(uid, level='info', message='processed', seconds=time.time() - start)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+def read_logs(logdir, uid=None, test=None, level=None):
+    '''
+    generate the records of every worker log under <logdir>, ordered by time within each file,
+    keeping only those for profile <uid>, qc test <test> and level <level> if given.
+    '''
+
+    for filename in sorted(glob.glob(os.path.join(logdir, '**', '*.jsonl'), recursive=True)):
+        with open(filename) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # a worker killed mid-write leaves a partial last line
+                    continue
+                if uid is not None and entry['uid'] != uid:
+                    continue
+                if test is not None and entry['test'] != test:
+                    continue
+                if level is not None and entry['level'] != level:
+                    continue
+                yield entry
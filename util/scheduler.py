@@ -0,0 +1,114 @@
+'''
+Orders the qc tests of a run by the dependencies between them declared in
+qctest_requirements.json, so that each test runs once per profile, after
+the tests it depends on, with independent tests optionally run concurrently.
+'''
+
+import os
+import util.main as main
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+def read_dependencies(checks):
+    '''
+    return a dict mapping each test in <checks> to the sorted list of tests in <checks>
+    it depends on, as main.qcDependencies reads them from the requirements file.
+    '''
+
+    dependencies = main.qcDependencies(checks)
+    return {check: [qctest for qctest in dependencies[check] if qctest in checks] for check in checks}
+
+class Scheduler:
+    '''
+    a dependency graph of qc tests. <waves> lists the tests in rounds, each round
+    depending only on earlier ones and sorted by name; <order> is the rounds concatenated,
+    a topological order in which to run the tests one at a time.
+    with <threads> > 1, run() runs tests whose dependencies are done concurrently.
+    '''
+
+    def __init__(self, checks, dependencies, threads=1):
+        self.checks = list(checks)
+        self.dependencies = {check: sorted(set(dependencies.get(check, [])) & set(checks)) for check in checks}
+        self.waves = self.topological_waves()
+        self.order = [check for wave in self.waves for check in wave]
+        self.threads = threads
+        self.executor = None
+        self.executor_pid = None
+
+    def topological_waves(self):
+        '''
+        group the tests into rounds by the longest chain of dependencies leading to them;
+        raises a ValueError if the dependencies are cyclic.
+        '''
+
+        waves = []
+        done = set()
+        remaining = sorted(self.checks)
+        while remaining:
+            wave = [check for check in remaining if set(self.dependencies[check]) <= done]
+            if wave == []:
+                raise ValueError('cyclic qc test dependencies among ' + ', '.join(remaining))
+            waves.append(wave)
+            done.update(wave)
+            remaining = [check for check in remaining if check not in done]
+
+        return waves
+
+    def critical_path(self, durations=None):
+        '''
+        return (path, length) of the longest chain of dependent tests, weighting each test
+        by <durations>[test] (eg mean seconds per profile) if given, or else by 1.
+        '''
+
+        if self.order == []:
+            return [], 0
+
+        length = {}
+        previous = {}
+        for check in self.order:
+            weight = durations.get(check, 0) if durations is not None else 1
+            previous[check] = max(self.dependencies[check], key=lambda dep: length[dep], default=None)
+            length[check] = weight + (length[previous[check]] if previous[check] is not None else 0)
+
+        path = [max(self.order, key=lambda check: length[check])]
+        while previous[path[-1]] is not None:
+            path.append(previous[path[-1]])
+
+        return path[::-1], length[path[0]]
+
+    def pool(self):
+        '''
+        this process' thread pool for running tests concurrently;
+        threads don't survive a fork, so each worker process makes its own.
+        '''
+
+        if self.executor is None or self.executor_pid != os.getpid():
+            self.executor = ThreadPoolExecutor(self.threads)
+            self.executor_pid = os.getpid()
+        return self.executor
+
+    def run(self, runtest):
+        '''
+        call runtest(test) exactly once for every test, each only after all the tests it
+        depends on have finished, and return a dict of the return values keyed by test.
+        '''
+
+        results = {}
+        if self.threads <= 1:
+            for check in self.order:
+                results[check] = runtest(check)
+            return results
+
+        pending = {check: set(self.dependencies[check]) for check in self.order}
+        running = {}
+        while pending or running:
+            for check in [check for check in self.order if check in pending and not pending[check]]:
+                del pending[check]
+                running[self.pool().submit(runtest, check)] = check
+            finished, unfinished = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                check = running.pop(future)
+                results[check] = future.result()
+                for dependencies in pending.values():
+                    dependencies.discard(check)
+
+        return results
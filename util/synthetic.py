@@ -0,0 +1,355 @@
+'''
+Reproducible synthetic workloads for timing the qc tests without the real
+datasets: profiles shaped like XBT, CTD, Argo float and bottle casts, built
+on testingProfile.fakeProfile, with realistic level counts, missing levels,
+faults and cruise tracks; and small stand-ins for the auxiliary data of the
+tests that need climatologies, generated from the same temperature model.
+'''
+
+import datetime
+import numpy as np
+import util.main as main
+from util import testingProfile, AOMLnetcdf
+
+# per kind of cast: WOD probe code, range of level counts, range of deepest level (m),
+# measurement noise (degC), fraction of levels missing, mean hours and degrees between
+# consecutive casts on a cruise, and whether salinities / pressures are reported
+kinds = {
+    'xbt':    {'probe': 2, 'levels': (200, 1000), 'depth': (450, 1850), 'noise': 0.05, 'missing': 0.01, 'hours': 4, 'step': 0.4, 'salinity': False, 'pressure': False},
+    'ctd':    {'probe': 4, 'levels': (100, 2000), 'depth': (200, 5500), 'noise': 0.005, 'missing': 0.002, 'hours': 12, 'step': 0.5, 'salinity': True, 'pressure': False},
+    'argo':   {'probe': 9, 'levels': (50, 1000), 'depth': (1000, 2000), 'noise': 0.002, 'missing': 0.005, 'hours': 240, 'step': 0.3, 'salinity': True, 'pressure': True},
+    'bottle': {'probe': 7, 'levels': (4, 36), 'depth': (50, 5000), 'noise': 0.02, 'missing': 0.05, 'hours': 24, 'step': 1.0, 'salinity': True, 'pressure': False}
+}
+kindNames = ['xbt', 'ctd', 'argo', 'bottle']
+
+# WOD country codes handed out to cruises
+countries = ['US', 'AU', 'JP', 'GB', 'DE', 'FR', 'CA', 'IN']
+
+class syntheticProfile(testingProfile.fakeProfile):
+    '''
+    a fakeProfile holding its levels as ready-made masked arrays, with the
+    country code, originator cruise and platform the track check looks for.
+    '''
+
+    def __init__(self, temperatures, depths, country=None, originator_cruise=None, platform=None, **kwargs):
+        testingProfile.fakeProfile.__init__(self, temperatures, depths, **kwargs)
+        self.primary_header['Country code'] = country
+        self.ocruise = originator_cruise
+        if platform is not None:
+            self.secondary_header['entries'].append({'Code':3, 'Value':platform})
+
+    def var_data(self, dat):
+        """ Returns a copy of the masked array for a variable. """
+        return dat.copy()
+
+    def originator_cruise(self):
+        """ Returns the originator cruise identifier. """
+        return self.ocruise
+
+    def extract_secondary_header(self, code):
+        """ Returns the contents of secondary header <code> if it exists, otherwise None. """
+        for item in self.secondary_header['entries']:
+            if item['Code'] == code:
+                return item['Value']
+        return None
+
+def temperature(depths, latitude, month):
+    '''
+    a smooth climatological temperature (degC) at <depths> (m), for <latitude> and <month>:
+    a mixed layer, warmest toward the equator and in local summer, over a thermocline.
+    '''
+
+    coslat = np.cos(np.radians(latitude))
+    season = np.cos(2 * np.pi * (month - 2) / 12.0) * (1 if latitude < 0 else -1)
+    surface = max(-1.8, -1.0 + 28.0 * coslat**2 + 2.0 * season * abs(np.sin(np.radians(latitude))))
+    deep = 1.5
+    mixed = 50.0
+    depths = np.asarray(depths, dtype=float)
+    return np.where(depths < mixed, surface, deep + (surface - deep) * np.exp(-(depths - mixed) / 500.0))
+
+def salinity(depths, latitude):
+    '''a smooth climatological salinity at <depths> (m) and <latitude>'''
+
+    return 34.7 + 0.6 * np.cos(np.radians(latitude))**2 * np.exp(-np.asarray(depths, dtype=float) / 300.0)
+
+def spread(depths):
+    '''typical absolute deviation (degC) of temperature about the climatology at <depths> (m)'''
+
+    return 0.3 + 1.2 * np.exp(-np.asarray(depths, dtype=float) / 300.0)
+
+def levelDepths(rng, kind, n, deepest):
+    '''<n> increasing depths down to <deepest> for a cast of <kind>'''
+
+    top = rng.uniform(0, 4)
+    if kind == 'bottle':
+        # bottles bunched near the surface
+        return np.geomspace(top + 1, deepest, n)
+    if kind == 'argo':
+        # floats sample more densely on the way up through the thermocline
+        return top + (deepest - top) * np.linspace(0, 1, n)**1.5
+    return np.linspace(top, deepest, n)
+
+def cast(rng, kind, uid, cruise, latitude, longitude, when, country, platform):
+    '''a single synthetic profile of <kind>, with its levels, gaps and any faults'''
+
+    spec = kinds[kind]
+    n = rng.randint(spec['levels'][0], spec['levels'][1] + 1)
+    depths = levelDepths(rng, kind, n, rng.uniform(*spec['depth']))
+    temps = temperature(depths, latitude, when.month) + rng.normal(0, spec['noise'], n)
+
+    # faults for the tests to find: a spike, a stuck recorder, or a run of missing levels
+    if rng.uniform() < 0.05:
+        temps[rng.randint(n)] += rng.choice([-1, 1]) * rng.uniform(2, 8)
+    if rng.uniform() < 0.02 and n > 10:
+        temps[rng.randint(n // 2, n):] = temps[n // 2]
+    missing = rng.uniform(size=n) < spec['missing']
+    if rng.uniform() < 0.1 and n > 20:
+        start = rng.randint(n - n // 20)
+        missing[start:start + n // 20] = True
+
+    salinities = None
+    if spec['salinity']:
+        salinities = np.ma.array(salinity(depths, latitude) + rng.normal(0, spec['noise'] / 5, n), mask=missing)
+    pressures = None
+    if spec['pressure']:
+        pressures = np.ma.array(depths * (1.0 + 0.00001 * depths), mask=np.zeros(n, dtype=bool))
+
+    return syntheticProfile(np.ma.array(temps, mask=missing), np.ma.array(depths, mask=np.zeros(n, dtype=bool)),
+                            latitude=latitude, longitude=longitude,
+                            date=[when.year, when.month, when.day, when.hour + when.minute / 60.0],
+                            probe_type=spec['probe'], salinities=salinities, pressures=pressures,
+                            uid=uid, cruise=cruise, country=country, originator_cruise='SYN' + str(cruise), platform=platform)
+
+def workload(kind, n, seed=0, firstuid=1, cruiselength=10):
+    '''
+    return a list of <n> synthetic profiles of <kind>, the same every time for a given <seed>,
+    with uids counting up from <firstuid>; each run of <cruiselength> profiles is one cruise,
+    moving steadily from a random start, with the odd cast reported in the wrong place.
+    '''
+
+    spec = kinds[kind]
+    rng = np.random.RandomState([seed, kindNames.index(kind)])
+    profiles = []
+    for first in range(0, n, cruiselength):
+        cruise = firstuid + first
+        country = countries[rng.randint(len(countries))]
+        latitude = rng.uniform(-60, 60)
+        longitude = rng.uniform(-180, 180)
+        heading = rng.uniform(0, 2 * np.pi)
+        when = datetime.datetime(rng.randint(1990, 2020), rng.randint(1, 13), rng.randint(1, 29), rng.randint(24))
+        for uid in range(cruise, firstuid + min(first + cruiselength, n)):
+            lat, lon = latitude, longitude
+            if rng.uniform() < 0.02:
+                lat = float(np.clip(lat + rng.uniform(-5, 5), -80, 80))
+                lon += rng.uniform(-5, 5)
+            profiles.append(cast(rng, kind, uid, cruise, lat, (lon + 180) % 360 - 180, when, country, 10000 + cruise))
+
+            # on to the next cast
+            step = spec['step'] * rng.uniform(0.5, 1.5)
+            heading += rng.normal(0, 0.3)
+            latitude += step * np.cos(heading)
+            if abs(latitude) > 78:
+                latitude = np.sign(latitude) * 78
+                heading = np.pi - heading
+            longitude += step * np.sin(heading) / np.cos(np.radians(latitude))
+            when += datetime.timedelta(hours=spec['hours'] * rng.uniform(0.8, 1.2))
+
+    return profiles
+
+def workloads(n, seed=0, names=kindNames):
+    '''
+    return a dict of workloads of <n> profiles for each kind in <names>,
+    each kind with its own range of uids, so they can share a table.
+    '''
+
+    return {kind: workload(kind, n, seed, 1 + kindNames.index(kind) * 10**7) for kind in names}
+
+def writeTable(profiles, table, targetdb, raw=None):
+    '''
+    write <profiles> to a new <table> in <targetdb> with the columns build-db.py writes,
+    for the tests that look profiles up in the database (the track and buddy checks).
+    the profiles have no wod text, so <raw> (by default the text of data/example.dat)
+    stands in for it, for the accessors only a wodpy profile has.
+    '''
+
+    if raw is None:
+        with open('data/example.dat') as f:
+            raw = f.read()
+
+    query = 'CREATE TABLE ' + table + '''(
+                raw text, truth BLOB, uid integer PRIMARY KEY, year integer, month integer, day integer, time real,
+                lat real, long real, country text, cruise integer, ocruise text, probe integer, training integer, flagged integer,
+                depth BLOB, temperature BLOB, salinity BLOB, pressure BLOB, platform integer, nlevels integer, '''
+    query += ', '.join([test.lower() + ' BLOB' for test in sorted(main.importQC('qctests'))]) + ');'
+    main.dbinteract('DROP TABLE IF EXISTS ' + table + ';', targetdb=targetdb)
+    main.dbinteract(query, targetdb=targetdb)
+
+    rows = []
+    for p in profiles:
+        levels = [main.pack_array(arr) for arr in [p.z(), p.t(), p.s(), p.p()]]
+        rows.append(("'" + raw + "'", None, p.uid(), p.year(), p.month(), p.day(), p.time(), p.latitude(), p.longitude(),
+                     p.primary_header['Country code'], p.cruise(), p.originator_cruise(), p.probe_type(), 0, 0) +
+                    tuple(levels) + (p.extract_secondary_header(3), p.n_levels()))
+    query = 'INSERT INTO ' + table + ' (raw, truth, uid, year, month, day, time, lat, long, country, cruise, ocruise, probe, training, flagged, depth, temperature, salinity, pressure, platform, nlevels) VALUES (' + ','.join(['?'] * 21) + ');'
+    return main.interact_many(query, rows, targetdb=targetdb)
+
+def syntheticENBackground():
+    '''stand-in for the EN background check's climatology and error variances, on a 5 degree grid'''
+
+    depth = np.array([5, 15, 25, 35, 45, 55, 65, 75, 85, 95, 110, 130, 150, 175, 200, 250, 300, 400, 500, 700, 1000, 1500, 2000, 3000, 4000, 5000], dtype=float)
+    lon = np.arange(2.5, 360, 5.0)
+    lat = np.arange(-87.5, 90, 5.0)
+    clim = np.array([[temperature(depth, y, m) for m in range(1, 13)] for y in lat]).transpose(2, 0, 1)
+    clim = np.broadcast_to(clim[:, :, np.newaxis, :], (len(depth), len(lat), len(lon), 12)).copy()
+    bgev = np.broadcast_to(spread(depth)[:, np.newaxis, np.newaxis]**2, (len(depth), len(lat), len(lon))).copy()
+
+    return {
+        'lon': lon,
+        'lat': lat,
+        'depth': depth,
+        'month': np.arange(1, 13),
+        'clim': np.ma.array(clim, mask=np.zeros(clim.shape, dtype=bool)),
+        'bgev': np.ma.array(bgev, mask=np.zeros(bgev.shape, dtype=bool)),
+        'obev': 0.01 + 0.1 * np.exp(-depth / 300.0)
+    }
+
+def syntheticICDC09():
+    '''stand-in for the ICDC local climatology check's medians and deviations, on its 0.5 degree grid'''
+
+    zedqc = np.array([0, 10, 20, 30, 50, 75, 100, 125, 150, 200, 250, 300, 400, 500, 600, 700, 800, 900, 1000,
+                      1100, 1200, 1300, 1400, 1500, 1750, 2000, 2500, 3000, 3500, 4000, 4500, 5000, 5500, 6000, 6500], dtype=float)
+    middle = (zedqc[:-1] + zedqc[1:]) / 2
+    lats = 90.0 - 0.5 * (np.arange(361) + 0.5)
+    tmedM = np.array([[temperature(middle, y, m) for m in range(1, 13)] for y in lats]).transpose(0, 2, 1)
+    amd = np.broadcast_to(spread(middle), (361, len(middle)))
+
+    # the same at every longitude, so broadcast rather than stored
+    return {
+        'zedqc': zedqc,
+        'tmedM': np.broadcast_to(tmedM, (721,) + tmedM.shape),
+        'tamdM': np.broadcast_to(amd[:, :, np.newaxis], (721, 361, len(middle), 12)),
+        'tmedA': np.broadcast_to(tmedM.mean(axis=2), (721, 361, len(middle))),
+        'tamdA': np.broadcast_to(amd, (721, 361, len(middle))),
+        'fillValue': -99999.0
+    }
+
+def syntheticICDC10():
+    '''stand-in for the ICDC local climatology check's temperature ranges, on its 0.5 degree grid'''
+
+    depths = np.concatenate([np.arange(0, 100, 10), np.arange(100, 500, 25), np.arange(500, 2000, 50), np.arange(2000, 6500, 500)]).astype(float)
+    lats = 90.0 - 0.5 * np.arange(340)
+    lons = -180.0 + 0.5 * np.arange(721)
+    ndmn = 38
+    monthly = np.array([[temperature(depths[0:ndmn], y, m) for y in lats] for m in range(1, 13)]).transpose(0, 2, 1)
+    annual = np.array([temperature(depths, y, 1) for y in lats]).T
+    annual = (annual + np.array([temperature(depths, y, 7) for y in lats]).T) / 2
+    width = 3 * spread(depths)[:, np.newaxis]
+
+    # the same at every longitude, so broadcast rather than stored
+    return {
+        'tmin_monthly': np.broadcast_to((monthly - width[0:ndmn])[..., np.newaxis], monthly.shape + (721,)),
+        'tmax_monthly': np.broadcast_to((monthly + width[0:ndmn])[..., np.newaxis], monthly.shape + (721,)),
+        'tmin_annual': np.broadcast_to((annual - width)[..., np.newaxis], annual.shape + (721,)),
+        'tmax_annual': np.broadcast_to((annual + width)[..., np.newaxis], annual.shape + (721,)),
+        'lats': lats,
+        'lons': lons,
+        'depths_monthly': depths[0:ndmn],
+        'depths_annual': depths,
+        'fill_value': -999
+    }
+
+def syntheticAOMLClimatology():
+    '''stand-in for the WOA13 annual mean and standard deviation fields read by AOML_climatology_test, on their 0.25 degree grid'''
+
+    deps = np.concatenate([np.arange(0, 100, 5), np.arange(100, 500, 25), np.arange(500, 1501, 50)]).astype(float)
+    lats = np.arange(-89.875, 90, 0.25)
+    lons = np.arange(-179.875, 180, 0.25)
+    mean = np.array([(temperature(deps, y, 1) + temperature(deps, y, 7)) / 2 for y in lats]).T
+    shape = (len(deps), len(lats), len(lons))
+
+    # the same at every longitude, so broadcast rather than stored
+    return {
+        't_an': AOMLnetcdf.ClimatologyField.from_arrays(deps, lats, lons, np.broadcast_to(mean[:, :, np.newaxis], shape)),
+        't_sd': AOMLnetcdf.ClimatologyField.from_arrays(deps, lats, lons, np.broadcast_to(spread(deps)[:, np.newaxis, np.newaxis], shape))
+    }
+
+def syntheticMinMax(size=2.0):
+    '''
+    stand-in for the minmax climatology and the grid description in info_DGG4H6.mat, laid out as readMinMax returns them,
+    but on square cells <size> degrees across rather than hexagons; 10 degree boxes list the cells in them, as in the real grid.
+    '''
+
+    # cell centres, latitude major, and their closed outlines
+    lat, lon = np.meshgrid(np.arange(-90 + size / 2, 90, size), np.arange(-180 + size / 2, 180, size), indexing='ij')
+    lat = lat.ravel()
+    lon = lon.ravel()
+    vlat = lat[np.newaxis, :] + size / 2 * np.array([-1, -1, 1, 1, -1])[:, np.newaxis]
+    vlon = lon[np.newaxis, :] + size / 2 * np.array([-1, 1, 1, -1, -1])[:, np.newaxis]
+
+    # 1-based indices of the cells in each 10 degree box, nested as loadmat nests matlab cell arrays
+    boxes = np.empty((18, 36, 1, 1), dtype=object)
+    for i in range(18):
+        for j in range(36):
+            boxes[i, j, 0, 0] = 1 + np.flatnonzero((np.floor((lat + 90) / 10) == i) & (np.floor((lon + 180) / 10) == j))
+
+    # layers between successive depths, negative and increasing, as the test looks up the negatives of pressures
+    depth = -np.concatenate([np.arange(0, 100, 10), np.arange(100, 500, 25), np.arange(500, 2000, 50), np.arange(2000, 6501, 500)])[::-1].astype(float)
+    middle = -(depth[:-1] + depth[1:]) / 2
+    rows = np.unique(lat)
+    monthly = np.array([[temperature(middle, y, m) for m in range(1, 13)] for y in rows])
+    width = 3 * spread(middle)
+    ncells = len(lat) // len(rows)
+
+    return {
+        'depth': depth,
+        'temp_min': np.repeat(np.column_stack([monthly.min(axis=1) - width, np.full(len(rows), np.nan)]), ncells, axis=0),
+        'temp_max': np.repeat(np.column_stack([monthly.max(axis=1) + width, np.full(len(rows), np.nan)]), ncells, axis=0),
+        'info_DGG': {
+            'list_ISEApts_in_boxes': boxes,
+            'lon': lon[np.newaxis, :],
+            'lat': lat[np.newaxis, :],
+            'vertices': {'lat': [[vlat]], 'lon': [[vlon]]}
+        }
+    }
+
+def syntheticEtopo5(width):
+    '''stand-in for the relief data read by loose_location_at_sea.readEtopo5, on its 5 minute grid with a halo <width> points wide: all ocean'''
+
+    etopx = np.arange(0, 360, 1 / 12.0)
+    etopy = np.arange(-90, 90, 1 / 12.0)
+
+    return {
+        'etopx': etopx,
+        'etopy': etopy,
+        'etoph': np.broadcast_to(-4000.0, (len(etopy) + 2 * width, len(etopx) + 2 * width))
+    }
+
+def loadAOMLClimatologyStub(parameterStore):
+    parameterStore['aomlclimatology'] = syntheticAOMLClimatology()
+
+def loadMinMaxStub(parameterStore):
+    parameterStore['minmax'] = syntheticMinMax()
+
+def loadEtopo5Stub(parameterStore):
+    from qctests import loose_location_at_sea
+    parameterStore['etopo5'] = syntheticEtopo5(loose_location_at_sea.width)
+
+def loadENBackgroundStub(parameterStore):
+    main.dbinteract("CREATE TABLE IF NOT EXISTS enbackground (uid INTEGER PRIMARY KEY, bgstdlevels BLOB, bgevstdlevels BLOB, origlevels BLOB, ptlevels BLOB, bglevels BLOB)", targetdb=parameterStore["db"])
+    parameterStore['enbackground'] = syntheticENBackground()
+
+def loadICDC09Stub(parameterStore):
+    parameterStore['icdc09'] = syntheticICDC09()
+
+def loadICDC10Stub(parameterStore):
+    parameterStore['icdc10'] = syntheticICDC10()
+
+# loadParameters stand-ins for tests whose auxiliary data files aren't available, keyed by test
+stubs = {
+    'AOML_climatology_test': loadAOMLClimatologyStub,
+    'EN_background_check': loadENBackgroundStub,
+    'ICDC_aqc_09_local_climatology_check': loadICDC09Stub,
+    'ICDC_aqc_10_local_climatology_check': loadICDC10Stub,
+    'loose_location_at_sea': loadEtopo5Stub,
+    'minmax': loadMinMaxStub
+}
@@ -0,0 +1,146 @@
+'''
+A queue of uid chunks, kept in a small SQLite database that any number of
+AutoQC processes - on one machine or several sharing a filesystem - pull
+work from. A chunk is leased to one worker at a time; the worker renews the
+lease while it works, and a chunk whose lease runs out (its worker died or
+hung) is handed to the next worker that asks, up to max_attempts times.
+'''
+
+import json, os, socket, sqlite3, threading, time, uuid
+import util.main as main
+
+class WorkQueue:
+    '''
+    the queue of chunks in the sqlite file <queuedb>, each a list of uids and
+    optionally the tests to run on each, in states pending, leased, done or failed.
+    '''
+
+    max_attempts = 3
+    max_retry = 10
+
+    def __init__(self, queuedb, leasetime=600):
+        self.queuedb = queuedb
+        self.leasetime = leasetime
+        self.conns = {}
+
+    def connect(self):
+        '''
+        this process' (and thread's) connection to the queue; a rollback journal is used
+        rather than WAL, since WAL needs shared memory that network filesystems don't provide.
+        '''
+
+        key = (os.getpid(), threading.get_ident())
+        if key not in self.conns:
+            conn = sqlite3.connect(self.queuedb, isolation_level=None, timeout=60)
+            conn.execute('PRAGMA journal_mode=DELETE;').fetchall()
+            conn.execute('PRAGMA busy_timeout=60000;').fetchall()
+            conn.execute('CREATE TABLE IF NOT EXISTS queue (chunk INTEGER PRIMARY KEY, uids TEXT, todo TEXT, state TEXT, owner TEXT, expires REAL, attempts INTEGER, finished REAL);')
+            self.conns[key] = conn
+        return self.conns[key]
+
+    def execute(self, query, values=(), tries=0):
+        '''
+        run <query> on the queue in its own transaction, retrying while the file is locked;
+        returns the rows fetched.
+        '''
+
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE;')
+                return conn.execute(query, values).fetchall()
+        except sqlite3.OperationalError as error:
+            if main.transient_db_error(error) and tries < self.max_retry:
+                main.backoff(tries)
+                return self.execute(query, values, tries+1)
+            raise
+
+    def fill(self, chunks, todo=None):
+        '''
+        queue each list of uids in <chunks>, unless the queue already holds work;
+        <todo>, if given, is a dict of the tests to run keyed by uid.
+        returns True if this call filled the queue.
+        '''
+
+        rows = [(json.dumps(chunk), None if todo is None else json.dumps([todo[uid] for uid in chunk]), 'pending', 0) for chunk in chunks]
+
+        # check and fill in one transaction, so only one process sets up a queue shared by several
+        conn = self.connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE;')
+            if conn.execute('SELECT COUNT(*) FROM queue;').fetchall()[0][0] > 0:
+                return False
+            conn.executemany('INSERT INTO queue (uids, todo, state, attempts) VALUES (?, ?, ?, ?);', rows)
+        return True
+
+    def lease(self, owner=None):
+        '''
+        claim the next pending chunk, or one whose lease has expired, for <owner>;
+        returns (chunk id, token, uids, todo), where todo is a dict of tests keyed by uid or None,
+        or None if there is nothing left to claim.
+        chunks that have used up max_attempts are marked failed rather than handed out again.
+        '''
+
+        token = (owner or socket.gethostname() + ':' + str(os.getpid())) + ':' + uuid.uuid4().hex
+        now = time.time()
+
+        self.execute("UPDATE queue SET state = 'failed' WHERE state = 'leased' AND expires < ? AND attempts >= ?;", (now, self.max_attempts))
+        self.execute("UPDATE queue SET state = 'leased', owner = ?, expires = ?, attempts = attempts + 1 WHERE chunk = "
+                     "(SELECT chunk FROM queue WHERE state = 'pending' OR (state = 'leased' AND expires < ?) ORDER BY chunk LIMIT 1);",
+                     (token, now + self.leasetime, now))
+
+        rows = self.execute('SELECT chunk, uids, todo FROM queue WHERE owner = ?;', (token,))
+        if len(rows) == 0:
+            return None
+        chunk, uids, todo = rows[0]
+        uids = json.loads(uids)
+        if todo is not None:
+            todo = dict(zip(uids, [tuple(tests) for tests in json.loads(todo)]))
+        return chunk, token, uids, todo
+
+    def heartbeat(self, chunk, token):
+        '''
+        extend the lease on <chunk>; returns False if it has been lost to another worker.
+        '''
+
+        self.execute("UPDATE queue SET expires = ? WHERE chunk = ? AND owner = ? AND state = 'leased';", (time.time() + self.leasetime, chunk, token))
+        return len(self.execute("SELECT chunk FROM queue WHERE chunk = ? AND owner = ? AND state = 'leased';", (chunk, token))) > 0
+
+    def complete(self, chunk, token):
+        '''
+        mark <chunk> done, if it is still leased under <token>
+        '''
+
+        self.execute("UPDATE queue SET state = 'done', finished = ? WHERE chunk = ? AND owner = ?;", (time.time(), chunk, token))
+
+    def release(self, chunk, token):
+        '''
+        hand <chunk> back to the queue after a failed attempt, or mark it failed if it has used up its attempts
+        '''
+
+        self.execute("UPDATE queue SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, expires = NULL "
+                     "WHERE chunk = ? AND owner = ? AND state = 'leased';", (self.max_attempts, chunk, token))
+
+    def status(self):
+        '''
+        return a dict of the number of chunks in each state
+        '''
+
+        return dict(self.execute('SELECT state, COUNT(*) FROM queue GROUP BY state;'))
+
+    def keepalive(self, chunk, token):
+        '''
+        start a thread renewing the lease on <chunk> until the returned event is set
+        '''
+
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.leasetime / 3.0):
+                try:
+                    self.heartbeat(chunk, token)
+                except sqlite3.Error:
+                    print('queue heartbeat failed for chunk', chunk)
+
+        threading.Thread(target=beat, daemon=True).start()
+        return stop